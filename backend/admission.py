@@ -0,0 +1,175 @@
+"""
+Contrôle d'admission des routes coûteuses (connexion, notes, envoi de fichiers)
+- Chaque groupe de routes a une limite de requêtes simultanées et une file d'attente bornée:
+  file pleine, ou attente plus longue que prévu -> 503 immédiat avec Retry-After
+- Chaque utilisateur (ou adresse IP sans token valide) a un seau de jetons par groupe:
+  seau vide -> 429 avec Retry-After
+- Les autres routes ne passent par aucune limite: elles gardent leur latence pendant un pic
+- Limites propres à chaque worker; compteurs consultables via GET /api/admission
+"""
+import asyncio
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from jose import jwt, JWTError
+from starlette.responses import JSONResponse
+
+from database import JWT_SECRET
+
+MAX_CLES = 10_000
+
+
+class Groupe:
+    def __init__(self, nom: str, routes: Tuple[str, ...], methodes: Tuple[str, ...],
+                 concurrence: int, file: int, attente: float, debit: float, rafale: int):
+        self.nom = nom
+        self.routes = routes            # chemin exact, ou préfixe s'il finit par "/"
+        self.methodes = methodes
+        self.concurrence = concurrence  # requêtes traitées en même temps
+        self.file = file                # requêtes en attente au-delà
+        self.attente = attente          # secondes d'attente maximales dans la file
+        self.debit = debit              # jetons par seconde et par utilisateur
+        self.rafale = rafale            # taille du seau
+
+    def correspond(self, methode: str, path: str) -> bool:
+        return methode in self.methodes and any(
+            path.startswith(r) if r.endswith("/") else path == r for r in self.routes
+        )
+
+
+GROUPES = [
+    # bcrypt: quelques vérifications simultanées suffisent à occuper un cœur.
+    # Seau par adresse IP: assez large pour une salle entière derrière la même adresse
+    Groupe("connexion", ("/api/auth/login-directeur", "/api/auth/login-user"), ("POST",),
+           concurrence=4, file=64, attente=5.0, debit=2.0, rafale=40),
+    Groupe("notes", ("/api/notes/", "/api/analytique/"), ("GET",),
+           concurrence=8, file=32, attente=2.0, debit=5.0, rafale=20),
+    Groupe("upload", ("/api/upload", "/api/upload/batch"), ("POST",),
+           concurrence=8, file=16, attente=10.0, debit=2.0, rafale=10),
+]
+
+
+class _Limite:
+    """Requêtes simultanées d'un groupe, seaux de jetons et compteurs"""
+
+    def __init__(self, groupe: Groupe):
+        self.groupe = groupe
+        self.semaphore = asyncio.Semaphore(groupe.concurrence)
+        self.en_cours = 0
+        self.en_attente = 0
+        # clé -> (jetons, dernière mise à jour)
+        self.seaux: Dict[str, Tuple[float, float]] = {}
+        self.compteurs = {"admises": 0, "rejets_debit": 0, "rejets_file": 0, "rejets_attente": 0}
+
+    def prendre_jeton(self, cle: str) -> float:
+        """0 si un jeton est disponible, sinon le délai (s) avant le prochain"""
+        groupe = self.groupe
+        now = time.monotonic()
+        if len(self.seaux) >= MAX_CLES:
+            # Un seau inutilisé depuis rafale/debit secondes est plein: inutile de le garder
+            plein = groupe.rafale / groupe.debit
+            self.seaux = {k: v for k, v in self.seaux.items() if now - v[1] < plein}
+
+        jetons, maj = self.seaux.get(cle, (groupe.rafale, now))
+        jetons = min(groupe.rafale, jetons + (now - maj) * groupe.debit)
+        if jetons < 1:
+            self.seaux[cle] = (jetons, now)
+            return (1 - jetons) / groupe.debit
+        self.seaux[cle] = (jetons - 1, now)
+        return 0
+
+    async def entrer(self) -> Optional[str]:
+        """None si la requête est admise, sinon la raison du rejet"""
+        if self.semaphore.locked() and self.en_attente >= self.groupe.file:
+            return "rejets_file"
+        self.en_attente += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.groupe.attente)
+        except asyncio.TimeoutError:
+            return "rejets_attente"
+        finally:
+            self.en_attente -= 1
+        self.en_cours += 1
+        return None
+
+    def sortir(self):
+        self.en_cours -= 1
+        self.semaphore.release()
+
+    def etat(self) -> dict:
+        return {
+            "concurrence": self.groupe.concurrence,
+            "en_cours": self.en_cours,
+            "en_attente": self.en_attente,
+            "file_max": self.groupe.file,
+            **self.compteurs
+        }
+
+
+def _cle(scope) -> str:
+    """Utilisateur du token (signature vérifiée, sans consulter les révocations), sinon adresse IP"""
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            try:
+                payload = jwt.decode(value.decode("latin-1").replace("Bearer ", ""), JWT_SECRET,
+                                     algorithms=["HS256"])
+                return f"user:{payload['user_id']}"
+            except (JWTError, KeyError):
+                break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else '?'}"
+
+
+class AdmissionControl:
+    def __init__(self):
+        self.limites = [_Limite(g) for g in GROUPES]
+
+    def limite(self, methode: str, path: str) -> Optional[_Limite]:
+        return next((l for l in self.limites if l.groupe.correspond(methode, path)), None)
+
+    def etat(self) -> dict:
+        return {"pid": os.getpid(), "groupes": {l.groupe.nom: l.etat() for l in self.limites}}
+
+
+admission_control = AdmissionControl()
+
+
+class AdmissionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limite = admission_control.limite(scope["method"], scope["path"])
+        if limite is None:
+            await self.app(scope, receive, send)
+            return
+
+        delai = limite.prendre_jeton(_cle(scope))
+        if delai:
+            limite.compteurs["rejets_debit"] += 1
+            await _rejeter(scope, receive, send, 429, "Trop de requêtes, réessayez plus tard", delai)
+            return
+
+        rejet = await limite.entrer()
+        if rejet:
+            limite.compteurs[rejet] += 1
+            await _rejeter(scope, receive, send, 503, "Serveur saturé, réessayez plus tard", 1)
+            return
+
+        limite.compteurs["admises"] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limite.sortir()
+
+
+async def _rejeter(scope, receive, send, status_code: int, detail: str, retry_after: float):
+    response = JSONResponse({"detail": detail}, status_code=status_code,
+                            headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+    await response(scope, receive, send)
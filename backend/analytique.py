@@ -0,0 +1,232 @@
+"""
+Analyse des notes d'un espace pédagogique ou d'une promotion
+- Les notes sont chargées une seule fois dans des tableaux NumPy contigus, puis tous les
+  indicateurs sont calculés par opérations vectorisées (bincount, percentile, corrcoef)
+- Résultats mis en cache jusqu'à la prochaine écriture d'évaluation: chaque écriture incrémente
+  un compteur partagé dans `compteurs`, lu avant chaque calcul (valable pour tous les workers)
+- Le compteur (primaire) et les données (secondaires éventuels) sont lus dans la même session
+  causale: un secondaire en retard attend d'avoir rattrapé la version lue avant de répondre,
+  et le résultat mis en cache correspond bien à cette version
+- NumPy n'est importé qu'au premier calcul
+"""
+from collections import OrderedDict
+from typing import List, Tuple
+
+from bson import ObjectId
+
+from database import (
+    compteurs_collection, evaluations_collection, travaux_collection, espaces_collection,
+    etudiants_collection
+)
+from archives import find_avec_archive
+from lectures import read_router
+
+NOTE_MAX = 20.0
+NOTE_REUSSITE = 10.0
+LARGEUR_CLASSE = 2.0
+MIN_ETUDIANTS_CORRELATION = 3
+CACHE_SIZE = 256
+
+_cache: "OrderedDict[Tuple[str, str], Tuple[int, dict]]" = OrderedDict()
+
+
+async def evaluations_modifiees():
+    """À appeler après chaque écriture d'évaluation: invalide les analyses en cache"""
+    await compteurs_collection.update_one({"_id": "evaluations"}, {"$inc": {"version": 1}}, upsert=True)
+
+
+async def _version(session=None) -> int:
+    doc = await compteurs_collection.find_one({"_id": "evaluations"}, session=session)
+    return doc["version"] if doc else 0
+
+
+async def _avec_cache(cle: Tuple[str, str], lire, calcul) -> dict:
+    async with read_router.causal(lire) as lire:
+        version = await _version(lire.session)
+        cached = _cache.get(cle)
+        if cached and cached[0] == version:
+            _cache.move_to_end(cle)
+            return cached[1]
+
+        resultat = await calcul(lire)
+    _cache[cle] = (version, resultat)
+    _cache.move_to_end(cle)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return resultat
+
+
+def _statistiques(notes) -> dict:
+    import numpy as np
+
+    if notes.size == 0:
+        return {"nombre": 0}
+    bornes = np.arange(0.0, NOTE_MAX + LARGEUR_CLASSE, LARGEUR_CLASSE)
+    histogramme, _ = np.histogram(notes, bins=bornes)
+    q1, mediane, q3 = np.percentile(notes, [25, 50, 75])
+    return {
+        "nombre": int(notes.size),
+        "moyenne": round(float(notes.mean()), 2),
+        "ecart_type": round(float(notes.std()), 2),
+        "note_min": float(notes.min()),
+        "note_max": float(notes.max()),
+        "quartile_1": round(float(q1), 2),
+        "mediane": round(float(mediane), 2),
+        "quartile_3": round(float(q3), 2),
+        "taux_reussite": round(float((notes >= NOTE_REUSSITE).mean()), 4),
+        "histogramme": [
+            {"de": float(bornes[i]), "a": float(bornes[i + 1]), "nombre": int(n)}
+            for i, n in enumerate(histogramme)
+        ]
+    }
+
+
+def _par_groupe(codes, notes, nombre_groupes: int):
+    """Effectif, moyenne, écart-type et taux de réussite de chaque groupe, sans boucle Python"""
+    import numpy as np
+
+    effectifs = np.bincount(codes, minlength=nombre_groupes)
+    sommes = np.bincount(codes, weights=notes, minlength=nombre_groupes)
+    carres = np.bincount(codes, weights=notes * notes, minlength=nombre_groupes)
+    reussites = np.bincount(codes, weights=(notes >= NOTE_REUSSITE).astype(float), minlength=nombre_groupes)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        moyennes = sommes / effectifs
+        ecarts = np.sqrt(np.maximum(carres / effectifs - moyennes ** 2, 0.0))
+        taux = reussites / effectifs
+    return effectifs, moyennes, ecarts, taux
+
+
+def _tableaux(evaluations: List[dict], *cles: str):
+    """Notes en float64 contigu, et pour chaque clé les codes entiers + valeurs distinctes"""
+    import numpy as np
+
+    notes = np.fromiter((e["note"] for e in evaluations), dtype=np.float64, count=len(evaluations))
+    groupes = []
+    for cle in cles:
+        valeurs, codes = np.unique(np.array([str(e[cle]) for e in evaluations]), return_inverse=True)
+        groupes.append((valeurs, codes))
+    return notes, groupes
+
+
+async def analyse_espace(espace: dict, lire) -> dict:
+    async def calcul(lire):
+        travaux = await lire(travaux_collection).find({"espace_id": espace["_id"]}, {"titre": 1}).to_list(None)
+        titres = {str(t["_id"]): t.get("titre") for t in travaux}
+        evaluations = await lire(evaluations_collection).find(
+            {"travail_id": {"$in": [t["_id"] for t in travaux]}}, {"note": 1, "travail_id": 1}
+        ).to_list(None)
+
+        resultat = {"espace_id": str(espace["_id"]), "nom_matiere": espace["nom_matiere"], "travaux": []}
+        if not evaluations:
+            resultat["statistiques"] = {"nombre": 0}
+            return resultat
+
+        notes, [(travail_ids, codes)] = _tableaux(evaluations, "travail_id")
+        resultat["statistiques"] = _statistiques(notes)
+
+        effectifs, moyennes, ecarts, taux = _par_groupe(codes, notes, len(travail_ids))
+        resultat["travaux"] = sorted((
+            {
+                "travail_id": travail_ids[i],
+                "titre": titres.get(travail_ids[i]),
+                "nombre": int(effectifs[i]),
+                "moyenne": round(float(moyennes[i]), 2),
+                "ecart_type": round(float(ecarts[i]), 2),
+                "taux_reussite": round(float(taux[i]), 4),
+                # 0: tout le monde a 20, 1: tout le monde a 0
+                "difficulte": round(1 - float(moyennes[i]) / NOTE_MAX, 4)
+            }
+            for i in range(len(travail_ids))
+        ), key=lambda t: -t["difficulte"])
+        return resultat
+
+    return await _avec_cache(("espace", str(espace["_id"])), lire, calcul)
+
+
+async def analyse_promotion(promotion: dict, lire) -> dict:
+    async def calcul(lire):
+        import numpy as np
+
+        etudiant_ids = await lire(etudiants_collection).distinct("_id", {"promotion_id": promotion["_id"]})
+        query = {"etudiant_id": {"$in": etudiant_ids}}
+        projection = {"note": 1, "travail_id": 1, "etudiant_id": 1}
+        evaluations = await lire(evaluations_collection).find(query, projection).to_list(None)
+        if promotion.get("archivee"):
+            evaluations = await find_avec_archive("evaluations", query, projection, active_docs=evaluations)
+
+        travail_query = {"_id": {"$in": list({e["travail_id"] for e in evaluations})}}
+        if promotion.get("archivee"):
+            travaux = await find_avec_archive("travaux", travail_query, {"espace_id": 1})
+        else:
+            travaux = await lire(travaux_collection).find(travail_query, {"espace_id": 1}).to_list(None)
+
+        espace_par_travail = {t["_id"]: t["espace_id"] for t in travaux}
+        evaluations = [
+            {**e, "espace_id": espace_par_travail[e["travail_id"]]}
+            for e in evaluations if e["travail_id"] in espace_par_travail
+        ]
+
+        resultat = {
+            "promotion_id": str(promotion["_id"]),
+            "nom": promotion["nom"],
+            "nombre_etudiants": len(etudiant_ids),
+            "moyennes_generales": {"nombre": 0},
+            "matieres": [],
+            "correlations": []
+        }
+        if not evaluations:
+            return resultat
+
+        notes, [(etudiants, code_etudiant), (espace_ids, code_matiere)] = _tableaux(
+            evaluations, "etudiant_id", "espace_id"
+        )
+        espaces = {
+            str(e["_id"]): e for e in await lire(espaces_collection).find(
+                {"_id": {"$in": [ObjectId(i) for i in espace_ids]}}, {"nom_matiere": 1, "coefficient": 1}
+            ).to_list(None)
+        }
+        nb_etudiants, nb_matieres = len(etudiants), len(espace_ids)
+        noms = [espaces.get(i, {}).get("nom_matiere", i) for i in espace_ids]
+        coefficients = np.array([espaces.get(i, {}).get("coefficient") or 1 for i in espace_ids], dtype=np.float64)
+
+        # Matrice étudiants x matières des moyennes (NaN si l'étudiant n'a aucune note dans la matière)
+        cellules = code_etudiant * nb_matieres + code_matiere
+        _, moyennes, _, _ = _par_groupe(cellules, notes, nb_etudiants * nb_matieres)
+        matrice = moyennes.reshape(nb_etudiants, nb_matieres)
+        presentes = ~np.isnan(matrice)
+
+        poids = presentes * coefficients
+        with np.errstate(invalid="ignore", divide="ignore"):
+            generales = np.nansum(matrice * coefficients, axis=1) / poids.sum(axis=1)
+        resultat["moyennes_generales"] = _statistiques(generales[~np.isnan(generales)])
+
+        ordre = np.argsort(code_matiere, kind="stable")
+        separations = np.cumsum(np.bincount(code_matiere, minlength=nb_matieres))[:-1]
+        for j, notes_matiere in enumerate(np.split(notes[ordre], separations)):
+            resultat["matieres"].append({
+                "espace_id": espace_ids[j],
+                "nom_matiere": noms[j],
+                "coefficient": float(coefficients[j]),
+                "statistiques": _statistiques(notes_matiere)
+            })
+
+        # Corrélation de Pearson entre matières, sur les étudiants notés dans les deux
+        for a in range(nb_matieres):
+            for b in range(a + 1, nb_matieres):
+                communs = presentes[:, a] & presentes[:, b]
+                nombre = int(communs.sum())
+                correlation = None
+                if nombre >= MIN_ETUDIANTS_CORRELATION:
+                    x, y = matrice[communs, a], matrice[communs, b]
+                    if x.std() > 0 and y.std() > 0:
+                        correlation = round(float(np.corrcoef(x, y)[0, 1]), 4)
+                resultat["correlations"].append({
+                    "matiere_a": noms[a],
+                    "matiere_b": noms[b],
+                    "correlation": correlation,
+                    "nombre_etudiants": nombre
+                })
+        return resultat
+
+    return await _avec_cache(("promotion", str(promotion["_id"])), lire, calcul)
@@ -0,0 +1,200 @@
+"""
+Archivage des promotions terminées
+- Une promotion est terminée quand son annee_fin est passée
+- Ses évaluations (avec leur audit), livraisons et travaux (quand tous les assignés, ou tous
+  les membres de l'espace pour un travail d'audience espace, sont archivés) passent dans les collections *_archive: les collections actives et leurs index
+  ne grossissent plus qu'avec les promotions en cours
+- Déplacement par lots: copie idempotente (upsert) dans l'archive, suppression dans la
+  collection active, puis point de reprise dans `archivages`; une exécution interrompue
+  reprend au dernier lot
+- Lectures: une recherche par identifiant retombe sur l'archive seulement si le document
+  n'est plus actif; les listes d'un étudiant archivé, ou d'un travail dont une partie des
+  livraisons est archivée (`livraisons_archivees`), lisent les deux
+
+Usage: python archives.py [--promotion ID] [--batch-size 500]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from assignations import membres_espaces
+from database import (
+    promotions_collection, etudiants_collection, archivages_collection,
+    travaux_collection, livraisons_collection, evaluations_collection, evaluation_audit_collection,
+    travaux_archive_collection, livraisons_archive_collection, evaluations_archive_collection,
+    evaluation_audit_archive_collection
+)
+
+BATCH_SIZE = 500
+
+ARCHIVES = {
+    "travaux": (travaux_collection, travaux_archive_collection),
+    "livraisons": (livraisons_collection, livraisons_archive_collection),
+    "evaluations": (evaluations_collection, evaluations_archive_collection),
+    "evaluation_audit": (evaluation_audit_collection, evaluation_audit_archive_collection)
+}
+
+Rapport = Optional[Callable[[str], Awaitable[None]]]
+
+
+# --- Lectures ---
+
+async def find_one_avec_archive(nom: str, query: dict, projection: Optional[dict] = None) -> Optional[dict]:
+    active, archive = ARCHIVES[nom]
+    doc = await active.find_one(query, projection)
+    if doc is None:
+        doc = await archive.find_one(query, projection)
+    return doc
+
+
+async def find_avec_archive(nom: str, query: dict, projection: Optional[dict] = None,
+                            active_docs: Optional[List[dict]] = None) -> List[dict]:
+    """Documents actifs (ou `active_docs` déjà lus) complétés par l'archive, sans doublon"""
+    active, archive = ARCHIVES[nom]
+    if active_docs is None:
+        active_docs = await active.find(query, projection).to_list(None)
+    vus = {doc["_id"] for doc in active_docs}
+    archives = await archive.find(query, projection).to_list(None)
+    return active_docs + [doc for doc in archives if doc["_id"] not in vus]
+
+
+def etudiant_archive(etudiant: Optional[dict]) -> bool:
+    return bool(etudiant and etudiant.get("archive"))
+
+
+# --- Archivage ---
+
+async def _deplacer(nom: str, query: dict, promotion_id: ObjectId, batch_size: int,
+                    selection=None, avant_suppression=None) -> int:
+    """Déplace par lots (ordre de _id) les documents de `query` à partir du point de reprise"""
+    active, archive = ARCHIVES[nom]
+    etat = await archivages_collection.find_one({"_id": promotion_id}, {f"curseurs.{nom}": 1})
+    dernier = (etat or {}).get("curseurs", {}).get(nom)
+    deplaces = 0
+
+    while True:
+        lot_query = {**query, "_id": {"$gt": dernier}} if dernier else query
+        lot = await active.find(lot_query).sort("_id", 1).limit(batch_size).to_list(None)
+        if not lot:
+            return deplaces
+
+        docs = await selection(lot) if selection else lot
+        if docs:
+            ids = [doc["_id"] for doc in docs]
+            await archive.bulk_write(
+                [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in docs], ordered=False
+            )
+            if avant_suppression:
+                await avant_suppression(docs)
+            await active.delete_many({"_id": {"$in": ids}})
+
+        dernier = lot[-1]["_id"]
+        deplaces += len(docs)
+        await archivages_collection.update_one(
+            {"_id": promotion_id},
+            {"$set": {f"curseurs.{nom}": dernier}, "$inc": {f"deplaces.{nom}": len(docs)}}
+        )
+
+
+async def archiver_promotion(promotion: dict, batch_size: int = BATCH_SIZE, rapport: Rapport = None) -> dict:
+    promotion_id = promotion["_id"]
+    await archivages_collection.update_one(
+        {"_id": promotion_id},
+        {"$setOnInsert": {"nom": promotion.get("nom"), "debut": datetime.utcnow(), "curseurs": {}, "deplaces": {}},
+         "$set": {"statut": "en_cours"}},
+        upsert=True
+    )
+
+    # Marqués d'abord: pendant le déplacement, leurs lectures consultent déjà les deux côtés
+    await etudiants_collection.update_many({"promotion_id": promotion_id}, {"$set": {"archive": True}})
+    etudiant_ids = await etudiants_collection.distinct("_id", {"promotion_id": promotion_id})
+    # Espaces suivis par la promotion: leurs travaux d'audience espace sont candidats
+    membres = await membres_espaces(etudiant_ids)
+
+    async def deplacer_audit(evaluations):
+        evaluation_ids = [e["_id"] for e in evaluations]
+        await _deplacer("evaluation_audit", {"evaluation_id": {"$in": evaluation_ids}},
+                        promotion_id, batch_size)
+        # Le curseur d'audit ne vaut que pour ce lot d'évaluations
+        await archivages_collection.update_one({"_id": promotion_id}, {"$unset": {"curseurs.evaluation_audit": ""}})
+
+    async def marquer_travaux(livraisons):
+        # Un travail encore actif signale qu'une partie de ses livraisons est à l'archive
+        await travaux_collection.update_many(
+            {"_id": {"$in": list({l["travail_id"] for l in livraisons})}},
+            {"$set": {"livraisons_archivees": True}}
+        )
+
+    def assignes(travail):
+        audience = travail.get("audience")
+        if not audience:
+            return travail.get("etudiants_assignes", [])
+        return membres.get(audience["id"], []) if audience["type"] == "espace" else []
+
+    async def tous_assignes_archives(travaux):
+        # L'espace peut compter des étudiants d'autres promotions encore en cours
+        actifs = set(await etudiants_collection.distinct(
+            "_id", {"_id": {"$in": list({e for t in travaux for e in assignes(t)})}, "archive": {"$ne": True}}
+        ))
+        # Un travail assigné à la promotion (audience) part avec elle
+        return [t for t in travaux if not actifs.intersection(assignes(t))]
+
+    totaux = {}
+    for nom, query, options in (
+        ("evaluations", {"etudiant_id": {"$in": etudiant_ids}}, {"avant_suppression": deplacer_audit}),
+        ("livraisons", {"etudiant_id": {"$in": etudiant_ids}}, {"avant_suppression": marquer_travaux}),
+        ("travaux", {"$or": [{"etudiants_assignes": {"$in": etudiant_ids}},
+                             {"audience.type": "promotion", "audience.id": promotion_id},
+                             {"audience.type": "espace", "audience.id": {"$in": list(membres)}}]},
+         {"selection": tous_assignes_archives})
+    ):
+        totaux[nom] = await _deplacer(nom, query, promotion_id, batch_size, **options)
+        if rapport:
+            await rapport(f"{promotion.get('nom')}: {totaux[nom]} {nom} archivés")
+
+    await archivages_collection.update_one(
+        {"_id": promotion_id}, {"$set": {"statut": "termine", "fin": datetime.utcnow()}}
+    )
+    await promotions_collection.update_one(
+        {"_id": promotion_id}, {"$set": {"archivee": True, "archivee_le": datetime.utcnow()}}
+    )
+    return totaux
+
+
+async def promotions_terminees(promotion_id: Optional[str] = None) -> List[dict]:
+    query = {"annee_fin": {"$lt": datetime.utcnow().year}, "archivee": {"$ne": True}}
+    if promotion_id:
+        query["_id"] = ObjectId(promotion_id)
+    return await promotions_collection.find(query, {"nom": 1, "annee_fin": 1}).to_list(None)
+
+
+async def archiver_promotions_terminees(promotion_id: Optional[str] = None, batch_size: int = BATCH_SIZE,
+                                        rapport: Rapport = None) -> dict:
+    resultats = {}
+    for promotion in await promotions_terminees(promotion_id):
+        resultats[str(promotion["_id"])] = await archiver_promotion(promotion, batch_size, rapport)
+    return resultats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Archive les promotions terminées")
+    parser.add_argument("--promotion", help="N'archiver que cette promotion")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    async def afficher(message: str):
+        print(f"📦 {message}")
+
+    resultats = await archiver_promotions_terminees(args.promotion, args.batch_size, afficher)
+    if not resultats:
+        print("ℹ️  Aucune promotion terminée à archiver")
+    else:
+        print(f"✅ {len(resultats)} promotion(s) archivée(s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+"""
+Étudiants assignés à un travail
+- Liste explicite (`etudiants_assignes`, travaux de groupe), ou public de référence (`audience`):
+  toute une promotion {"type": "promotion", "id"} ou tout l'espace du travail {"type": "espace", "id"}
+- Une audience n'est développée en liste d'étudiants que si besoin, en une requête `$in`
+- "Mes travaux": un `$or` entre la liste explicite, la promotion de l'étudiant et les espaces
+  dont il est membre, chaque branche servie par son index
+"""
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+from database import etudiants_collection, espaces_collection
+
+def _lire(collection, lire):
+    return lire(collection) if lire else collection
+
+
+def _ids_membres(espace: Optional[dict]) -> List[ObjectId]:
+    # Selon leur ancienneté, les espaces stockent les identifiants en texte ou en ObjectId
+    # Une entrée sans identifiant valide (données anciennes) est ignorée plutôt que de tout faire échouer
+    return [
+        ObjectId(str(e["id"])) for e in (espace or {}).get("etudiants", [])
+        if isinstance(e, dict) and e.get("id") is not None and ObjectId.is_valid(str(e["id"]))
+    ]
+
+
+async def membres_espaces(etudiant_ids: List[ObjectId]) -> Dict[ObjectId, List[ObjectId]]:
+    """Membres de chaque espace comptant au moins un de ces étudiants"""
+    cursor = espaces_collection.find(
+        {"etudiants.id": {"$in": etudiant_ids + [str(e) for e in etudiant_ids]}}, {"etudiants": 1}
+    )
+    return {e["_id"]: _ids_membres(e) for e in await cursor.to_list(None)}
+
+
+async def espaces_membre(etudiant_id: ObjectId, lire=None) -> List[ObjectId]:
+    cursor = _lire(espaces_collection, lire).find(
+        {"etudiants.id": {"$in": [etudiant_id, str(etudiant_id)]}}, {"_id": 1}
+    )
+    return [e["_id"] for e in await cursor.to_list(None)]
+
+
+async def etudiants_assignes(travail: dict, lire=None, projection: Optional[dict] = None) -> List[dict]:
+    """Étudiants du travail (liste explicite ou audience développée), en une requête `$in`"""
+    projection = projection or {"nom_complet": 1}
+    audience = travail.get("audience")
+    if not audience:
+        query = {"_id": {"$in": travail.get("etudiants_assignes", [])}}
+    elif audience["type"] == "promotion":
+        query = {"promotion_id": audience["id"]}
+    else:
+        espace = await _lire(espaces_collection, lire).find_one({"_id": audience["id"]}, {"etudiants": 1})
+        query = {"_id": {"$in": _ids_membres(espace)}}
+    return await _lire(etudiants_collection, lire).find(query, projection).to_list(None)
+
+
+async def est_assigne(travail: dict, etudiant_id: ObjectId) -> bool:
+    audience = travail.get("audience")
+    if not audience:
+        return etudiant_id in travail.get("etudiants_assignes", [])
+    if audience["type"] == "promotion":
+        return await etudiants_collection.count_documents(
+            {"_id": etudiant_id, "promotion_id": audience["id"]}, limit=1
+        ) > 0
+    return await espaces_collection.count_documents(
+        {"_id": audience["id"], "etudiants.id": {"$in": [etudiant_id, str(etudiant_id)]}}, limit=1
+    ) > 0
+
+
+async def branches_travaux_etudiant(etudiant_id: ObjectId, lire=None, etudiant: Optional[dict] = None) -> List[dict]:
+    """Une condition par mode d'assignation, chacune servie par son index"""
+    if etudiant is None:
+        etudiant = await _lire(etudiants_collection, lire).find_one({"_id": etudiant_id}, {"promotion_id": 1})
+    branches = [{"etudiants_assignes": etudiant_id}]
+    if etudiant and etudiant.get("promotion_id"):
+        branches.append({"audience.type": "promotion", "audience.id": etudiant["promotion_id"]})
+    espaces = await espaces_membre(etudiant_id, lire)
+    if espaces:
+        branches.append({"audience.type": "espace", "audience.id": {"$in": espaces}})
+    return branches
+
+
+async def query_travaux_etudiant(etudiant_id: ObjectId, lire=None, etudiant: Optional[dict] = None) -> dict:
+    """Filtre des travaux assignés à l'étudiant, directement ou via sa promotion / ses espaces"""
+    branches = await branches_travaux_etudiant(etudiant_id, lire, etudiant)
+    return {"$or": branches} if len(branches) > 1 else branches[0]
+
+
+async def resumes_assignes(travaux: List[dict], lire=None) -> Dict[ObjectId, List[dict]]:
+    """{travail_id: [{id, nom_complet}]} pour les listes explicites, en une seule requête;
+    les travaux à audience n'y figurent pas (voir `nombre_assignes`)"""
+    ids = {e for t in travaux if not t.get("audience") for e in t.get("etudiants_assignes", [])}
+    noms = {}
+    if ids:
+        etudiants = await _lire(etudiants_collection, lire).find(
+            {"_id": {"$in": list(ids)}}, {"nom_complet": 1}
+        ).to_list(None)
+        noms = {e["_id"]: e["nom_complet"] for e in etudiants}
+    return {
+        t["_id"]: [{"id": str(e), "nom_complet": noms[e]} for e in t.get("etudiants_assignes", []) if e in noms]
+        for t in travaux if not t.get("audience")
+    }
+
+
+async def effectifs_promotions(promotion_ids, lire=None) -> Dict[ObjectId, int]:
+    """{promotion_id: nombre d'étudiants}, en une seule agrégation"""
+    if not promotion_ids:
+        return {}
+    cursor = _lire(etudiants_collection, lire).aggregate([
+        {"$match": {"promotion_id": {"$in": list(promotion_ids)}}},
+        {"$group": {"_id": "$promotion_id", "n": {"$sum": 1}}}
+    ])
+    return {d["_id"]: d["n"] async for d in cursor}
+
+
+async def nombre_assignes(travail: dict, lire=None, espace: Optional[dict] = None,
+                          effectifs: Optional[Dict[ObjectId, int]] = None) -> int:
+    """`espace`: l'espace du travail s'il est déjà lu (avec ses `etudiants`);
+    `effectifs`: résultat de `effectifs_promotions` pour une liste de travaux"""
+    audience = travail.get("audience")
+    if not audience:
+        return len(travail.get("etudiants_assignes", []))
+    if audience["type"] == "promotion":
+        if effectifs is not None:
+            return effectifs.get(audience["id"], 0)
+        return await _lire(etudiants_collection, lire).count_documents({"promotion_id": audience["id"]})
+    if espace is None or espace["_id"] != audience["id"]:
+        espace = await _lire(espaces_collection, lire).find_one({"_id": audience["id"]}, {"etudiants": 1})
+    return len(_ids_membres(espace))
@@ -0,0 +1,93 @@
+"""
+Mesure de la compression du contenu des livraisons
+- Crée une base temporaire (<DB_NAME>_bench_contenus) avec N livraisons de longs textes
+- Mesure la taille de `livraisons` (collStats) et le temps d'un parcours complet,
+  avant puis après la migration 0002_livraisons_contenu_compresse
+- La base est supprimée à la fin
+
+Usage: python bench_contenus.py [--livraisons 2000] [--mots 3000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime
+
+os.environ["DB_NAME"] = f"{os.getenv('DB_NAME', 'gestion_pedagogique')}_bench_contenus"
+
+from bson import ObjectId  # noqa: E402
+
+from database import get_database, livraisons_collection, close_client  # noqa: E402
+from migrations import executer, get_migration  # noqa: E402
+import evolutions  # noqa: E402,F401 (enregistre les migrations)
+
+VOCABULAIRE = (
+    "la de le et les des en un une du que est pour qui dans par sur pas au plus avec ce il sont "
+    "analyse démonstration hypothèse résultat méthode conclusion exemple théorème données modèle "
+    "algorithme complexité structure fonction variable équation solution problème question réponse"
+).split()
+
+
+def dissertation(mots: int) -> str:
+    phrases = []
+    while mots > 0:
+        n = min(mots, random.randint(8, 20))
+        phrases.append(" ".join(random.choices(VOCABULAIRE, k=n)).capitalize() + ".")
+        mots -= n
+    return " ".join(phrases)
+
+
+async def mesurer(nom: str) -> dict:
+    db = get_database()
+    stats = await db.command("collStats", nom)
+    debut = time.perf_counter()
+    for _ in range(3):
+        # Aucun index sur `modifiable`: parcours complet de la collection
+        await db[nom].find({"modifiable": True}).to_list(None)
+    return {"taille": stats.get("size", 0), "stockage": stats.get("storageSize", 0),
+            "parcours_ms": (time.perf_counter() - debut) / 3 * 1000}
+
+
+def _mo(octets: int) -> str:
+    return f"{octets / 1024 / 1024:.1f} Mo"
+
+
+async def main(livraisons: int, mots: int):
+    db = get_database()
+    await db.client.drop_database(db.name)
+    try:
+        print(f"📝 {livraisons} livraisons de ~{mots} mots dans {db.name}")
+        for debut in range(0, livraisons, 500):
+            await livraisons_collection.insert_many([{
+                "travail_id": ObjectId(),
+                "etudiant_id": ObjectId(),
+                "contenu": dissertation(mots),
+                "fichiers_urls": [],
+                "liens": [],
+                "date_soumission": datetime.utcnow(),
+                "modifiable": False
+            } for _ in range(min(500, livraisons - debut))])
+
+        avant = await mesurer("livraisons")
+        resultat = await executer(get_migration("0002_livraisons_contenu_compresse"))
+        apres = await mesurer("livraisons")
+        contenus = await db.command("collStats", "contenus")
+
+        print(f"🔄 Migration: {resultat['modifies']} livraisons compressées")
+        print(f"{'':<28}{'avant':>12}{'après':>12}")
+        print(f"{'livraisons (taille)':<28}{_mo(avant['taille']):>12}{_mo(apres['taille']):>12}")
+        print(f"{'livraisons (stockage)':<28}{_mo(avant['stockage']):>12}{_mo(apres['stockage']):>12}")
+        print(f"{'parcours complet':<28}{avant['parcours_ms']:>10.0f}ms{apres['parcours_ms']:>10.0f}ms")
+        print(f"{'contenus (taille)':<28}{'':>12}{_mo(contenus.get('size', 0)):>12}")
+    finally:
+        await db.client.drop_database(db.name)
+        close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la compression des contenus de livraison")
+    parser.add_argument("--livraisons", type=int, default=2000)
+    parser.add_argument("--mots", type=int, default=3000)
+    args = parser.parse_args()
+    asyncio.run(main(args.livraisons, args.mots))
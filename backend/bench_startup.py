@@ -0,0 +1,110 @@
+"""
+Mesure du démarrage à froid
+- Temps d'import par module (python -X importtime), dans un processus neuf
+- Temps jusqu'à la première requête réussie (GET /) sur un uvicorn lancé à froid
+- Code de sortie 1 si un des budgets est dépassé
+
+Usage: python bench_startup.py [--import-budget-ms 2500] [--first-request-budget-ms 5000] [--top 15]
+(budgets aussi configurables via IMPORT_BUDGET_MS et FIRST_REQUEST_BUDGET_MS)
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def mesurer_imports():
+    """Retourne (total_ms, [(module, self_ms, cumulé_ms)]) pour `import main`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        raise SystemExit("❌ Import de main impossible")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumul_us, name = line[len("import time:"):].split("|")
+        modules.append((name.rstrip(), int(self_us) / 1000, int(cumul_us) / 1000))
+
+    total = next((cumul for name, _, cumul in modules if name.strip() == "main"), 0.0)
+    return total, modules
+
+
+def _port_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def mesurer_premiere_requete(timeout: float = 30.0) -> float:
+    """Lance uvicorn et retourne le délai (ms) jusqu'au premier 200 sur GET /"""
+    port = _port_libre()
+    url = f"http://127.0.0.1:{port}/"
+    debut = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        while time.perf_counter() - debut < timeout:
+            if process.poll() is not None:
+                print(process.stderr.read().decode(errors="replace"))
+                raise SystemExit("❌ Le serveur s'est arrêté au démarrage")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - debut) * 1000
+            except OSError:
+                time.sleep(0.02)
+        raise SystemExit(f"❌ Aucune réponse après {timeout:.0f}s")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage à froid de l'API")
+    parser.add_argument("--import-budget-ms", type=float,
+                        default=float(os.getenv("IMPORT_BUDGET_MS", "2500")))
+    parser.add_argument("--first-request-budget-ms", type=float,
+                        default=float(os.getenv("FIRST_REQUEST_BUDGET_MS", "5000")))
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    total_import, modules = mesurer_imports()
+    print(f"⏱️  Import de main: {total_import:.0f} ms")
+    print(f"{'module':<50}{'self (ms)':>12}{'cumulé (ms)':>14}")
+    for name, self_ms, cumul_ms in sorted(modules, key=lambda m: m[2], reverse=True)[:args.top]:
+        print(f"{name[:50]:<50}{self_ms:>12.1f}{cumul_ms:>14.1f}")
+
+    premiere_requete = mesurer_premiere_requete()
+    print(f"\n⏱️  Première requête réussie: {premiere_requete:.0f} ms")
+
+    echecs = []
+    if total_import > args.import_budget_ms:
+        echecs.append(f"import {total_import:.0f} ms > budget {args.import_budget_ms:.0f} ms")
+    if premiere_requete > args.first_request_budget_ms:
+        echecs.append(f"première requête {premiere_requete:.0f} ms > budget {args.first_request_budget_ms:.0f} ms")
+
+    if echecs:
+        for echec in echecs:
+            print(f"❌ Régression: {echec}")
+        sys.exit(1)
+    print("✅ Budgets de démarrage respectés")
+
+
+if __name__ == "__main__":
+    main()
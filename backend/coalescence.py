@@ -0,0 +1,52 @@
+"""
+Regroupement des lectures identiques simultanées (singleflight)
+- Pour les routes listées dans COALESCED_ROUTES, les requêtes GET identiques (mêmes paramètres,
+  même profil d'accès) qui arrivent pendant qu'un calcul est en cours attendent son résultat
+  au lieu de relancer les mêmes requêtes MongoDB
+- Le calcul tourne dans sa propre tâche: il n'est pas interrompu si le client qui l'a lancé
+  se déconnecte, et ses erreurs (404...) sont transmises à toutes les requêtes en attente
+- Une requête qui doit relire ses propres écritures (session causale) calcule seule
+- Propre à chaque worker; compteurs consultables via GET /api/coalescence
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from database import COALESCED_ROUTES
+
+ROUTES = {r.strip() for r in COALESCED_ROUTES.split(",") if r.strip()}
+
+
+class Singleflight:
+    def __init__(self):
+        self._en_vol: Dict[Tuple, asyncio.Task] = {}
+        self.compteurs: Dict[str, Dict[str, int]] = {}
+
+    async def executer(self, route: str, cle: Hashable, current_user: dict, lire,
+                       calcul: Callable[[], Awaitable[Any]]) -> Any:
+        if route not in ROUTES or lire.session is not None:
+            return await calcul()
+
+        compteurs = self.compteurs.setdefault(route, {"calculs": 0, "partages": 0})
+        vol = (route, cle, current_user["user_type"])
+        task = self._en_vol.get(vol)
+        if task is not None:
+            compteurs["partages"] += 1
+        else:
+            compteurs["calculs"] += 1
+            task = asyncio.ensure_future(calcul())
+            self._en_vol[vol] = task
+            task.add_done_callback(lambda t: self._terminer(vol, t))
+        return await asyncio.shield(task)
+
+    def _terminer(self, vol: Tuple, task: asyncio.Task):
+        if self._en_vol.get(vol) is task:
+            del self._en_vol[vol]
+        # Récupérée ici: sans attente restante, l'erreur ne doit pas être signalée comme perdue
+        if not task.cancelled():
+            task.exception()
+
+    def etat(self) -> dict:
+        return {"routes": sorted(ROUTES), "en_vol": len(self._en_vol), "compteurs": self.compteurs}
+
+
+singleflight = Singleflight()
@@ -0,0 +1,105 @@
+"""
+Contenu texte des livraisons, compressé au-delà d'un seuil
+- Au-delà de CONTENU_COMPRESSION_SEUIL octets, le texte est compressé (zlib) dans la collection
+  `contenus`, adressée par l'empreinte SHA-256 du texte; la livraison ne garde que
+  `contenu_ref` {sha256, taille, compression}
+- Les livraisons restent petites: les parcours de `livraisons` ne lisent plus les dissertations
+- `charger()` remet le texte dans `contenu` à la lecture, en une requête pour toute une liste
+- La tâche `purge_contenus` supprime les textes qu'aucune livraison (active ou archivée)
+  ne référence plus, après un délai de grâce pour les écritures en cours
+"""
+import hashlib
+import zlib
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from bson import Binary
+from pymongo import UpdateOne
+
+from database import (
+    contenus_collection, livraisons_collection, livraisons_archive_collection, CONTENU_COMPRESSION_SEUIL
+)
+
+NIVEAU = 6
+# Un texte stocké juste avant l'écriture de sa livraison (migrations) n'est jamais purgé entre les deux
+GRACE_HEURES = 1
+LOT_PURGE = 500
+
+
+def reference(contenu: Optional[str]) -> Optional[dict]:
+    """Référence du contenu s'il doit être stocké à part, sinon None"""
+    if not contenu:
+        return None
+    donnees = contenu.encode("utf-8")
+    if len(donnees) <= CONTENU_COMPRESSION_SEUIL:
+        return None
+    return {"sha256": hashlib.sha256(donnees).hexdigest(), "taille": len(donnees), "compression": "zlib"}
+
+
+async def enregistrer(contenus: Iterable[str]):
+    """Stocke compressés les contenus au-delà du seuil (un même texte n'est stocké qu'une fois)"""
+    operations = []
+    for contenu in contenus:
+        ref = reference(contenu)
+        if ref is None:
+            continue
+        operations.append(UpdateOne(
+            {"_id": ref["sha256"]},
+            {"$setOnInsert": {
+                "donnees": Binary(zlib.compress(contenu.encode("utf-8"), NIVEAU)),
+                "taille": ref["taille"],
+                "compression": ref["compression"],
+                "created_at": datetime.utcnow()
+            }},
+            upsert=True
+        ))
+    if operations:
+        await contenus_collection.bulk_write(operations, ordered=False)
+
+
+def preparer(contenu: Optional[str]) -> dict:
+    """Champs à écrire dans la livraison: le texte lui-même, ou sa seule référence.
+    Rien n'est stocké ici: `enregistrer` une fois la livraison effectivement créée"""
+    ref = reference(contenu)
+    if ref is None:
+        return {"contenu": contenu}
+    return {"contenu": None, "contenu_ref": ref}
+
+
+async def charger(livraisons: List[dict], lire=None) -> List[dict]:
+    """Décompresse dans `contenu` le texte des livraisons qui n'en ont que la référence"""
+    empreintes = {l["contenu_ref"]["sha256"] for l in livraisons if l.get("contenu_ref")}
+    if not empreintes:
+        return livraisons
+
+    collection = lire(contenus_collection) if lire else contenus_collection
+    docs = await collection.find({"_id": {"$in": list(empreintes)}}).to_list(None)
+    textes = {d["_id"]: zlib.decompress(d["donnees"]).decode("utf-8") for d in docs}
+    for l in livraisons:
+        if l.get("contenu_ref"):
+            l["contenu"] = textes.get(l["contenu_ref"]["sha256"])
+    return livraisons
+
+
+async def purger() -> int:
+    """Supprime, par lots, les textes stockés qu'aucune livraison ne référence"""
+    limite = datetime.utcnow() - timedelta(hours=GRACE_HEURES)
+    supprimes = 0
+    dernier = None
+    while True:
+        query = {"created_at": {"$lt": limite}}
+        if dernier is not None:
+            query["_id"] = {"$gt": dernier}
+        lot = [d["_id"] for d in await contenus_collection.find(query, {"_id": 1})
+               .sort("_id", 1).limit(LOT_PURGE).to_list(None)]
+        if not lot:
+            return supprimes
+        dernier = lot[-1]
+
+        utilises = set()
+        for collection in (livraisons_collection, livraisons_archive_collection):
+            utilises.update(await collection.distinct("contenu_ref.sha256", {"contenu_ref.sha256": {"$in": lot}}))
+        orphelins = [h for h in lot if h not in utilises]
+        if orphelins:
+            result = await contenus_collection.delete_many({"_id": {"$in": orphelins}, "created_at": {"$lt": limite}})
+            supprimes += result.deleted_count
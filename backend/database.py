@@ -1,5 +1,7 @@
 import os
+import threading
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,15 +12,197 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 JWT_SECRET = os.getenv("JWT_SECRET", "secret-key")
+ACCESS_TOKEN_MINUTES = int(os.getenv("ACCESS_TOKEN_MINUTES", "30"))
+REFRESH_TOKEN_DAYS = int(os.getenv("REFRESH_TOKEN_DAYS", "7"))
+REVOCATION_REFRESH_SECONDS = int(os.getenv("REVOCATION_REFRESH_SECONDS", "5"))
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+JOBS_LEASE_SECONDS = int(os.getenv("JOBS_LEASE_SECONDS", "60"))
+# Retard maximal toléré d'un secondaire pour les lectures de rapport (90 s minimum côté MongoDB)
+READ_MAX_STALENESS_SECONDS = max(90, int(os.getenv("READ_MAX_STALENESS_SECONDS", "90")))
+READ_PREFERENCES = os.getenv("READ_PREFERENCES", "")
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+# API de stockage (Supabase par défaut, ou un serveur local comme stockage_local.py)
+STORAGE_URL = os.getenv("STORAGE_URL") or (f"{SUPABASE_URL}/storage/v1" if SUPABASE_URL else None)
+SIGNED_UPLOAD_MINUTES = int(os.getenv("SIGNED_UPLOAD_MINUTES", "10"))
+# Envoi direct réservé aux gros fichiers: en dessous, l'envoi passe par l'API, adressé par contenu (dédupliqué)
+DIRECT_UPLOAD_MIN_BYTES = int(os.getenv("DIRECT_UPLOAD_MIN_BYTES", str(8 * 1024 * 1024)))
+COALESCED_ROUTES = os.getenv("COALESCED_ROUTES", "statistiques_espace,travaux_espace")
+# Au-delà de cette taille (octets UTF-8), le contenu d'une livraison est stocké compressé dans `contenus`
+CONTENU_COMPRESSION_SEUIL = int(os.getenv("CONTENU_COMPRESSION_SEUIL", "4096"))
+# Pool MongoDB de chaque worker (prioritaires sur les options de MONGODB_URL).
+# Attente d'une connexion et sélection du serveur bornées: une instance saturée répond vite en erreur
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))  # 0: pas de limite
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+# Compression réseau, par ordre de préférence (zlib intégré; zstd et snappy demandent leur paquet)
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+# Sondes /health/ready: délai maximal de chaque vérification
+HEALTH_TIMEOUT_SECONDS = float(os.getenv("HEALTH_TIMEOUT_SECONDS", "2"))
 
-client = AsyncIOMotorClient(MONGO_URL)
-database = client[DB_NAME]
-
-formateurs_collection = database.get_collection("formateurs")
-promotions_collection = database.get_collection("promotions")
-etudiants_collection = database.get_collection("etudiants")
-espaces_collection = database.get_collection("espaces")
-travaux_collection = database.get_collection("travaux")
-livraisons_collection = database.get_collection("livraisons")
-evaluations_collection = database.get_collection("evaluations")
-directeurs_collection = database.get_collection("directeurs")
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """Compteurs du pool de connexions (événements CMAP), tous serveurs confondus.
+    Appelé depuis les threads du driver: compteurs protégés par un verrou."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connexions = 0   # ouvertes
+        self.utilisees = 0    # empruntées par une opération
+        self.en_attente = 0   # opérations qui attendent une connexion
+        self.echecs_attente = 0
+
+    def _ajouter(self, **deltas):
+        with self._lock:
+            for nom, delta in deltas.items():
+                setattr(self, nom, getattr(self, nom) + delta)
+
+    def connection_created(self, event):
+        self._ajouter(connexions=1)
+
+    def connection_closed(self, event):
+        self._ajouter(connexions=-1)
+
+    def connection_check_out_started(self, event):
+        self._ajouter(en_attente=1)
+
+    def connection_checked_out(self, event):
+        self._ajouter(en_attente=-1, utilisees=1)
+
+    def connection_check_out_failed(self, event):
+        self._ajouter(en_attente=-1, echecs_attente=1)
+
+    def connection_checked_in(self, event):
+        self._ajouter(utilisees=-1)
+
+    # Événements sans effet sur les compteurs (à définir: la classe de base lève NotImplementedError)
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def etat(self) -> dict:
+        with self._lock:
+            return {
+                "taille_max": MONGO_MAX_POOL_SIZE,
+                "connexions": self.connexions,
+                "utilisees": self.utilisees,
+                "disponibles": max(0, self.connexions - self.utilisees),
+                "en_attente": self.en_attente,
+                "echecs_attente": self.echecs_attente
+            }
+
+
+def options_client() -> dict:
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS or None,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+class _Connection:
+    """Client Motor propre au processus courant, créé à la première utilisation.
+    Après un fork, le processus enfant crée son propre client et son propre pool."""
+    client = None
+    pool = None
+    pid = None
+
+
+def get_client() -> AsyncIOMotorClient:
+    if _Connection.client is None or _Connection.pid != os.getpid():
+        _Connection.pool = PoolListener()
+        _Connection.client = AsyncIOMotorClient(MONGO_URL, event_listeners=[_Connection.pool], **options_client())
+        _Connection.pid = os.getpid()
+    return _Connection.client
+
+
+def etat_pool() -> dict:
+    get_client()
+    return _Connection.pool.etat()
+
+
+def get_database():
+    return get_client()[DB_NAME]
+
+
+async def connect():
+    get_client()
+
+
+def close_client():
+    if _Connection.client is not None and _Connection.pid == os.getpid():
+        _Connection.client.close()
+    _Connection.client = None
+    _Connection.pool = None
+    _Connection.pid = None
+
+
+class _LazyDatabase:
+    def _resolve(self):
+        return get_database()
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __getitem__(self, name):
+        return self._resolve()[name]
+
+
+class _LazyCollection(_LazyDatabase):
+    def __init__(self, name: str):
+        self._name = name
+        self._client = None
+        self._collection = None
+
+    def _resolve(self):
+        client = get_client()
+        if self._client is not client:
+            self._collection = client[DB_NAME].get_collection(self._name)
+            self._client = client
+        return self._collection
+
+
+database = _LazyDatabase()
+
+formateurs_collection = _LazyCollection("formateurs")
+promotions_collection = _LazyCollection("promotions")
+etudiants_collection = _LazyCollection("etudiants")
+espaces_collection = _LazyCollection("espaces")
+travaux_collection = _LazyCollection("travaux")
+livraisons_collection = _LazyCollection("livraisons")
+evaluations_collection = _LazyCollection("evaluations")
+directeurs_collection = _LazyCollection("directeurs")
+jobs_collection = _LazyCollection("jobs")
+identifiants_relance_collection = _LazyCollection("identifiants_relance")
+tickets_flux_collection = _LazyCollection("tickets_flux")
+evaluation_audit_collection = _LazyCollection("evaluation_audit")
+identities_collection = _LazyCollection("identities")
+revocations_collection = _LazyCollection("revocations")
+archivages_collection = _LazyCollection("archivages")
+travaux_archive_collection = _LazyCollection("travaux_archive")
+livraisons_archive_collection = _LazyCollection("livraisons_archive")
+evaluations_archive_collection = _LazyCollection("evaluations_archive")
+evaluation_audit_archive_collection = _LazyCollection("evaluation_audit_archive")
+migrations_collection = _LazyCollection("migrations")
+compteurs_collection = _LazyCollection("compteurs")
+fichiers_collection = _LazyCollection("fichiers")
+televersements_collection = _LazyCollection("televersements")
+contenus_collection = _LazyCollection("contenus")
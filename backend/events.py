@@ -0,0 +1,257 @@
+"""
+Diffusion d'événements temps réel (SSE) sur les livraisons, évaluations et travaux
+- Source principale: change streams MongoDB (nécessite un replica set)
+- Repli: les endpoints publient eux-mêmes dans le bus en mémoire du processus
+- Chaque abonné ne reçoit que les événements qu'il a le droit de voir; la liste des étudiants
+  concernés ne sert qu'au routage et n'est jamais envoyée
+- EventSource ne permet pas d'envoyer d'en-tête: le flux s'ouvre avec un ticket à usage unique
+  et de courte durée (TICKET_SECONDES), obtenu par une requête authentifiée; le token d'accès
+  ne passe jamais dans l'URL (journaux, historique)
+"""
+import asyncio
+import hashlib
+import json
+import secrets
+import traceback
+from datetime import datetime, timedelta
+from typing import Optional, Set
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from assignations import espaces_membre
+from database import (
+    database, travaux_collection, etudiants_collection, espaces_collection, tickets_flux_collection
+)
+
+COLLECTIONS = ["livraisons", "evaluations", "travaux"]
+QUEUE_SIZE = 100
+RETRY_DELAY = 5.0
+# Clés de routage retirées de l'événement avant diffusion
+ROUTAGE = ("etudiants",)
+TICKET_SECONDES = 30
+
+
+def _empreinte_ticket(ticket: str) -> str:
+    return hashlib.sha256(ticket.encode()).hexdigest()
+
+
+async def emettre_ticket(payload: dict) -> str:
+    """Ticket d'ouverture du flux; seule son empreinte est stockée"""
+    ticket = secrets.token_urlsafe(32)
+    await tickets_flux_collection.insert_one({
+        "_id": _empreinte_ticket(ticket),
+        "payload": payload,
+        "expire_at": datetime.utcnow() + timedelta(seconds=TICKET_SECONDES)
+    })
+    return ticket
+
+
+async def consommer_ticket(ticket: str) -> Optional[dict]:
+    """Payload du token qui a demandé le ticket; None si inconnu, expiré ou déjà utilisé"""
+    doc = await tickets_flux_collection.find_one_and_delete({
+        "_id": _empreinte_ticket(ticket),
+        "expire_at": {"$gt": datetime.utcnow()}
+    })
+    return doc["payload"] if doc else None
+
+
+class Subscriber:
+    def __init__(self, user: dict, espace_ids: Set[str], promotion_id: Optional[str] = None):
+        self.user_id = user["user_id"]
+        self.user_type = user["user_type"]
+        self.espace_ids = espace_ids
+        self.promotion_id = promotion_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def allows(self, event: dict) -> bool:
+        if self.user_type == "directeur":
+            return True
+        if self.user_type == "formateur":
+            return event.get("formateur_id") == self.user_id or event.get("espace_id") in self.espace_ids
+        audience = event.get("audience")
+        if audience:
+            if audience["type"] == "promotion":
+                return audience["id"] == self.promotion_id
+            return audience["id"] in self.espace_ids
+        return self.user_id in event.get("etudiants", [])
+
+    def push(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Client trop lent: on vide la file et on lui demande de tout recharger
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+async def build_event(collection: str, operation: str, doc: dict) -> Optional[dict]:
+    """Construit un delta léger (jamais le contenu complet d'une livraison)"""
+    if collection == "travaux":
+        return {
+            "type": "travail",
+            "operation": operation,
+            "id": str(doc["_id"]),
+            "espace_id": str(doc.get("espace_id")),
+            "formateur_id": str(doc.get("formateur_id")),
+            "etudiants": [str(e) for e in doc.get("etudiants_assignes", [])],
+            "audience": {"type": doc["audience"]["type"], "id": str(doc["audience"]["id"])}
+            if doc.get("audience") else None,
+            "data": {
+                "titre": doc.get("titre"),
+                "statut": doc.get("statut"),
+                "date_debut": doc.get("date_debut"),
+                "date_fin": doc.get("date_fin")
+            }
+        }
+
+    travail = await travaux_collection.find_one(
+        {"_id": doc.get("travail_id")}, {"formateur_id": 1, "espace_id": 1, "titre": 1, "statut": 1}
+    )
+    if not travail:
+        return None
+
+    event = {
+        "operation": operation,
+        "id": str(doc["_id"]),
+        "travail_id": str(doc["travail_id"]),
+        "etudiant_id": str(doc["etudiant_id"]),
+        "espace_id": str(travail["espace_id"]),
+        "formateur_id": str(travail["formateur_id"]),
+        "etudiants": [str(doc["etudiant_id"])]
+    }
+
+    if collection == "livraisons":
+        etudiant = await etudiants_collection.find_one({"_id": doc["etudiant_id"]}, {"nom_complet": 1})
+        event["type"] = "livraison"
+        event["data"] = {
+            "travail_titre": travail.get("titre"),
+            "etudiant_nom": etudiant["nom_complet"] if etudiant else None,
+            "date_soumission": doc.get("date_soumission")
+        }
+    else:
+        event["type"] = "evaluation"
+        event["data"] = {
+            "livraison_id": str(doc.get("livraison_id")),
+            "travail_titre": travail.get("titre"),
+            # Statut du travail tel que le serveur l'a enregistré: le client ne le déduit pas
+            "travail_statut": travail.get("statut"),
+            "note": doc.get("note"),
+            "commentaire": doc.get("commentaire"),
+            "date_evaluation": doc.get("date_evaluation")
+        }
+
+    return event
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+class EventBus:
+    def __init__(self):
+        self._subscribers: Set[Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+        # Publications en cours: référence gardée jusqu'à la fin, sinon la tâche peut être collectée
+        self._tasks: Set[asyncio.Task] = set()
+        self.change_streams = False
+
+    async def subscribe(self, user: dict) -> Subscriber:
+        espace_ids: Set[str] = set()
+        if user["user_type"] == "formateur":
+            uid = user["user_id"]
+            cursor = espaces_collection.find({"formateurs.id": {"$in": [ObjectId(uid), uid]}}, {"_id": 1})
+            espace_ids = {str(e["_id"]) async for e in cursor}
+
+        # Étudiant: ses espaces et sa promotion, pour les travaux assignés par audience
+        promotion_id = None
+        if user["user_type"] == "etudiant":
+            uid = ObjectId(user["user_id"])
+            espace_ids = {str(e) for e in await espaces_membre(uid)}
+            etudiant = await etudiants_collection.find_one({"_id": uid}, {"promotion_id": 1})
+            if etudiant and etudiant.get("promotion_id"):
+                promotion_id = str(etudiant["promotion_id"])
+
+        subscriber = Subscriber(user, espace_ids, promotion_id)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event: dict):
+        diffuse = {k: v for k, v in event.items() if k not in ROUTAGE}
+        for subscriber in list(self._subscribers):
+            if subscriber.allows(event):
+                subscriber.push(diffuse)
+
+    async def _publish_doc(self, collection: str, operation: str, doc: dict):
+        try:
+            event = await build_event(collection, operation, doc)
+        except Exception:
+            traceback.print_exc()
+            return
+        if event:
+            self.publish(event)
+
+    def notify(self, collection: str, operation: str, doc: dict):
+        """Appelé par les endpoints après écriture; ignoré si les change streams couvrent déjà l'écriture"""
+        if self.change_streams or not self._subscribers:
+            return
+        task = asyncio.create_task(self._publish_doc(collection, operation, doc))
+        self._tasks.add(task)
+        task.add_done_callback(self._fin_publication)
+
+    def _fin_publication(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        erreur = task.exception()
+        if erreur is not None:
+            traceback.print_exception(type(erreur), erreur, erreur.__traceback__)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self.change_streams = False
+
+    async def _watch(self):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": COLLECTIONS},
+            "operationType": {"$in": ["insert", "update", "replace"]}
+        }}]
+        resume_token = None
+
+        while True:
+            try:
+                async with database.watch(pipeline, full_document="updateLookup",
+                                          resume_after=resume_token) as stream:
+                    self.change_streams = True
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        doc = change.get("fullDocument")
+                        if doc:
+                            await self._publish_doc(change["ns"]["coll"], change["operationType"], doc)
+            except OperationFailure as e:
+                self.change_streams = False
+                if resume_token is None:
+                    # Pas de replica set (mongod seul): repli sur le bus en mémoire
+                    print(f"Change streams indisponibles ({e.code}), repli sur la diffusion en mémoire")
+                    return
+                resume_token = None
+            except PyMongoError:
+                self.change_streams = False
+                traceback.print_exc()
+            await asyncio.sleep(RETRY_DELAY)
+
+
+event_bus = EventBus()
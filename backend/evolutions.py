@@ -0,0 +1,75 @@
+"""
+Migrations de schéma, appliquées dans l'ordre des versions par migrations.py
+"""
+from typing import Optional
+
+from bson import ObjectId
+
+from contenus import reference, enregistrer
+from migrations import migration
+from search import SOURCES
+
+LISTES_ESPACE = {
+    "formateurs": "nom_complet",
+    "promotions": "nom",
+    "etudiants": "nom_complet"
+}
+LIBELLES_INCONNUS = {"formateurs": "Inconnu", "promotions": "Inconnue", "etudiants": "Inconnu"}
+
+
+def nettoyer_espace(espace: dict) -> Optional[dict]:
+    """Retourne les listes d'un espace avec des identifiants texte, ou None s'il est déjà propre"""
+    needs_update = False
+    cleaned = {}
+    for field, libelle in LISTES_ESPACE.items():
+        items = []
+        for item in espace.get(field, []):
+            if isinstance(item, dict):
+                items.append({"id": str(item.get("id")), libelle: item.get(libelle, LIBELLES_INCONNUS[field])})
+                needs_update = needs_update or isinstance(item.get("id"), ObjectId)
+            elif isinstance(item, ObjectId):
+                items.append({"id": str(item), libelle: LIBELLES_INCONNUS[field]})
+                needs_update = True
+            else:
+                items.append(item)
+        cleaned[field] = items
+    return cleaned if needs_update else None
+
+
+@migration("0001_espaces_identifiants_texte", "espaces", query={"$or": [
+    {field: {"$type": "objectId"}} for field in LISTES_ESPACE
+] + [
+    {f"{field}.id": {"$type": "objectId"}} for field in LISTES_ESPACE
+]})
+def espaces_identifiants_texte(espace: dict) -> Optional[dict]:
+    """Convertit en texte les ObjectId des listes formateurs / promotions / étudiants des espaces"""
+    cleaned = nettoyer_espace(espace)
+    return {"$set": cleaned} if cleaned is not None else None
+
+
+async def stocker_contenus(livraisons: list):
+    await enregistrer(l["contenu"] for l in livraisons)
+
+
+@migration("0002_livraisons_contenu_compresse", "livraisons", query={"contenu": {"$type": "string"}},
+           prealable=stocker_contenus)
+@migration("0003_livraisons_archive_contenu_compresse", "livraisons_archive",
+           query={"contenu": {"$type": "string"}}, prealable=stocker_contenus)
+def livraisons_contenu_compresse(livraison: dict) -> Optional[dict]:
+    """Déplace compressé dans `contenus` le texte des livraisons au-delà du seuil"""
+    ref = reference(livraison["contenu"])
+    return {"$set": {"contenu": None, "contenu_ref": ref}} if ref else None
+
+
+def _mots_cles(kind: str):
+    def transform(doc: dict) -> Optional[dict]:
+        """Recalcule `mots_cles` (parties des noms composés: "jean-pierre" -> "pierre")"""
+        mots_cles = SOURCES[kind]["mots_cles"](doc)
+        return {"$set": {"mots_cles": mots_cles}} if mots_cles != doc.get("mots_cles") else None
+    return transform
+
+
+migration("0004_etudiants_mots_cles_composes", "etudiants")(_mots_cles("etudiant"))
+migration("0005_formateurs_mots_cles_composes", "formateurs")(_mots_cles("formateur"))
+migration("0006_espaces_mots_cles_composes", "espaces")(_mots_cles("espace"))
+migration("0007_travaux_mots_cles_composes", "travaux")(_mots_cles("travail"))
@@ -0,0 +1,347 @@
+"""
+Stockage des fichiers adressé par contenu (bucket Supabase `travaux`)
+- Chaque fichier est haché en SHA-256 pendant sa lecture et stocké sous `sha256/<empreinte>`:
+  un même contenu n'est stocké qu'une fois, quel que soit le nombre de travaux qui l'utilisent
+- La collection `fichiers` (clé: l'empreinte) compte les documents (travaux, livraisons) qui
+  utilisent chaque URL: `attacher` / `detacher` là où une URL est enregistrée ou retirée.
+  Un envoi seul n'ajoute aucune référence: un fichier jamais attaché vieillit jusqu'à la purge
+- Le client peut d'abord annoncer l'empreinte (`POST /api/upload/existant`): si le contenu est
+  déjà stocké et qu'il l'a lui-même déjà envoyé (`proprietaires`), il n'envoie pas le fichier.
+  Une empreinte ne prouve pas la possession: pour un autre utilisateur la réponse est la même
+  que pour un contenu inconnu, et le fichier doit être envoyé (seul moyen d'économiser le trafic,
+  `/api/upload` ne dédoublonne qu'après réception complète: il évite le stockage, pas l'envoi)
+- Les fichiers sans référence depuis ORPHELIN_HEURES sont supprimés par la tâche `purge_fichiers`
+- Un seul client HTTP par processus (pool de connexions partagé) et au plus UPLOAD_CONCURRENCY
+  envois simultanés vers le stockage, toutes requêtes confondues
+- Envoi direct (fichiers d'au moins DIRECT_UPLOAD_MIN_BYTES, non dédupliqués): le navigateur reçoit une URL signée pour un seul objet `<user_id>/<uuid>`, y dépose
+  le fichier sans passer par l'API, puis confirme l'envoi (`televersements`); les envois non
+  confirmés et les fichiers directs qui ne sont plus utilisés sont purgés avec les orphelins
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from database import (
+    database, fichiers_collection, televersements_collection, STORAGE_URL, SUPABASE_SERVICE_KEY,
+    UPLOAD_CONCURRENCY, SIGNED_UPLOAD_MINUTES, DIRECT_UPLOAD_MIN_BYTES
+)
+
+BUCKET = "travaux"
+PREFIXE = "sha256/"
+CHUNK_SIZE = 1024 * 1024
+ORPHELIN_HEURES = 24
+MAX_FICHIERS_LOT = 20
+# Durée de validité d'une URL signée d'envoi côté Supabase (fixe)
+SIGNATURE_STOCKAGE_HEURES = 2
+
+
+class _Stockage:
+    """Client HTTP et sémaphore propres au processus courant, créés à la première utilisation"""
+    client = None
+    semaphore = None
+    pid = None
+
+
+def get_http_client():
+    import httpx
+
+    if _Stockage.client is None or _Stockage.pid != os.getpid():
+        _Stockage.client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=UPLOAD_CONCURRENCY, max_keepalive_connections=UPLOAD_CONCURRENCY)
+        )
+        _Stockage.semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        _Stockage.pid = os.getpid()
+    return _Stockage.client
+
+
+async def close_http_client():
+    if _Stockage.client is not None and _Stockage.pid == os.getpid():
+        await _Stockage.client.aclose()
+    _Stockage.client = None
+    _Stockage.semaphore = None
+    _Stockage.pid = None
+
+
+def stockage_configure() -> bool:
+    return bool(STORAGE_URL and SUPABASE_SERVICE_KEY)
+
+
+def public_url(path: str) -> str:
+    return f"{STORAGE_URL}/object/public/{BUCKET}/{path}"
+
+
+def empreinte_depuis_url(url: str) -> Optional[str]:
+    prefixe = public_url(PREFIXE)
+    if not url or not url.startswith(prefixe):
+        return None
+    return url[len(prefixe):]
+
+
+def _headers(content_type: Optional[str] = None) -> dict:
+    headers = {"Authorization": f"Bearer {SUPABASE_SERVICE_KEY}"}
+    if content_type:
+        headers["Content-Type"] = content_type
+    return headers
+
+
+async def hacher(file) -> Tuple[str, int]:
+    """Empreinte SHA-256 et taille d'un UploadFile, lu par blocs puis rembobiné"""
+    digest = hashlib.sha256()
+    taille = 0
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        taille += len(chunk)
+    await file.seek(0)
+    return digest.hexdigest(), taille
+
+
+async def retrouver(empreinte: str, user_id: str) -> Optional[dict]:
+    """Contenu déjà stocké, pour un utilisateur qui vient d'en envoyer les octets (il en devient
+    propriétaire, son délai avant purge repart de zéro); None s'il n'existe pas"""
+    return await fichiers_collection.find_one_and_update(
+        {"_id": empreinte, "supprime": {"$ne": True}},
+        {"$set": {"dernier_usage": datetime.utcnow()}, "$addToSet": {"proprietaires": user_id}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def retrouver_annonce(empreinte: str, user_id: str) -> Optional[dict]:
+    """Contenu annoncé par sa seule empreinte: connu seulement si l'utilisateur l'a déjà envoyé"""
+    return await fichiers_collection.find_one_and_update(
+        {"_id": empreinte, "supprime": {"$ne": True}, "proprietaires": user_id},
+        {"$set": {"dernier_usage": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def _ajuster(urls: Iterable[str], sens: int):
+    """Ajoute (sens=1) ou retire (sens=-1) une référence par occurrence d'URL"""
+    occurrences = Counter(u for u in urls if u)
+    if not occurrences:
+        return
+    now = datetime.utcnow()
+    contenus, directs = [], []
+    for url, nombre in occurrences.items():
+        update = {"$inc": {"references": sens * nombre}, "$set": {"dernier_usage": now}}
+        empreinte = empreinte_depuis_url(url)
+        if empreinte:
+            contenus.append(UpdateOne({"_id": empreinte}, update))
+        else:
+            directs.append(UpdateOne({"url": url, "statut": "termine"}, update))
+    if contenus:
+        await fichiers_collection.bulk_write(contenus, ordered=False)
+    if directs:
+        await televersements_collection.bulk_write(directs, ordered=False)
+
+
+async def attacher(urls: Iterable[str]):
+    """URL enregistrées dans un document (travail, livraison)"""
+    await _ajuster(urls, 1)
+
+
+async def detacher(urls: Iterable[str]):
+    """URL retirées d'un document, ou document supprimé"""
+    await _ajuster(urls, -1)
+
+
+async def remplacer(anciennes: Iterable[str], nouvelles: Iterable[str]):
+    anciennes, nouvelles = Counter(anciennes), Counter(nouvelles)
+    await detacher((anciennes - nouvelles).elements())
+    await attacher((nouvelles - anciennes).elements())
+
+
+async def recompter_references() -> dict:
+    """Remet chaque compteur au nombre réel d'utilisations (données antérieures au comptage par
+    document); les écritures simultanées peuvent le fausser: à lancer hors activité"""
+    occurrences = Counter()
+    for nom in ("travaux", "livraisons", "travaux_archive", "livraisons_archive"):
+        async for doc in database[nom].aggregate([
+            {"$unwind": "$fichiers_urls"},
+            {"$group": {"_id": "$fichiers_urls", "n": {"$sum": 1}}}
+        ]):
+            occurrences[doc["_id"]] += doc["n"]
+
+    now = datetime.utcnow()
+    # Un fichier qui n'est plus utilisé repart pour ORPHELIN_HEURES avant la purge
+    await fichiers_collection.update_many({}, {"$set": {"references": 0, "dernier_usage": now}})
+    await televersements_collection.update_many({"statut": "termine"},
+                                                {"$set": {"references": 0, "dernier_usage": now}})
+    await attacher(occurrences.elements())
+    return {"urls_utilisees": len(occurrences)}
+
+
+async def stocker(file, empreinte: str, taille: int, user_id: str) -> Optional[dict]:
+    """Envoie le contenu par blocs vers le stockage puis l'enregistre (sans référence).
+    None si ce contenu est en cours de purge (le client doit réessayer)"""
+    path = f"{PREFIXE}{empreinte}"
+    content_type = file.content_type or "application/octet-stream"
+
+    async def blocs():
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    headers = {**_headers(content_type), "Content-Length": str(taille), "x-upsert": "true"}
+    client = get_http_client()
+    async with _Stockage.semaphore:
+        response = await client.post(
+            f"{STORAGE_URL}/object/{BUCKET}/{path}", content=blocs(), headers=headers
+        )
+    if response.status_code not in (200, 201):
+        raise RuntimeError(f"Stockage refusé ({response.status_code}): {response.text}")
+
+    now = datetime.utcnow()
+    try:
+        return await fichiers_collection.find_one_and_update(
+            {"_id": empreinte, "supprime": {"$ne": True}},
+            {
+                "$setOnInsert": {
+                    "path": path,
+                    "url": public_url(path),
+                    "taille": taille,
+                    "content_type": content_type,
+                    "nom_origine": file.filename,
+                    "references": 0,
+                    "created_at": now
+                },
+                "$set": {"dernier_usage": now},
+                "$addToSet": {"proprietaires": user_id}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Même contenu envoyé en parallèle (l'autre requête a créé l'entrée), ou purge en cours
+        return await retrouver(empreinte, user_id)
+
+
+async def _supprimer_objets(paths: List[str]):
+    response = await get_http_client().request(
+        "DELETE", f"{STORAGE_URL}/object/{BUCKET}", json={"prefixes": paths}, headers=_headers()
+    )
+    if response.status_code not in (200, 204):
+        raise RuntimeError(f"Suppression refusée ({response.status_code}): {response.text}")
+
+
+async def purger_orphelins() -> List[str]:
+    """Supprime du stockage les contenus sans référence depuis ORPHELIN_HEURES"""
+    # Réservées d'abord: plus aucune nouvelle référence ne peut s'y ajouter pendant la suppression
+    limite = datetime.utcnow() - timedelta(hours=ORPHELIN_HEURES)
+    await fichiers_collection.update_many(
+        {"references": {"$lte": 0}, "dernier_usage": {"$lt": limite}},
+        {"$set": {"supprime": True}}
+    )
+    orphelins = await fichiers_collection.find({"supprime": True}, {"path": 1}).to_list(None)
+    if not orphelins:
+        return []
+
+    await _supprimer_objets([f["path"] for f in orphelins])
+    ids = [f["_id"] for f in orphelins]
+    await fichiers_collection.delete_many({"_id": {"$in": ids}})
+    return ids
+
+
+async def televerser(file, user_id: str) -> dict:
+    """Hache puis stocke un fichier s'il est inconnu; retourne l'entrée et si elle existait déjà"""
+    empreinte, taille = await hacher(file)
+    fichier = await retrouver(empreinte, user_id)
+    if fichier:
+        return {"fichier": fichier, "deduplique": True}
+
+    fichier = await stocker(file, empreinte, taille, user_id)
+    if not fichier:
+        raise RuntimeError("Fichier en cours de suppression, réessayez")
+    return {"fichier": fichier, "deduplique": False}
+
+
+# --- Envoi direct vers le stockage ---
+
+async def signer_envoi(user_id: str, filename: Optional[str], content_type: Optional[str]) -> dict:
+    """Réserve `<user_id>/<uuid>` et retourne l'URL signée où le navigateur dépose le fichier"""
+    identifiant = uuid.uuid4().hex
+    path = f"{user_id}/{identifiant}"
+    response = await get_http_client().post(
+        f"{STORAGE_URL}/object/upload/sign/{BUCKET}/{path}", headers=_headers()
+    )
+    if response.status_code not in (200, 201):
+        raise RuntimeError(f"Signature refusée ({response.status_code}): {response.text}")
+
+    now = datetime.utcnow()
+    expire_le = now + timedelta(minutes=SIGNED_UPLOAD_MINUTES)
+    await televersements_collection.insert_one({
+        "_id": identifiant,
+        "user_id": user_id,
+        "path": path,
+        "nom_origine": filename,
+        "content_type": content_type or "application/octet-stream",
+        "statut": "signe",
+        "created_at": now,
+        "expire_le": expire_le
+    })
+    # Supabase répond avec un chemin relatif à l'API de stockage ("/object/upload/sign/...?token=")
+    return {"id": identifiant, "upload_url": f"{STORAGE_URL}{response.json()['url']}", "expire_le": expire_le}
+
+
+async def taille_objet(path: str) -> Optional[int]:
+    """Taille d'un objet déposé dans le bucket; None s'il n'existe pas"""
+    response = await get_http_client().head(f"{STORAGE_URL}/object/{BUCKET}/{path}", headers=_headers())
+    # Supabase répond 400 (et non 404) pour certains objets absents
+    if response.status_code in (400, 404):
+        return None
+    if response.status_code != 200:
+        raise RuntimeError(f"Stockage indisponible ({response.status_code})")
+    return int(response.headers.get("content-length", 0))
+
+
+async def terminer_envoi(televersement: dict) -> Optional[dict]:
+    """Enregistre un envoi direct une fois l'objet présent dans le stockage; None s'il n'y est pas"""
+    if televersement["statut"] == "termine":
+        return televersement
+
+    taille = await taille_objet(televersement["path"])
+    if taille is None:
+        return None
+    now = datetime.utcnow()
+    return await televersements_collection.find_one_and_update(
+        {"_id": televersement["_id"]},
+        {"$set": {
+            "statut": "termine",
+            "url": public_url(televersement["path"]),
+            "taille": taille,
+            "references": 0,
+            "termine_le": now,
+            "dernier_usage": now
+        }},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def purger_envois() -> List[str]:
+    """Supprime les envois directs jamais confirmés et ceux qui ne sont plus utilisés"""
+    now = datetime.utcnow()
+    # Une URL Supabase reste utilisable SIGNATURE_STOCKAGE_HEURES: on attend qu'elle ait expiré
+    expires = {"statut": "signe",
+               "expire_le": {"$lt": now - timedelta(hours=SIGNATURE_STOCKAGE_HEURES)}}
+    inutilises = {"statut": "termine", "references": {"$lte": 0},
+                  "dernier_usage": {"$lt": now - timedelta(hours=ORPHELIN_HEURES)}}
+    envois = await televersements_collection.find({"$or": [expires, inutilises]}, {"path": 1}).to_list(None)
+    if not envois:
+        return []
+
+    await _supprimer_objets([e["path"] for e in envois])
+    ids = [e["_id"] for e in envois]
+    await televersements_collection.delete_many({"_id": {"$in": ids}})
+    return ids
@@ -0,0 +1,89 @@
+"""
+Index unifié des identités (email -> type, id, hash du mot de passe, activation)
+- Une seule lecture indexée pour la connexion et la relance de compte
+- Tenu à jour par les endpoints de création / modification / suppression des comptes
+"""
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database import (
+    identities_collection, formateurs_collection, etudiants_collection, directeurs_collection
+)
+
+BATCH_SIZE = 500
+
+USER_COLLECTIONS = {
+    "formateur": formateurs_collection,
+    "etudiant": etudiants_collection,
+    "directeur": directeurs_collection
+}
+
+
+def identity_doc(user_type: str, user: dict) -> dict:
+    return {
+        "email": user["email"],
+        "user_type": user_type,
+        "user_id": user["_id"],
+        "nom_complet": user["nom_complet"],
+        "mot_de_passe": user["mot_de_passe"],
+        # Les directeurs n'ont pas d'étape d'activation
+        "compte_active": user.get("compte_active", user_type == "directeur")
+    }
+
+
+async def create_identity(user_type: str, user: dict):
+    """Lève DuplicateKeyError si l'email est déjà utilisé par un autre compte"""
+    await identities_collection.insert_one(identity_doc(user_type, user))
+
+
+async def find_by_email(email: str) -> Optional[dict]:
+    return await identities_collection.find_one({"email": email})
+
+
+async def find_by_user_id(user_id: str) -> Optional[dict]:
+    return await identities_collection.find_one({"user_id": ObjectId(user_id)})
+
+
+async def update_identity(user_id, fields: dict):
+    synced = {k: v for k, v in fields.items()
+              if k in ("email", "nom_complet", "mot_de_passe", "compte_active")}
+    if synced:
+        await identities_collection.update_one({"user_id": ObjectId(user_id)}, {"$set": synced})
+
+
+async def delete_identity(user_id):
+    await identities_collection.delete_one({"user_id": ObjectId(user_id)})
+
+
+async def _flush(batch: list) -> int:
+    try:
+        await identities_collection.bulk_write(batch, ordered=False)
+        return len(batch)
+    except BulkWriteError as e:
+        # Email partagé par deux comptes existants: le premier garde l'email
+        for error in e.details.get("writeErrors", []):
+            print(f"⚠️  Identité ignorée: {error.get('errmsg')}")
+        return len(batch) - len(e.details.get("writeErrors", []))
+
+
+async def sync_all_identities() -> int:
+    """Reconstruit l'index à partir des comptes existants (upserts par lots)"""
+    total = 0
+    projection = {"email": 1, "nom_complet": 1, "mot_de_passe": 1, "compte_active": 1}
+    for user_type, collection in USER_COLLECTIONS.items():
+        batch = []
+        async for user in collection.find({}, projection):
+            batch.append(UpdateOne(
+                {"user_id": user["_id"]},
+                {"$set": identity_doc(user_type, user)},
+                upsert=True
+            ))
+            if len(batch) >= BATCH_SIZE:
+                total += await _flush(batch)
+                batch = []
+        if batch:
+            total += await _flush(batch)
+    return total
@@ -1,11 +1,13 @@
 import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import ASCENDING
+from pymongo import ASCENDING, DESCENDING
 import bcrypt
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 
+from identities import sync_all_identities
+
 load_dotenv()
 
 MONGO_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
@@ -21,10 +23,43 @@ async def init_database():
     await db.etudiants.create_index([("matricule", ASCENDING)], unique=True)
     await db.formateurs.create_index([("email", ASCENDING)], unique=True)
     await db.directeurs.create_index([("email", ASCENDING)], unique=True)
+    await db.identities.create_index([("email", ASCENDING)], unique=True)
+    await db.identities.create_index([("user_id", ASCENDING)], unique=True)
+    await db.revocations.create_index([("key", ASCENDING)], unique=True)
+    await db.revocations.create_index([("revoked_at", ASCENDING)])
+    await db.revocations.create_index([("expire_at", ASCENDING)], expireAfterSeconds=0)
     await db.travaux.create_index([("espace_id", ASCENDING)])
     await db.travaux.create_index([("formateur_id", ASCENDING)])
-    await db.livraisons.create_index([("travail_id", ASCENDING)])
+    await db.travaux.create_index([("statut", ASCENDING), ("date_fin", ASCENDING)])
+    await db.travaux.create_index([("statut", ASCENDING), ("date_debut", ASCENDING)])
+    # Assignation puis échéance: "mes travaux" et les échéances à venir (tri date_fin, _id)
+    await db.travaux.create_index([("etudiants_assignes", ASCENDING), ("date_fin", ASCENDING), ("_id", ASCENDING)])
+    await db.travaux.create_index([("audience.id", ASCENDING), ("date_fin", ASCENDING), ("_id", ASCENDING)])
+    await db.espaces.create_index([("etudiants.id", ASCENDING)])
+    await db.livraisons.create_index([("travail_id", ASCENDING), ("etudiant_id", ASCENDING)], unique=True)
+    await db.livraisons.create_index([("contenu_ref.sha256", ASCENDING)], sparse=True)
     await db.evaluations.create_index([("etudiant_id", ASCENDING)])
+    await db.evaluations.create_index([("livraison_id", ASCENDING)], unique=True)
+    await db.evaluation_audit.create_index([("evaluation_id", ASCENDING), ("date_modification", DESCENDING)])
+    for collection in ("etudiants", "formateurs", "espaces", "travaux"):
+        await db[collection].create_index([("mots_cles", ASCENDING)])
+    await db.jobs.create_index([("statut", ASCENDING), ("disponible_a", ASCENDING)])
+    await db.jobs.create_index([("statut", ASCENDING), ("bail_expire", ASCENDING)])
+    await db.jobs.create_index([("finished_at", ASCENDING)], expireAfterSeconds=7 * 24 * 3600)
+    await db.identifiants_relance.create_index([("expire_at", ASCENDING)], expireAfterSeconds=0)
+    await db.tickets_flux.create_index([("expire_at", ASCENDING)], expireAfterSeconds=0)
+    await db.fichiers.create_index([("references", ASCENDING), ("dernier_usage", ASCENDING)])
+    await db.televersements.create_index([("url", ASCENDING)])
+    await db.televersements.create_index([("statut", ASCENDING), ("expire_le", ASCENDING)])
+    # Archives: seulement les index des lectures historiques
+    await db.travaux_archive.create_index([("etudiants_assignes", ASCENDING)])
+    await db.travaux_archive.create_index([("audience.id", ASCENDING)])
+    await db.travaux_archive.create_index([("espace_id", ASCENDING)])
+    await db.livraisons_archive.create_index([("travail_id", ASCENDING)])
+    await db.livraisons_archive.create_index([("contenu_ref.sha256", ASCENDING)], sparse=True)
+    await db.evaluations_archive.create_index([("etudiant_id", ASCENDING)])
+    await db.evaluation_audit_archive.create_index([("evaluation_id", ASCENDING), ("date_modification", DESCENDING)])
+    await db.etudiants.create_index([("promotion_id", ASCENDING)])
     
     print("✅ Indexes créés")
     
@@ -42,6 +77,9 @@ async def init_database():
     else:
         print("ℹ️  Directeur existe déjà")
     
+    count = await sync_all_identities()
+    print(f"✅ Index des identités synchronisé ({count} comptes)")
+    
     print("✅ Base de données initialisée avec succès")
 
 if __name__ == "__main__":
@@ -0,0 +1,243 @@
+"""
+File de tâches de fond persistante
+- Les tâches sont stockées dans la collection `jobs` et survivent à un redémarrage
+- Chaque worker réclame une tâche avec un bail (lease) renouvelé tant qu'elle tourne
+- Une tâche dont le bail expire (worker arrêté, crash) est reprise par un autre worker
+- Les échecs sont retentés avec un délai croissant jusqu'à `max_tentatives`
+"""
+import asyncio
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from database import jobs_collection, JOBS_WORKERS, JOBS_LEASE_SECONDS
+
+STATUT_EN_ATTENTE = "en_attente"
+STATUT_EN_COURS = "en_cours"
+STATUT_TERMINE = "termine"
+STATUT_ECHOUE = "echoue"
+
+POLL_INTERVAL = 2.0
+RETRY_BASE_DELAY = 5
+
+JobHandler = Callable[["JobContext", dict], Awaitable[Optional[dict]]]
+
+_handlers: Dict[str, JobHandler] = {}
+_max_tentatives: Dict[str, int] = {}
+
+
+def register_job(job_type: str, max_tentatives: int = 3):
+    """Enregistre une fonction comme exécutant des tâches de type `job_type`"""
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[job_type] = func
+        _max_tentatives[job_type] = max_tentatives
+        return func
+    return decorator
+
+
+def is_registered(job_type: str) -> bool:
+    return job_type in _handlers
+
+
+class JobContext:
+    """Passé à chaque tâche pour rapporter sa progression"""
+
+    def __init__(self, job: dict, worker_id: str):
+        self.job = job
+        self.job_id = job["_id"]
+        self.worker_id = worker_id
+
+    def _owner_filter(self) -> dict:
+        # Le worker ne doit écrire que tant qu'il détient encore le bail
+        return {"_id": self.job_id, "worker_id": self.worker_id, "tentatives": self.job["tentatives"]}
+
+    async def progress(self, progression: float, message: Optional[str] = None):
+        update = {
+            "progression": max(0.0, min(100.0, round(progression, 1))),
+            "bail_expire": datetime.utcnow() + timedelta(seconds=JOBS_LEASE_SECONDS),
+            "updated_at": datetime.utcnow()
+        }
+        if message is not None:
+            update["message"] = message
+        await jobs_collection.update_one(self._owner_filter(), {"$set": update})
+
+    async def renew_lease(self):
+        await jobs_collection.update_one(
+            self._owner_filter(),
+            {"$set": {"bail_expire": datetime.utcnow() + timedelta(seconds=JOBS_LEASE_SECONDS)}}
+        )
+
+
+async def submit_job(job_type: str, payload: dict, cree_par: Optional[str] = None,
+                     max_tentatives: Optional[int] = None) -> dict:
+    if not is_registered(job_type):
+        raise ValueError(f"Type de tâche inconnu: {job_type}")
+
+    if max_tentatives is None:
+        max_tentatives = _max_tentatives[job_type]
+
+    now = datetime.utcnow()
+    job = {
+        "type": job_type,
+        "payload": payload,
+        "statut": STATUT_EN_ATTENTE,
+        "tentatives": 0,
+        "max_tentatives": max_tentatives,
+        "progression": 0.0,
+        "message": None,
+        "resultat": None,
+        "erreur": None,
+        "cree_par": cree_par,
+        "worker_id": None,
+        "disponible_a": now,
+        "bail_expire": None,
+        "created_at": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None
+    }
+    result = await jobs_collection.insert_one(job)
+    job["_id"] = result.inserted_id
+    job_queue.wake()
+    return job
+
+
+async def get_job(job_id: str) -> Optional[dict]:
+    return await jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+
+async def claim_job(worker_id: str) -> Optional[dict]:
+    now = datetime.utcnow()
+    return await jobs_collection.find_one_and_update(
+        {
+            "$or": [
+                {"statut": STATUT_EN_ATTENTE, "disponible_a": {"$lte": now}},
+                {"statut": STATUT_EN_COURS, "bail_expire": {"$lt": now}}
+            ]
+        },
+        {
+            "$set": {
+                "statut": STATUT_EN_COURS,
+                "worker_id": worker_id,
+                "bail_expire": now + timedelta(seconds=JOBS_LEASE_SECONDS),
+                "started_at": now,
+                "updated_at": now
+            },
+            "$inc": {"tentatives": 1}
+        },
+        sort=[("disponible_a", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+class JobQueue:
+    """Pool de workers asyncio tournant dans le processus de l'API"""
+
+    def __init__(self, workers: int = JOBS_WORKERS):
+        self.workers = workers
+        self._tasks = []
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+
+    def wake(self):
+        self._wakeup.set()
+
+    async def start(self):
+        self._stopping.clear()
+        for i in range(self.workers):
+            worker_id = f"{uuid.uuid4().hex[:8]}-{i}"
+            self._tasks.append(asyncio.create_task(self._worker_loop(worker_id)))
+
+    async def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _wait_for_work(self):
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker_loop(self, worker_id: str):
+        while not self._stopping.is_set():
+            try:
+                job = await claim_job(worker_id)
+            except Exception:
+                traceback.print_exc()
+                job = None
+
+            if job is None:
+                await self._wait_for_work()
+                continue
+
+            await self._run(job, worker_id)
+
+    async def _heartbeat(self, ctx: JobContext):
+        while True:
+            await asyncio.sleep(JOBS_LEASE_SECONDS / 3)
+            try:
+                await ctx.renew_lease()
+            except Exception:
+                traceback.print_exc()
+
+    async def _run(self, job: dict, worker_id: str):
+        ctx = JobContext(job, worker_id)
+        owner = ctx._owner_filter()
+        handler = _handlers.get(job["type"])
+
+        if job["tentatives"] > job.get("max_tentatives", 1):
+            # Tâche reprise après expiration du bail alors que ses tentatives sont épuisées
+            now = datetime.utcnow()
+            await jobs_collection.update_one(owner, {"$set": {
+                "statut": STATUT_ECHOUE,
+                "erreur": job.get("erreur") or "Bail expiré, tentatives épuisées",
+                "bail_expire": None,
+                "finished_at": now,
+                "updated_at": now
+            }})
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(ctx))
+
+        try:
+            if handler is None:
+                raise RuntimeError(f"Aucun exécutant pour le type {job['type']}")
+            resultat = await handler(ctx, job.get("payload") or {})
+        except asyncio.CancelledError:
+            # Arrêt du serveur: le bail expirera et la tâche sera reprise
+            raise
+        except Exception as e:
+            traceback.print_exc()
+            now = datetime.utcnow()
+            if job["tentatives"] >= job.get("max_tentatives", 1):
+                update = {"statut": STATUT_ECHOUE, "finished_at": now}
+            else:
+                delay = RETRY_BASE_DELAY * (2 ** (job["tentatives"] - 1))
+                update = {"statut": STATUT_EN_ATTENTE, "disponible_a": now + timedelta(seconds=delay)}
+            update.update({"erreur": str(e), "worker_id": None, "bail_expire": None, "updated_at": now})
+            await jobs_collection.update_one(owner, {"$set": update})
+        else:
+            now = datetime.utcnow()
+            await jobs_collection.update_one(owner, {"$set": {
+                "statut": STATUT_TERMINE,
+                "progression": 100.0,
+                "resultat": resultat,
+                "erreur": None,
+                "bail_expire": None,
+                "finished_at": now,
+                "updated_at": now
+            }})
+        finally:
+            heartbeat.cancel()
+
+
+job_queue = JobQueue()
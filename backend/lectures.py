@@ -0,0 +1,218 @@
+"""
+Routage des lectures par route (read preference)
+- Profil "primaire": lecture sur le primaire (profil par défaut)
+- Profil "rapport": secondaire de préférence, retard borné par READ_MAX_STALENESS_SECONDS
+- Surcharge par route: READ_PREFERENCES="notes_etudiant=primaire,list_espaces=rapport"
+- Lecture de ses propres écritures: une écriture faite dans `ecriture()` retient son heure
+  d'opération, en mémoire pour ce processus et dans l'en-tête X-Operation-Time renvoyé au
+  client (qui le renvoie à la requête suivante, quel que soit le worker qui la reçoit).
+  Les lectures suivantes passent par une session causale avancée à cette heure: le secondaire
+  attend d'avoir répliqué l'écriture avant de répondre
+- Sur un serveur seul (sans replica set), aucune session n'est ouverte
+"""
+import base64
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+import bson
+from bson.timestamp import Timestamp
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+from database import get_client, READ_MAX_STALENESS_SECONDS, READ_PREFERENCES
+
+HEADER = "X-Operation-Time"
+MAX_UTILISATEURS = 10_000
+
+PROFILS = {
+    "primaire": Primary(),
+    "rapport": SecondaryPreferred(max_staleness=READ_MAX_STALENESS_SECONDS)
+}
+
+ROUTES = {
+    "notes_etudiant": "rapport",
+    "statistiques_espace": "rapport",
+    "list_formateurs": "rapport",
+    "list_promotions": "rapport",
+    "list_etudiants": "rapport",
+    "list_espaces": "rapport",
+    "list_travaux": "rapport",
+    "list_livraisons": "rapport",
+    "analytique": "rapport"
+}
+
+
+def _charger_surcharges(valeur: str):
+    for item in filter(None, (i.strip() for i in valeur.split(","))):
+        route, _, profil = item.partition("=")
+        if profil.strip() not in PROFILS:
+            print(f"⚠️  READ_PREFERENCES: profil inconnu ignoré ({item})")
+            continue
+        ROUTES[route.strip()] = profil.strip()
+
+
+_charger_surcharges(READ_PREFERENCES)
+
+# Heure d'opération reçue / produite pendant la requête en cours (voir LecturesCausalesMiddleware)
+_requete: ContextVar[Optional[dict]] = ContextVar("lectures_requete", default=None)
+
+
+def _encoder(operation_time: Timestamp, cluster_time: Optional[dict]) -> str:
+    doc = {"operationTime": operation_time}
+    if cluster_time:
+        doc["clusterTime"] = cluster_time
+    return base64.urlsafe_b64encode(bson.encode(doc)).decode()
+
+
+def _decoder(valeur: Optional[str]) -> Optional[Tuple[Timestamp, Optional[dict]]]:
+    if not valeur:
+        return None
+    try:
+        doc = bson.decode(base64.urlsafe_b64decode(valeur.encode()))
+    except Exception:
+        return None
+    if not isinstance(doc.get("operationTime"), Timestamp):
+        return None
+    return doc["operationTime"], doc.get("clusterTime")
+
+
+def _causal() -> bool:
+    # "Single": serveur seul, pas de secondaire ni de lecture causale
+    return get_client().topology_description.topology_type_name != "Single"
+
+
+class _CollectionRoutee:
+    """Collection lue avec la préférence de la route, dans la session causale éventuelle"""
+
+    def __init__(self, collection, session):
+        self._collection = collection
+        self._session = session
+
+    def find(self, *args, **kwargs):
+        return self._collection.find(*args, session=self._session, **kwargs)
+
+    def aggregate(self, *args, **kwargs):
+        return self._collection.aggregate(*args, session=self._session, **kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        return await self._collection.find_one(*args, session=self._session, **kwargs)
+
+    async def count_documents(self, *args, **kwargs):
+        return await self._collection.count_documents(*args, session=self._session, **kwargs)
+
+    async def distinct(self, *args, **kwargs):
+        return await self._collection.distinct(*args, session=self._session, **kwargs)
+
+
+class Lecteur:
+    def __init__(self, profil: str, session=None):
+        self.profil = profil
+        self.session = session
+
+    def __call__(self, collection) -> _CollectionRoutee:
+        return _CollectionRoutee(collection.with_options(read_preference=PROFILS[self.profil]), self.session)
+
+
+class ReadRouter:
+    def __init__(self):
+        # user_id -> (expiration, heure d'opération, heure de cluster) de sa dernière écriture
+        self._ecritures: Dict[str, Tuple[float, Timestamp, Optional[dict]]] = {}
+
+    def _retenir(self, user_id: str, session):
+        operation_time = session.operation_time
+        if operation_time is None:
+            return
+        cluster_time = session.cluster_time
+
+        # Au-delà du retard maximal toléré, tout secondaire éligible a déjà l'écriture
+        now = time.monotonic()
+        if len(self._ecritures) >= MAX_UTILISATEURS:
+            self._ecritures = {k: v for k, v in self._ecritures.items() if v[0] > now}
+        self._ecritures[user_id] = (now + READ_MAX_STALENESS_SECONDS, operation_time, cluster_time)
+
+        etat = _requete.get()
+        if etat is not None and (etat["ecrit"] is None or operation_time > etat["ecrit"][0]):
+            etat["ecrit"] = (operation_time, cluster_time)
+
+    def _derniere_ecriture(self, user_id: str) -> Optional[Tuple[Timestamp, Optional[dict]]]:
+        candidats = []
+        entry = self._ecritures.get(user_id)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                candidats.append(entry[1:])
+            else:
+                del self._ecritures[user_id]
+        etat = _requete.get()
+        if etat is not None and etat["recu"] is not None:
+            candidats.append(etat["recu"])
+        return max(candidats, key=lambda c: c[0]) if candidats else None
+
+    @asynccontextmanager
+    async def ecriture(self, user_id: str):
+        """Session à passer aux écritures dont l'utilisateur doit voir le résultat ensuite"""
+        if not _causal():
+            yield None
+            return
+        async with await get_client().start_session(causal_consistency=True) as session:
+            yield session
+            self._retenir(user_id, session)
+
+    @asynccontextmanager
+    async def lecteur(self, route: str, user_id: str):
+        profil = ROUTES.get(route, "primaire")
+        apres = self._derniere_ecriture(user_id) if profil != "primaire" and _causal() else None
+        if apres is None:
+            yield Lecteur(profil)
+            return
+
+        async with await get_client().start_session(causal_consistency=True) as session:
+            operation_time, cluster_time = apres
+            if cluster_time:
+                session.advance_cluster_time(cluster_time)
+            session.advance_operation_time(operation_time)
+            yield Lecteur(profil, session)
+
+    @asynccontextmanager
+    async def causal(self, lecteur: Lecteur):
+        """Lecteur dont chaque lecture voit au moins ce qu'ont vu les précédentes de sa session,
+        y compris celles faites sur le primaire (afterClusterTime)"""
+        if lecteur.session is not None or not _causal():
+            yield lecteur
+            return
+        async with await get_client().start_session(causal_consistency=True) as session:
+            yield Lecteur(lecteur.profil, session)
+
+
+class LecturesCausalesMiddleware:
+    """Lit X-Operation-Time sur la requête et le renvoie si la requête a écrit"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        recu = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-operation-time":
+                recu = _decoder(value.decode("latin-1"))
+        etat = {"recu": recu, "ecrit": None}
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start" and etat["ecrit"] is not None:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-operation-time", _encoder(*etat["ecrit"]).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = _requete.set(etat)
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            _requete.reset(token)
+
+
+read_router = ReadRouter()
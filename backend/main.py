@@ -1,93 +1,343 @@
 import traceback
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends, Header, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, JSONResponse
+import bson
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, InsertOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from typing import List, Optional
+import asyncio
+import base64
 import uuid
 
 from database import (
     formateurs_collection, promotions_collection, etudiants_collection,
     espaces_collection, travaux_collection, livraisons_collection,
-    evaluations_collection, directeurs_collection, JWT_SECRET,
-    SUPABASE_URL, SUPABASE_SERVICE_KEY
+    evaluations_collection, directeurs_collection, evaluation_audit_collection,
+    evaluations_archive_collection, evaluation_audit_archive_collection, JWT_SECRET,
+    televersements_collection, identifiants_relance_collection, ACCESS_TOKEN_MINUTES, REFRESH_TOKEN_DAYS,
+    DIRECT_UPLOAD_MIN_BYTES, connect, close_client
+)
+from models import (
+    LoginRequest, RefreshRequest, LogoutRequest, TokenResponse,
+    DirecteurCreate, DirecteurCreateResponse, DirecteurResponse,
+    FormateurCreate, FormateurCreateResponse, FormateurUpdate, FormateurResponse,
+    PromotionCreate, PromotionUpdate, PromotionResponse,
+    EtudiantCreate, EtudiantCreateResponse, EtudiantUpdate, EtudiantResponse,
+    EspacePedagogiqueCreate, EspacePedagogiqueUpdate, EspacePedagogiqueResponse,
+    TravailCreate, TravailUpdate, TravailResponse, EcheanceResponse, EcheancesResponse,
+    LivraisonCreate, LivraisonResponse, LivraisonResumeResponse,
+    EvaluationCreate, EvaluationUpdate, EvaluationResponse,
+    EvaluationBatchCreate, EvaluationBatchResultat, EvaluationBatchResponse,
+    HistoriqueModification, HistoriqueEvaluationResponse,
+    NoteEtudiantResponse, StatistiquesEspace, AnalytiqueEspaceResponse, AnalytiquePromotionResponse,
+    FichierExistantRequest, EnvoiSigneRequest, EnvoiTermineRequest,
+    JobCreate, JobResponse, SearchResponse
 )
-from models import *
 from utils import hash_password, verify_password, generate_password
-
-app = FastAPI(title="Gestion Pédagogique API")
-
+from jobs import job_queue, submit_job, get_job, is_registered
+from scheduler import deadline_scheduler, statut_par_dates, STATUTS_ECHEANCE
+from events import event_bus, format_sse, emettre_ticket, consommer_ticket, TICKET_SECONDES
+from identities import (
+    USER_COLLECTIONS, create_identity, find_by_email, find_by_user_id, update_identity, delete_identity
+)
+from revocation import revocation_store
+from fichiers import (
+    hacher, retrouver, retrouver_annonce, stocker, attacher, detacher, remplacer, televerser, close_http_client, MAX_FICHIERS_LOT,
+    stockage_configure, signer_envoi, terminer_envoi
+)
+from analytique import analyse_espace, analyse_promotion, evaluations_modifiees
+from archives import find_one_avec_archive, find_avec_archive, etudiant_archive
+from lectures import read_router, Lecteur, LecturesCausalesMiddleware, HEADER as OPERATION_TIME_HEADER
+from admission import AdmissionMiddleware, admission_control
+from coalescence import singleflight
+import sante
+from contenus import (
+    preparer as preparer_contenu, enregistrer as enregistrer_contenus, charger as charger_contenus
+)
+from assignations import (
+    etudiants_assignes, est_assigne, branches_travaux_etudiant, query_travaux_etudiant,
+    resumes_assignes, nombre_assignes, effectifs_promotions
+)
+from search import (
+    search, mots_cles_etudiant, mots_cles_formateur, mots_cles_espace, mots_cles_travail
+)
+import taches
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Chaque processus worker ouvre son propre client Motor et son propre pool.
+    # Aucune étape ne bloque sur MongoDB: les chargements initiaux (révocations,
+    # échéances) tournent en tâche de fond et le premier appel est servi tout de suite
+    await connect()
+    await revocation_store.start()
+    await job_queue.start()
+    await deadline_scheduler.start()
+    await event_bus.start()
+    yield
+    await event_bus.stop()
+    await deadline_scheduler.stop()
+    await job_queue.stop()
+    await revocation_store.stop()
+    await close_http_client()
+    close_client()
+
+app = FastAPI(title="Gestion Pédagogique API", lifespan=lifespan)
+
+# Ajouté avant CORS: les rejets (429/503) portent aussi les en-têtes CORS
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[OPERATION_TIME_HEADER],
 )
+app.add_middleware(LecturesCausalesMiddleware)
 
 # --- Dépendances & Utilitaires ---
 
-async def get_current_user(authorization: str = Header(...)):
+async def decode_token(token: str, token_type: str = "access"):
     try:
-        token = authorization.replace("Bearer ", "")
         payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return payload
     except JWTError:
         raise HTTPException(status_code=401, detail="Token invalide ou expiré")
 
-def create_token(user_id: str, user_type: str, nom_complet: str):
-    expire = datetime.utcnow() + timedelta(hours=24)
+    # Les anciens tokens sans "type" sont des tokens d'accès
+    if payload.get("type", "access") != token_type:
+        raise HTTPException(status_code=401, detail="Token invalide ou expiré")
+
+    if await revocation_store.is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Token révoqué")
+
+    return payload
+
+async def get_current_user(authorization: str = Header(...)):
+    return await decode_token(authorization.replace("Bearer ", ""))
+
+def lecture(route: str):
+    """Dépendance: lecteur configuré pour la route (préférence de lecture, session causale)"""
+    async def dependency(current_user: dict = Depends(get_current_user)):
+        async with read_router.lecteur(route, current_user["user_id"]) as lecteur:
+            yield lecteur
+    return dependency
+
+async def get_current_user_sse(ticket: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    # EventSource ne permet pas d'envoyer d'en-tête: un ticket à usage unique passe en paramètre
+    if authorization:
+        return await decode_token(authorization.replace("Bearer ", ""))
+    if ticket:
+        payload = await consommer_ticket(ticket)
+        if not payload:
+            raise HTTPException(status_code=401, detail="Ticket invalide ou expiré")
+        if await revocation_store.is_revoked(payload):
+            raise HTTPException(status_code=401, detail="Token révoqué")
+        return payload
+    raise HTTPException(status_code=401, detail="Token manquant")
+
+def create_token(user_id: str, user_type: str, nom_complet: str, token_type: str = "access"):
+    now = datetime.utcnow()
+    if token_type == "refresh":
+        expire = now + timedelta(days=REFRESH_TOKEN_DAYS)
+    else:
+        expire = now + timedelta(minutes=ACCESS_TOKEN_MINUTES)
     return jwt.encode({
         "user_id": user_id,
         "user_type": user_type,
         "nom_complet": nom_complet,
+        "type": token_type,
+        "jti": uuid.uuid4().hex,
+        "iat": now,
         "exp": expire
     }, JWT_SECRET, algorithm="HS256")
 
+def issue_tokens(user_id: str, user_type: str, nom_complet: str) -> TokenResponse:
+    return TokenResponse(
+        access_token=create_token(user_id, user_type, nom_complet),
+        refresh_token=create_token(user_id, user_type, nom_complet, "refresh"),
+        expires_in=ACCESS_TOKEN_MINUTES * 60,
+        user_type=user_type,
+        user_id=user_id,
+        nom_complet=nom_complet
+    )
+
+HISTORIQUE_RECENT = 20
+
+def historique_to_response(h: dict) -> HistoriqueModification:
+    return HistoriqueModification(
+        ancienne_note=h.get("ancienne_note"),
+        nouvelle_note=h.get("nouvelle_note"),
+        raison=h.get("raison"),
+        modifie_par=h.get("modifie_par"),
+        date_modification=h.get("date_modification")
+    )
+
+async def historique_recent(evaluation: dict) -> List[HistoriqueModification]:
+    """Dernières modifications, de la plus ancienne à la plus récente (forme de l'ancien champ embarqué)"""
+    # Évaluation pas encore migrée: son historique est encore dans le document
+    entries = evaluation.get("historique_modifications") or []
+    if evaluation.get("nombre_modifications"):
+        for audit in (evaluation_audit_collection, evaluation_audit_archive_collection):
+            recentes = await audit.find({"evaluation_id": evaluation["_id"]}).sort(
+                "date_modification", -1
+            ).limit(HISTORIQUE_RECENT).to_list(None)
+            if recentes:
+                entries = entries + recentes[::-1]
+                break
+    return [historique_to_response(h) for h in entries[-HISTORIQUE_RECENT:]]
+
+async def evaluation_to_response(evaluation: dict) -> EvaluationResponse:
+    travail = await find_one_avec_archive("travaux", {"_id": evaluation["travail_id"]}, {"titre": 1})
+    etudiant = await etudiants_collection.find_one({"_id": evaluation["etudiant_id"]}, {"nom_complet": 1})
+    formateur = await formateurs_collection.find_one({"_id": evaluation["formateur_id"]}, {"nom_complet": 1})
+
+    return EvaluationResponse(
+        id=str(evaluation["_id"]),
+        livraison_id=str(evaluation["livraison_id"]),
+        travail_id=str(evaluation["travail_id"]),
+        travail_titre=travail["titre"] if travail else None,
+        etudiant_id=str(evaluation["etudiant_id"]),
+        etudiant_nom=etudiant["nom_complet"] if etudiant else None,
+        formateur_id=str(evaluation["formateur_id"]),
+        formateur_nom=formateur["nom_complet"] if formateur else None,
+        note=evaluation["note"],
+        commentaire=evaluation.get("commentaire"),
+        date_evaluation=evaluation["date_evaluation"],
+        nombre_modifications=evaluation.get("nombre_modifications", 0),
+        historique_modifications=await historique_recent(evaluation)
+    )
+
+async def register_identity(user_type: str, user: dict):
+    try:
+        await create_identity(user_type, user)
+    except DuplicateKeyError:
+        # Email pris entre la vérification et l'insertion: on annule la création
+        await USER_COLLECTIONS[user_type].delete_one({"_id": user["_id"]})
+        raise HTTPException(status_code=400, detail="Cet email existe déjà")
+
+async def sync_identity(id: str, user: dict, update_data: dict):
+    """À appeler avant de modifier le compte: un email déjà pris est refusé sans rien écrire"""
+    if "email" in update_data and update_data["email"] != user["email"]:
+        try:
+            await update_identity(id, update_data)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="Cet email existe déjà")
+    else:
+        await update_identity(id, update_data)
+
+def livraison_to_response(livraison: dict, etudiant_nom: Optional[str] = None) -> LivraisonResponse:
+    return LivraisonResponse(
+        id=str(livraison["_id"]),
+        travail_id=str(livraison["travail_id"]),
+        etudiant_id=str(livraison["etudiant_id"]),
+        etudiant_nom=etudiant_nom,
+        contenu=livraison.get("contenu"),
+        fichiers_urls=livraison.get("fichiers_urls", []),
+        liens=livraison.get("liens", []),
+        date_soumission=livraison["date_soumission"],
+        modifiable=livraison.get("modifiable", False)
+    )
+
+# Champs des listes de livraisons: sans contenu, fichiers ni liens (chargés par GET /api/livraisons/{id})
+LIVRAISON_RESUME = {"travail_id": 1, "etudiant_id": 1, "date_soumission": 1, "modifiable": 1}
+
+def livraison_to_resume(livraison: dict, etudiant_nom: Optional[str] = None) -> LivraisonResumeResponse:
+    return LivraisonResumeResponse(
+        id=str(livraison["_id"]),
+        travail_id=str(livraison["travail_id"]),
+        etudiant_id=str(livraison["etudiant_id"]),
+        etudiant_nom=etudiant_nom,
+        date_soumission=livraison["date_soumission"],
+        modifiable=livraison.get("modifiable", False)
+    )
+
+async def noms_etudiants(lire, etudiant_ids) -> dict:
+    """Noms des étudiants en une seule requête: {_id: nom_complet}"""
+    etudiants = await lire(etudiants_collection).find(
+        {"_id": {"$in": list(set(etudiant_ids))}}, {"nom_complet": 1}
+    ).to_list(None)
+    return {e["_id"]: e["nom_complet"] for e in etudiants}
+
+def job_to_response(job: dict) -> JobResponse:
+    return JobResponse(
+        id=str(job["_id"]),
+        type=job["type"],
+        statut=job["statut"],
+        progression=job.get("progression", 0),
+        message=job.get("message"),
+        tentatives=job.get("tentatives", 0),
+        max_tentatives=job.get("max_tentatives", 1),
+        resultat=job.get("resultat"),
+        erreur=job.get("erreur"),
+        created_at=job["created_at"],
+        started_at=job.get("started_at"),
+        finished_at=job.get("finished_at")
+    )
+
 # --- Authentification ---
 
 @app.post("/api/auth/login-directeur", response_model=TokenResponse)
 async def login_directeur(request: LoginRequest):
-    directeur = await directeurs_collection.find_one({"email": request.email})
-    if not directeur or not verify_password(request.mot_de_passe, directeur["mot_de_passe"]):
+    identity = await find_by_email(request.email)
+    if (not identity or identity["user_type"] != "directeur"
+            or not verify_password(request.mot_de_passe, identity["mot_de_passe"])):
         raise HTTPException(status_code=401, detail="Identifiants incorrects")
 
-    token = create_token(str(directeur["_id"]), "directeur", directeur["nom_complet"])
-    return TokenResponse(
-        access_token=token,
-        user_type="directeur",
-        user_id=str(directeur["_id"]),
-        nom_complet=directeur["nom_complet"]
-    )
+    return issue_tokens(str(identity["user_id"]), "directeur", identity["nom_complet"])
 
 @app.post("/api/auth/login-user", response_model=TokenResponse)
 async def login_user(request: LoginRequest):
-    user = await formateurs_collection.find_one({"email": request.email})
-    user_type = "formateur"
-
-    if not user:
-        user = await etudiants_collection.find_one({"email": request.email})
-        user_type = "etudiant"
+    identity = await find_by_email(request.email)
 
-    if not user or not verify_password(request.mot_de_passe, user["mot_de_passe"]):
+    if (not identity or identity["user_type"] not in ("formateur", "etudiant")
+            or not verify_password(request.mot_de_passe, identity["mot_de_passe"])):
         raise HTTPException(status_code=401, detail="Identifiants incorrects")
 
-    collection = formateurs_collection if user_type == "formateur" else etudiants_collection
-    if not user.get("compte_active"):
-        await collection.update_one(
-            {"_id": user["_id"]},
+    user_type = identity["user_type"]
+    if not identity.get("compte_active"):
+        await USER_COLLECTIONS[user_type].update_one(
+            {"_id": identity["user_id"]},
             {"$set": {"compte_active": True, "date_activation": datetime.utcnow()}}
         )
+        await update_identity(identity["user_id"], {"compte_active": True})
 
-    token = create_token(str(user["_id"]), user_type, user["nom_complet"])
-    return TokenResponse(
-        access_token=token,
-        user_type=user_type,
-        user_id=str(user["_id"]),
-        nom_complet=user["nom_complet"]
-    )
+    return issue_tokens(str(identity["user_id"]), user_type, identity["nom_complet"])
+
+@app.post("/api/auth/refresh", response_model=TokenResponse)
+async def refresh_token(request: RefreshRequest):
+    payload = await decode_token(request.refresh_token, "refresh")
+
+    # Le compte peut avoir été renommé ou supprimé depuis l'émission du token
+    identity = await find_by_user_id(payload["user_id"])
+    if not identity:
+        raise HTTPException(status_code=401, detail="Compte introuvable")
+
+    # Rotation: l'ancien refresh token ne peut servir qu'une fois
+    await revocation_store.revoke_token(payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+
+    return issue_tokens(payload["user_id"], identity["user_type"], identity["nom_complet"])
+
+@app.post("/api/auth/logout")
+async def logout(request: LogoutRequest, authorization: str = Header(...)):
+    payload = await decode_token(authorization.replace("Bearer ", ""))
+    if payload.get("jti"):
+        await revocation_store.revoke_token(payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+
+    if request.refresh_token:
+        try:
+            refresh = await decode_token(request.refresh_token, "refresh")
+            await revocation_store.revoke_token(refresh["jti"], datetime.utcfromtimestamp(refresh["exp"]))
+        except HTTPException:
+            pass
+
+    return {"message": "Déconnexion réussie"}
 
 # --- Directeurs ---
 
@@ -96,7 +346,7 @@ async def create_directeur(directeur: DirecteurCreate, current_user: dict = Depe
     if current_user["user_type"] != "directeur":
         raise HTTPException(status_code=403, detail="Accès réservé au directeur")
 
-    existing = await directeurs_collection.find_one({"email": directeur.email})
+    existing = await find_by_email(directeur.email)
     if existing:
         raise HTTPException(status_code=400, detail="Cet email existe déjà")
 
@@ -107,6 +357,7 @@ async def create_directeur(directeur: DirecteurCreate, current_user: dict = Depe
     directeur_dict["created_at"] = datetime.utcnow()
 
     result = await directeurs_collection.insert_one(directeur_dict)
+    await register_identity("directeur", directeur_dict)
 
     return DirecteurCreateResponse(
         id=str(result.inserted_id),
@@ -141,6 +392,8 @@ async def delete_directeur(id: str, current_user: dict = Depends(get_current_use
     result = await directeurs_collection.delete_one({"_id": ObjectId(id)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Directeur introuvable")
+    await delete_identity(id)
+    await revocation_store.revoke_user(id)
 
     return {"message": "Directeur supprimé avec succès"}
 
@@ -151,7 +404,7 @@ async def create_formateur(formateur: FormateurCreate, current_user: dict = Depe
     if current_user["user_type"] != "directeur":
         raise HTTPException(status_code=403, detail="Accès réservé au directeur")
 
-    existing = await formateurs_collection.find_one({"email": formateur.email})
+    existing = await find_by_email(formateur.email)
     if existing:
         raise HTTPException(status_code=400, detail="Cet email existe déjà")
 
@@ -161,8 +414,11 @@ async def create_formateur(formateur: FormateurCreate, current_user: dict = Depe
     formateur_dict["mot_de_passe"] = hash_password(password_clair)
     formateur_dict["compte_active"] = False
     formateur_dict["created_at"] = datetime.utcnow()
+    formateur_dict["mots_cles"] = mots_cles_formateur(formateur_dict)
 
-    result = await formateurs_collection.insert_one(formateur_dict)
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await formateurs_collection.insert_one(formateur_dict, session=session)
+    await register_identity("formateur", formateur_dict)
 
     return FormateurCreateResponse(
         id=str(result.inserted_id),
@@ -174,8 +430,9 @@ async def create_formateur(formateur: FormateurCreate, current_user: dict = Depe
     )
 
 @app.get("/api/formateurs", response_model=List[FormateurResponse])
-async def list_formateurs(current_user: dict = Depends(get_current_user)):
-    formateurs = await formateurs_collection.find().to_list(None)
+async def list_formateurs(current_user: dict = Depends(get_current_user),
+                          lire: Lecteur = Depends(lecture("list_formateurs"))):
+    formateurs = await lire(formateurs_collection).find().to_list(None)
     return [
         FormateurResponse(
             id=str(f["_id"]),
@@ -214,11 +471,18 @@ async def update_formateur(id: str, update: FormateurUpdate, current_user: dict
 
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
 
+    if "nom_complet" in update_data or "email" in update_data:
+        update_data["mots_cles"] = mots_cles_formateur({**formateur, **update_data})
+
+    await sync_identity(id, formateur, update_data)
+
     if update_data:
-        await formateurs_collection.update_one(
-            {"_id": ObjectId(id)},
-            {"$set": update_data}
-        )
+        async with read_router.ecriture(current_user["user_id"]) as session:
+            await formateurs_collection.update_one(
+                {"_id": ObjectId(id)},
+                {"$set": update_data},
+                session=session
+            )
 
     updated = await formateurs_collection.find_one({"_id": ObjectId(id)})
     return FormateurResponse(
@@ -235,9 +499,12 @@ async def delete_formateur(id: str, current_user: dict = Depends(get_current_use
     if current_user["user_type"] != "directeur":
         raise HTTPException(status_code=403, detail="Accès réservé au directeur")
 
-    result = await formateurs_collection.delete_one({"_id": ObjectId(id)})
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await formateurs_collection.delete_one({"_id": ObjectId(id)}, session=session)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Formateur introuvable")
+    await delete_identity(id)
+    await revocation_store.revoke_user(id)
 
     return {"message": "Formateur supprimé avec succès"}
 
@@ -251,7 +518,8 @@ async def create_promotion(promotion: PromotionCreate, current_user: dict = Depe
     promotion_dict = promotion.model_dump()
     promotion_dict["created_at"] = datetime.utcnow()
 
-    result = await promotions_collection.insert_one(promotion_dict)
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await promotions_collection.insert_one(promotion_dict, session=session)
 
     return PromotionResponse(
         id=str(result.inserted_id),
@@ -263,12 +531,13 @@ async def create_promotion(promotion: PromotionCreate, current_user: dict = Depe
     )
 
 @app.get("/api/promotions", response_model=List[PromotionResponse])
-async def list_promotions(current_user: dict = Depends(get_current_user)):
-    promotions = await promotions_collection.find().to_list(None)
+async def list_promotions(current_user: dict = Depends(get_current_user),
+                          lire: Lecteur = Depends(lecture("list_promotions"))):
+    promotions = await lire(promotions_collection).find().to_list(None)
     result = []
 
     for p in promotions:
-        count = await etudiants_collection.count_documents({"promotion_id": ObjectId(p["_id"])})
+        count = await lire(etudiants_collection).count_documents({"promotion_id": ObjectId(p["_id"])})
         result.append(PromotionResponse(
             id=str(p["_id"]),
             nom=p["nom"],
@@ -309,10 +578,12 @@ async def update_promotion(id: str, update: PromotionUpdate, current_user: dict
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
 
     if update_data:
-        await promotions_collection.update_one(
-            {"_id": ObjectId(id)},
-            {"$set": update_data}
-        )
+        async with read_router.ecriture(current_user["user_id"]) as session:
+            await promotions_collection.update_one(
+                {"_id": ObjectId(id)},
+                {"$set": update_data},
+                session=session
+            )
 
     updated = await promotions_collection.find_one({"_id": ObjectId(id)})
     count = await etudiants_collection.count_documents({"promotion_id": ObjectId(id)})
@@ -335,7 +606,8 @@ async def delete_promotion(id: str, current_user: dict = Depends(get_current_use
     if count > 0:
         raise HTTPException(status_code=400, detail="Impossible de supprimer une promotion contenant des étudiants")
 
-    result = await promotions_collection.delete_one({"_id": ObjectId(id)})
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await promotions_collection.delete_one({"_id": ObjectId(id)}, session=session)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Promotion introuvable")
 
@@ -348,7 +620,7 @@ async def create_etudiant(etudiant: EtudiantCreate, current_user: dict = Depends
     if current_user["user_type"] != "directeur":
         raise HTTPException(status_code=403, detail="Accès réservé au directeur")
 
-    existing_email = await etudiants_collection.find_one({"email": etudiant.email})
+    existing_email = await find_by_email(etudiant.email)
     if existing_email:
         raise HTTPException(status_code=400, detail="Cet email existe déjà")
 
@@ -367,8 +639,11 @@ async def create_etudiant(etudiant: EtudiantCreate, current_user: dict = Depends
     etudiant_dict["promotion_id"] = ObjectId(etudiant.promotion_id)
     etudiant_dict["compte_active"] = False
     etudiant_dict["created_at"] = datetime.utcnow()
+    etudiant_dict["mots_cles"] = mots_cles_etudiant(etudiant_dict)
 
-    result = await etudiants_collection.insert_one(etudiant_dict)
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await etudiants_collection.insert_one(etudiant_dict, session=session)
+    await register_identity("etudiant", etudiant_dict)
 
     return EtudiantCreateResponse(
         id=str(result.inserted_id),
@@ -381,15 +656,16 @@ async def create_etudiant(etudiant: EtudiantCreate, current_user: dict = Depends
     )
 
 @app.get("/api/etudiants", response_model=List[EtudiantResponse])
-async def list_etudiants(current_user: dict = Depends(get_current_user)):
-    etudiants = await etudiants_collection.find().to_list(None)
+async def list_etudiants(current_user: dict = Depends(get_current_user),
+                         lire: Lecteur = Depends(lecture("list_etudiants"))):
+    etudiants = await lire(etudiants_collection).find().to_list(None)
     result = []
 
     for e in etudiants:
         promo_id = e.get("promotion_id")
         promotion = None
         if promo_id:
-            promotion = await promotions_collection.find_one({"_id": promo_id})
+            promotion = await lire(promotions_collection).find_one({"_id": promo_id})
 
         result.append(EtudiantResponse(
             id=str(e["_id"]),
@@ -405,10 +681,11 @@ async def list_etudiants(current_user: dict = Depends(get_current_user)):
     return result
 
 @app.get("/api/etudiants/promotion/{promotion_id}", response_model=List[EtudiantResponse])
-async def list_etudiants_by_promotion(promotion_id: str, current_user: dict = Depends(get_current_user)):
-    etudiants = await etudiants_collection.find({"promotion_id": ObjectId(promotion_id)}).to_list(None)
+async def list_etudiants_by_promotion(promotion_id: str, current_user: dict = Depends(get_current_user),
+                                      lire: Lecteur = Depends(lecture("list_etudiants"))):
+    etudiants = await lire(etudiants_collection).find({"promotion_id": ObjectId(promotion_id)}).to_list(None)
 
-    promotion = await promotions_collection.find_one({"_id": ObjectId(promotion_id)})
+    promotion = await lire(promotions_collection).find_one({"_id": ObjectId(promotion_id)})
     promotion_nom = promotion["nom"] if promotion else None
 
     return [
@@ -461,11 +738,18 @@ async def update_etudiant(id: str, update: EtudiantUpdate, current_user: dict =
             raise HTTPException(status_code=404, detail="Promotion introuvable")
         update_data["promotion_id"] = ObjectId(update_data["promotion_id"])
 
+    if {"nom_complet", "email", "matricule"} & update_data.keys():
+        update_data["mots_cles"] = mots_cles_etudiant({**etudiant, **update_data})
+
+    await sync_identity(id, etudiant, update_data)
+
     if update_data:
-        await etudiants_collection.update_one(
-            {"_id": ObjectId(id)},
-            {"$set": update_data}
-        )
+        async with read_router.ecriture(current_user["user_id"]) as session:
+            await etudiants_collection.update_one(
+                {"_id": ObjectId(id)},
+                {"$set": update_data},
+                session=session
+            )
 
     updated = await etudiants_collection.find_one({"_id": ObjectId(id)})
     promotion = await promotions_collection.find_one({"_id": updated["promotion_id"]})
@@ -486,9 +770,12 @@ async def delete_etudiant(id: str, current_user: dict = Depends(get_current_user
     if current_user["user_type"] != "directeur":
         raise HTTPException(status_code=403, detail="Accès réservé au directeur")
 
-    result = await etudiants_collection.delete_one({"_id": ObjectId(id)})
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await etudiants_collection.delete_one({"_id": ObjectId(id)}, session=session)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Étudiant introuvable")
+    await delete_identity(id)
+    await revocation_store.revoke_user(id)
 
     return {"message": "Étudiant supprimé avec succès"}
 
@@ -504,8 +791,10 @@ async def create_espace(espace: EspacePedagogiqueCreate, current_user: dict = De
     espace_dict["promotions"] = []
     espace_dict["etudiants"] = []
     espace_dict["created_at"] = datetime.utcnow()
+    espace_dict["mots_cles"] = mots_cles_espace(espace_dict)
 
-    result = await espaces_collection.insert_one(espace_dict)
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await espaces_collection.insert_one(espace_dict, session=session)
 
     return EspacePedagogiqueResponse(
         id=str(result.inserted_id),
@@ -519,14 +808,15 @@ async def create_espace(espace: EspacePedagogiqueCreate, current_user: dict = De
     )
 
 @app.get("/api/espaces", response_model=List[EspacePedagogiqueResponse])
-async def list_espaces(current_user: dict = Depends(get_current_user)):
+async def list_espaces(current_user: dict = Depends(get_current_user),
+                       lire: Lecteur = Depends(lecture("list_espaces"))):
     query = {}
     if current_user["user_type"] == "formateur":
         query = {"formateurs.id": ObjectId(current_user["user_id"])}
     elif current_user["user_type"] == "etudiant":
         query = {"etudiants.id": ObjectId(current_user["user_id"])}
 
-    espaces = await espaces_collection.find(query).to_list(None)
+    espaces = await lire(espaces_collection).find(query).to_list(None)
 
     result = []
     for e in espaces:
@@ -578,11 +868,16 @@ async def update_espace(id: str, update: EspacePedagogiqueUpdate, current_user:
 
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
 
+    if "nom_matiere" in update_data or "code_matiere" in update_data:
+        update_data["mots_cles"] = mots_cles_espace({**espace, **update_data})
+
     if update_data:
-        await espaces_collection.update_one(
-            {"_id": ObjectId(id)},
-            {"$set": update_data}
-        )
+        async with read_router.ecriture(current_user["user_id"]) as session:
+            await espaces_collection.update_one(
+                {"_id": ObjectId(id)},
+                {"$set": update_data},
+                session=session
+            )
 
     updated = await espaces_collection.find_one({"_id": ObjectId(id)})
 
@@ -614,7 +909,8 @@ async def delete_espace(id: str, current_user: dict = Depends(get_current_user))
     if current_user["user_type"] != "directeur":
         raise HTTPException(status_code=403, detail="Accès réservé au directeur")
 
-    result = await espaces_collection.delete_one({"_id": ObjectId(id)})
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await espaces_collection.delete_one({"_id": ObjectId(id)}, session=session)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Espace pédagogique introuvable")
 
@@ -642,10 +938,12 @@ async def add_formateur_to_espace(id: str, formateur_id: dict, current_user: dic
         "nom_complet": formateur["nom_complet"]
     })
 
-    await espaces_collection.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": {"formateurs": formateurs}}
-    )
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        await espaces_collection.update_one(
+            {"_id": ObjectId(id)},
+            {"$set": {"formateurs": formateurs}},
+            session=session
+        )
 
     return {"message": "Formateur ajouté avec succès"}
 
@@ -681,10 +979,12 @@ async def add_promotion_to_espace(id: str, promotion_id: dict, current_user: dic
                 "nom_complet": etudiant["nom_complet"]
             })
 
-    await espaces_collection.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": {"promotions": promotions, "etudiants": etudiants_data}}
-    )
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        await espaces_collection.update_one(
+            {"_id": ObjectId(id)},
+            {"$set": {"promotions": promotions, "etudiants": etudiants_data}},
+            session=session
+        )
 
     return {"message": "Promotion ajoutée avec succès"}
 
@@ -707,10 +1007,12 @@ async def add_etudiants_to_espace(id: str, etudiant_ids: dict, current_user: dic
                 "nom_complet": etudiant["nom_complet"]
             })
 
-    await espaces_collection.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": {"etudiants": etudiants_data}}
-    )
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        await espaces_collection.update_one(
+            {"_id": ObjectId(id)},
+            {"$set": {"etudiants": etudiants_data}},
+            session=session
+        )
 
     return {"message": "Étudiants ajoutés avec succès"}
 
@@ -726,10 +1028,12 @@ async def remove_etudiant_from_espace(id: str, etudiant_id: str, current_user: d
     etudiants = espace.get("etudiants", [])
     etudiants = [e for e in etudiants if str(e["id"]) != etudiant_id]
 
-    await espaces_collection.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": {"etudiants": etudiants}}
-    )
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        await espaces_collection.update_one(
+            {"_id": ObjectId(id)},
+            {"$set": {"etudiants": etudiants}},
+            session=session
+        )
 
     return {"message": "Étudiant retiré avec succès"}
 
@@ -744,26 +1048,46 @@ async def create_travail(travail: TravailCreate, current_user: dict = Depends(ge
     if not espace:
         raise HTTPException(status_code=404, detail="Espace pédagogique introuvable")
 
-    if travail.type_travail == "collectif" and len(travail.etudiants_assignes) < 2:
+    if travail.audience and travail.etudiants_assignes:
+        raise HTTPException(status_code=400, detail="Choisissez une liste d'étudiants ou une audience, pas les deux")
+    if not travail.audience and not travail.etudiants_assignes:
+        raise HTTPException(status_code=400, detail="Aucun étudiant assigné")
+    if travail.type_travail == "collectif" and not travail.audience and len(travail.etudiants_assignes) < 2:
         raise HTTPException(status_code=400, detail="Un travail collectif nécessite au moins 2 étudiants")
 
-    etudiants_data = []
-    for etudiant_id in travail.etudiants_assignes:
-        etudiant = await etudiants_collection.find_one({"_id": ObjectId(etudiant_id)})
-        if etudiant:
-            etudiants_data.append({
-                "id": str(etudiant["_id"]),
-                "nom_complet": etudiant["nom_complet"]
-            })
+    # Audience: la promotion ou l'espace est gardé en référence, sans recopier ses étudiants
+    audience = None
+    audience_nom = None
+    if travail.audience and travail.audience.type == "promotion":
+        promotion = await promotions_collection.find_one({"_id": ObjectId(travail.audience.id)}, {"nom": 1})
+        if not promotion:
+            raise HTTPException(status_code=404, detail="Promotion introuvable")
+        audience = {"type": "promotion", "id": promotion["_id"]}
+        audience_nom = promotion["nom"]
+    elif travail.audience:
+        audience = {"type": "espace", "id": espace["_id"]}
+        audience_nom = espace["nom_matiere"]
+
+    statut = statut_par_dates(travail.date_debut, travail.date_fin)
 
     travail_dict = travail.model_dump()
     travail_dict["formateur_id"] = ObjectId(current_user["user_id"])
-    travail_dict["statut"] = "en_attente"
+    travail_dict["statut"] = statut
     travail_dict["created_at"] = datetime.utcnow()
     travail_dict["etudiants_assignes"] = [ObjectId(e) for e in travail.etudiants_assignes]
+    travail_dict["audience"] = audience
     travail_dict["espace_id"] = ObjectId(travail.espace_id)
+    travail_dict["mots_cles"] = mots_cles_travail(travail_dict)
 
-    result = await travaux_collection.insert_one(travail_dict)
+    etudiants_data = [] if audience else [
+        {"id": str(e["_id"]), "nom_complet": e["nom_complet"]} for e in await etudiants_assignes(travail_dict)
+    ]
+
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await travaux_collection.insert_one(travail_dict, session=session)
+    await attacher(travail_dict["fichiers_urls"])
+    deadline_scheduler.schedule(str(result.inserted_id), travail.date_debut, travail.date_fin)
+    event_bus.notify("travaux", "insert", travail_dict)
 
     return TravailResponse(
         id=str(result.inserted_id),
@@ -779,68 +1103,152 @@ async def create_travail(travail: TravailCreate, current_user: dict = Depends(ge
         fichiers_urls=travail.fichiers_urls,
         liens=travail.liens,
         etudiants_assignes=etudiants_data,
-        statut="en_attente",
+        audience=audience_to_response(audience, audience_nom),
+        nombre_assignes=await nombre_assignes(travail_dict, espace=espace),
+        statut=statut,
         created_at=datetime.utcnow()
     )
 
 @app.get("/api/travaux/espace/{espace_id}", response_model=List[TravailResponse])
-async def list_travaux_by_espace(espace_id: str, current_user: dict = Depends(get_current_user)):
-    travaux = await travaux_collection.find({"espace_id": ObjectId(espace_id)}).to_list(None)
-    result = []
+async def list_travaux_by_espace(espace_id: str, statut: Optional[str] = None, archives: bool = False,
+                                 current_user: dict = Depends(get_current_user),
+                                 lire: Lecteur = Depends(lecture("list_travaux"))):
+    return await singleflight.executer(
+        "travaux_espace", (espace_id, statut, archives), current_user, lire,
+        lambda: travaux_de_espace(espace_id, statut, archives, lire)
+    )
 
-    for t in travaux:
-        espace = await espaces_collection.find_one({"_id": t["espace_id"]})
-        formateur = await formateurs_collection.find_one({"_id": t["formateur_id"]})
-
-        etudiants_data = []
-        for etudiant_id in t["etudiants_assignes"]:
-            etudiant = await etudiants_collection.find_one({"_id": etudiant_id})
-            if etudiant:
-                etudiants_data.append({
-                    "id": str(etudiant["_id"]),
-                    "nom_complet": etudiant["nom_complet"]
-                })
+async def travaux_de_espace(espace_id: str, statut: Optional[str], archives: bool, lire: Lecteur) -> List[TravailResponse]:
+    query = {"espace_id": ObjectId(espace_id)}
+    if statut:
+        query["statut"] = statut
 
-        result.append(TravailResponse(
-            id=str(t["_id"]),
+    travaux = await lire(travaux_collection).find(query).to_list(None)
+    if archives:
+        travaux = await find_avec_archive("travaux", query, active_docs=travaux)
+    return await travaux_to_responses(travaux, lire)
+
+@app.get("/api/travaux/etudiant/{etudiant_id}", response_model=List[TravailResponse])
+async def list_travaux_by_etudiant(etudiant_id: str, statut: Optional[str] = None,
+                                   current_user: dict = Depends(get_current_user),
+                                   lire: Lecteur = Depends(lecture("list_travaux"))):
+    etudiant = await lire(etudiants_collection).find_one(
+        {"_id": ObjectId(etudiant_id)}, {"archive": 1, "promotion_id": 1}
+    )
+    # Assignés directement, via la promotion ou via un espace dont l'étudiant est membre
+    query = await query_travaux_etudiant(ObjectId(etudiant_id), lire, etudiant or {})
+    if statut:
+        query = {"$and": [query, {"statut": statut}]}
+
+    travaux = await lire(travaux_collection).find(query).to_list(None)
+    # Promotion archivée: ses travaux terminés sont dans l'archive
+    if etudiant_archive(etudiant):
+        travaux = await find_avec_archive("travaux", query, active_docs=travaux)
+
+    return await travaux_to_responses(travaux, lire)
+
+ECHEANCE_PROJECTION = {"titre": 1, "type_travail": 1, "espace_id": 1, "date_debut": 1, "date_fin": 1}
+
+def encoder_curseur(travail: dict) -> str:
+    return base64.urlsafe_b64encode(bson.encode({"date_fin": travail["date_fin"], "_id": travail["_id"]})).decode()
+
+def decoder_curseur(curseur: str) -> dict:
+    try:
+        doc = bson.decode(base64.urlsafe_b64decode(curseur.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    if not isinstance(doc.get("date_fin"), datetime) or not isinstance(doc.get("_id"), ObjectId):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    return doc
+
+@app.get("/api/etudiants/me/echeances", response_model=EcheancesResponse)
+async def list_echeances(limit: int = 20, apres: Optional[str] = None,
+                         current_user: dict = Depends(get_current_user),
+                         lire: Lecteur = Depends(lecture("list_travaux"))):
+    """Travaux non échus de l'étudiant connecté, par date_fin croissante (pagination par curseur)"""
+    if current_user["user_type"] != "etudiant":
+        raise HTTPException(status_code=403, detail="Réservé aux étudiants")
+    limit = max(1, min(limit, 100))
+    etudiant_id = ObjectId(current_user["user_id"])
+
+    # Reprise après (date_fin, _id) de la dernière échéance renvoyée: un parcours de plage
+    # sur l'index (assignation, date_fin, _id) de chaque branche, sans skip. Toujours borné à
+    # maintenant: une échéance passée entre deux pages n'apparaît pas
+    suite = {"date_fin": {"$gt": datetime.utcnow()}}
+    if apres:
+        dernier = decoder_curseur(apres)
+        suite["$or"] = [
+            {"date_fin": {"$gt": dernier["date_fin"]}},
+            {"date_fin": dernier["date_fin"], "_id": {"$gt": dernier["_id"]}}
+        ]
+    branches = await branches_travaux_etudiant(etudiant_id, lire)
+    travaux = await lire(travaux_collection).find(
+        {"$or": [{**b, **suite} for b in branches]}, ECHEANCE_PROJECTION
+    ).sort([("date_fin", 1), ("_id", 1)]).limit(limit + 1).to_list(None)
+
+    suivant = encoder_curseur(travaux[limit - 1]) if len(travaux) > limit else None
+    travaux = travaux[:limit]
+
+    ids = [t["_id"] for t in travaux]
+    livraisons = {l["travail_id"]: l for l in await lire(livraisons_collection).find(
+        {"travail_id": {"$in": ids}, "etudiant_id": etudiant_id}, {"travail_id": 1, "date_soumission": 1}
+    ).to_list(None)} if ids else {}
+    notes = {e["livraison_id"]: e["note"] for e in await lire(evaluations_collection).find(
+        {"livraison_id": {"$in": [l["_id"] for l in livraisons.values()]}}, {"livraison_id": 1, "note": 1}
+    ).to_list(None)} if livraisons else {}
+    espaces = {e["_id"]: e["nom_matiere"] for e in await lire(espaces_collection).find(
+        {"_id": {"$in": list({t["espace_id"] for t in travaux})}}, {"nom_matiere": 1}
+    ).to_list(None)} if travaux else {}
+
+    echeances = []
+    for t in travaux:
+        livraison = livraisons.get(t["_id"])
+        note = notes.get(livraison["_id"]) if livraison else None
+        echeances.append(EcheanceResponse(
+            travail_id=str(t["_id"]),
             titre=t["titre"],
-            consignes=t["consignes"],
             type_travail=t["type_travail"],
             espace_id=str(t["espace_id"]),
-            espace_nom=espace["nom_matiere"] if espace else None,
-            formateur_id=str(t["formateur_id"]),
-            formateur_nom=formateur["nom_complet"] if formateur else None,
+            espace_nom=espaces.get(t["espace_id"]),
             date_debut=t["date_debut"],
             date_fin=t["date_fin"],
-            fichiers_urls=t.get("fichiers_urls", []),
-            liens=t.get("liens", []),
-            etudiants_assignes=etudiants_data,
-            statut=t["statut"],
-            created_at=t["created_at"]
+            soumission="a_rendre" if not livraison else "evalue" if note is not None else "livre",
+            livraison_id=str(livraison["_id"]) if livraison else None,
+            date_soumission=livraison["date_soumission"] if livraison else None,
+            note=note
         ))
 
-    return result
-
-@app.get("/api/travaux/etudiant/{etudiant_id}", response_model=List[TravailResponse])
-async def list_travaux_by_etudiant(etudiant_id: str, current_user: dict = Depends(get_current_user)):
-    travaux = await travaux_collection.find({
-        "etudiants_assignes": ObjectId(etudiant_id)
-    }).to_list(None)
+    return EcheancesResponse(echeances=echeances, suivant=suivant)
+
+def audience_to_response(audience: Optional[dict], nom: Optional[str]) -> Optional[dict]:
+    if not audience:
+        return None
+    return {"type": audience["type"], "id": str(audience["id"]), "nom": nom}
+
+async def travaux_to_responses(travaux: List[dict], lire: Lecteur) -> List[TravailResponse]:
+    """Réponses d'une liste de travaux: espaces, formateurs, promotions et étudiants lus par `$in`"""
+    espaces = {e["_id"]: e for e in await lire(espaces_collection).find(
+        {"_id": {"$in": list({t["espace_id"] for t in travaux})}}, {"nom_matiere": 1, "etudiants": 1}
+    ).to_list(None)}
+    formateurs = {f["_id"]: f for f in await lire(formateurs_collection).find(
+        {"_id": {"$in": list({t["formateur_id"] for t in travaux})}}, {"nom_complet": 1}
+    ).to_list(None)}
+    promotion_ids = {t["audience"]["id"] for t in travaux if (t.get("audience") or {}).get("type") == "promotion"}
+    promotions = {p["_id"]: p for p in await lire(promotions_collection).find(
+        {"_id": {"$in": list(promotion_ids)}}, {"nom": 1}
+    ).to_list(None)} if promotion_ids else {}
+    effectifs = await effectifs_promotions(promotion_ids, lire)
+    assignes = await resumes_assignes(travaux, lire)
 
     result = []
-
     for t in travaux:
-        espace = await espaces_collection.find_one({"_id": t["espace_id"]})
-        formateur = await formateurs_collection.find_one({"_id": t["formateur_id"]})
-
-        etudiants_data = []
-        for etudiant_id_obj in t["etudiants_assignes"]:
-            etudiant = await etudiants_collection.find_one({"_id": etudiant_id_obj})
-            if etudiant:
-                etudiants_data.append({
-                    "id": str(etudiant["_id"]),
-                    "nom_complet": etudiant["nom_complet"]
-                })
+        espace = espaces.get(t["espace_id"])
+        formateur = formateurs.get(t["formateur_id"])
+        audience = t.get("audience")
+        if audience and audience["type"] == "promotion":
+            audience_nom = promotions.get(audience["id"], {}).get("nom")
+        else:
+            audience_nom = espace["nom_matiere"] if espace else None
 
         result.append(TravailResponse(
             id=str(t["_id"]),
@@ -855,7 +1263,9 @@ async def list_travaux_by_etudiant(etudiant_id: str, current_user: dict = Depend
             date_fin=t["date_fin"],
             fichiers_urls=t.get("fichiers_urls", []),
             liens=t.get("liens", []),
-            etudiants_assignes=etudiants_data,
+            etudiants_assignes=assignes.get(t["_id"], []),
+            audience=audience_to_response(audience, audience_nom),
+            nombre_assignes=await nombre_assignes(t, lire, espace, effectifs),
             statut=t["statut"],
             created_at=t["created_at"]
         ))
@@ -873,11 +1283,34 @@ async def update_travail_dates(id: str, update: TravailUpdate, current_user: dic
 
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
 
+    dates_modifiees = "date_debut" in update_data or "date_fin" in update_data
+    if dates_modifiees:
+        date_debut = update_data.get("date_debut", travail["date_debut"])
+        date_fin = update_data.get("date_fin", travail["date_fin"])
+        if travail["statut"] in STATUTS_ECHEANCE:
+            update_data["statut"] = statut_par_dates(date_debut, date_fin)
+
+    if "titre" in update_data:
+        update_data["mots_cles"] = mots_cles_travail(update_data)
+
     if update_data:
-        await travaux_collection.update_one(
-            {"_id": ObjectId(id)},
-            {"$set": update_data}
-        )
+        # Liste de fichiers d'avant cette écriture précisément: seule la différence change les références
+        async with read_router.ecriture(current_user["user_id"]) as session:
+            avant = await travaux_collection.find_one_and_update(
+                {"_id": ObjectId(id)},
+                {"$set": update_data},
+                {"fichiers_urls": 1},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+        if not avant:
+            raise HTTPException(status_code=404, detail="Travail introuvable")
+        # Planifié seulement une fois les nouvelles dates enregistrées
+        if dates_modifiees:
+            deadline_scheduler.schedule(id, date_debut, date_fin)
+        if "fichiers_urls" in update_data:
+            await remplacer(avant.get("fichiers_urls", []), update_data["fichiers_urls"])
+        event_bus.notify("travaux", "update", {**travail, **update_data})
 
     return {"message": "Dates mises à jour avec succès"}
 
@@ -886,82 +1319,123 @@ async def delete_travail(id: str, current_user: dict = Depends(get_current_user)
     if current_user["user_type"] not in ["directeur", "formateur"]:
         raise HTTPException(status_code=403, detail="Accès non autorisé")
 
-    result = await travaux_collection.delete_one({"_id": ObjectId(id)})
-    if result.deleted_count == 0:
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        travail = await travaux_collection.find_one_and_delete(
+            {"_id": ObjectId(id)}, {"fichiers_urls": 1}, session=session
+        )
+    if not travail:
         raise HTTPException(status_code=404, detail="Travail introuvable")
 
+    deadline_scheduler.unschedule(id)
+    await detacher(travail.get("fichiers_urls", []))
     return {"message": "Travail supprimé avec succès"}
 
 # --- Livraisons ---
 
 @app.post("/api/travaux/{id}/livraisons", response_model=LivraisonResponse, status_code=201)
-async def submit_livraison(id: str, livraison: LivraisonCreate, current_user: dict = Depends(get_current_user)):
+async def submit_livraison(id: str, livraison: LivraisonCreate,
+                           idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+                           current_user: dict = Depends(get_current_user)):
     if current_user["user_type"] != "etudiant":
         raise HTTPException(status_code=403, detail="Seuls les étudiants peuvent soumettre")
 
-    travail = await travaux_collection.find_one({"_id": ObjectId(id)})
+    travail = await travaux_collection.find_one(
+        {"_id": ObjectId(id)},
+        {"etudiants_assignes": 1, "audience": 1, "statut": 1, "espace_id": 1, "formateur_id": 1, "titre": 1,
+         "date_debut": 1, "date_fin": 1}
+    )
     if not travail:
         raise HTTPException(status_code=404, detail="Travail introuvable")
 
-    if ObjectId(current_user["user_id"]) not in travail["etudiants_assignes"]:
+    if not await est_assigne(travail, ObjectId(current_user["user_id"])):
         raise HTTPException(status_code=403, detail="Vous n'êtes pas assigné à ce travail")
 
-    existing = await livraisons_collection.find_one({
-        "travail_id": ObjectId(id),
-        "etudiant_id": ObjectId(current_user["user_id"])
-    })
-    if existing:
-        raise HTTPException(status_code=400, detail="Vous avez déjà soumis ce travail")
-
+    # Upsert conditionnel: l'index unique (travail_id, etudiant_id) empêche tout doublon,
+    # et l'_id généré ici permet de savoir si le document vient d'être inséré
+    livraison_id = ObjectId()
     livraison_dict = {
-        "travail_id": ObjectId(id),
-        "etudiant_id": ObjectId(current_user["user_id"]),
-        "contenu": livraison.contenu,
+        "_id": livraison_id,
+        **preparer_contenu(livraison.contenu),
         "fichiers_urls": livraison.fichiers_urls,
         "liens": livraison.liens,
         "date_soumission": datetime.utcnow(),
-        "modifiable": False
+        "modifiable": False,
+        "idempotency_key": idempotency_key
     }
 
-    result = await livraisons_collection.insert_one(livraison_dict)
-
-    await travaux_collection.update_one(
-        {"_id": ObjectId(id)},
-        {"$set": {"statut": "livre"}}
-    )
+    # Session causale: l'étudiant revoit sa livraison tout de suite, même lue sur un secondaire
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        try:
+            doc = await livraisons_collection.find_one_and_update(
+                {"travail_id": ObjectId(id), "etudiant_id": ObjectId(current_user["user_id"])},
+                {"$setOnInsert": livraison_dict},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+        except DuplicateKeyError:
+            # Deux soumissions simultanées: l'autre a gagné la course
+            doc = await livraisons_collection.find_one(
+                {"travail_id": ObjectId(id), "etudiant_id": ObjectId(current_user["user_id"])},
+                session=session
+            )
+
+        if doc["_id"] != livraison_id:
+            if idempotency_key and doc.get("idempotency_key") == idempotency_key:
+                await charger_contenus([doc])
+                return livraison_to_response(doc, current_user["nom_complet"])
+            raise HTTPException(status_code=400, detail="Vous avez déjà soumis ce travail")
+        # Livraison créée par cette requête: seulement maintenant le texte est stocké à part
+        await enregistrer_contenus([livraison.contenu])
+        await attacher(doc.get("fichiers_urls", []))
+
+        statut = await travaux_collection.update_one(
+            {"_id": ObjectId(id), "statut": {"$ne": "livre"}},
+            {"$set": {"statut": "livre"}},
+            session=session
+        )
+    event_bus.notify("livraisons", "insert", doc)
+    if statut.modified_count:
+        event_bus.notify("travaux", "update", {**travail, "statut": "livre"})
 
-    return LivraisonResponse(
-        id=str(result.inserted_id),
-        travail_id=id,
-        etudiant_id=current_user["user_id"],
-        etudiant_nom=current_user["nom_complet"],
-        contenu=livraison.contenu,
-        fichiers_urls=livraison.fichiers_urls,
-        liens=livraison.liens,
-        date_soumission=datetime.utcnow(),
-        modifiable=False
-    )
+    await charger_contenus([doc])
+    return livraison_to_response(doc, current_user["nom_complet"])
 
 @app.get("/api/travaux/{id}/livraisons", response_model=List[LivraisonResponse])
-async def list_livraisons(id: str, current_user: dict = Depends(get_current_user)):
-    livraisons = await livraisons_collection.find({"travail_id": ObjectId(id)}).to_list(None)
-    result = []
+async def list_livraisons(id: str, current_user: dict = Depends(get_current_user),
+                          lire: Lecteur = Depends(lecture("list_livraisons"))):
+    livraisons = await charger_contenus(await livraisons_du_travail(id, lire), lire)
+    noms = await noms_etudiants(lire, [l["etudiant_id"] for l in livraisons])
+    return [livraison_to_response(l, noms.get(l["etudiant_id"])) for l in livraisons]
+
+@app.get("/api/travaux/{id}/livraisons/resume", response_model=List[LivraisonResumeResponse])
+async def list_livraisons_resume(id: str, current_user: dict = Depends(get_current_user),
+                                 lire: Lecteur = Depends(lecture("list_livraisons"))):
+    """Liste sans le contenu des livraisons (vue formateur)"""
+    livraisons = await livraisons_du_travail(id, lire, LIVRAISON_RESUME)
+    noms = await noms_etudiants(lire, [l["etudiant_id"] for l in livraisons])
+    return [livraison_to_resume(l, noms.get(l["etudiant_id"])) for l in livraisons]
+
+async def livraisons_du_travail(id: str, lire: Lecteur, projection: Optional[dict] = None) -> List[dict]:
+    query = {"travail_id": ObjectId(id)}
+    livraisons = await lire(livraisons_collection).find(query, projection).to_list(None)
+    travail = await lire(travaux_collection).find_one({"_id": ObjectId(id)}, {"livraisons_archivees": 1})
+    if travail is None or travail.get("livraisons_archivees"):
+        livraisons = await find_avec_archive("livraisons", query, projection, active_docs=livraisons)
+    return livraisons
+
+@app.get("/api/livraisons/{id}", response_model=LivraisonResponse)
+async def get_livraison(id: str, current_user: dict = Depends(get_current_user)):
+    livraison = await find_one_avec_archive("livraisons", {"_id": ObjectId(id)})
+    if not livraison:
+        raise HTTPException(status_code=404, detail="Livraison introuvable")
 
-    for l in livraisons:
-        etudiant = await etudiants_collection.find_one({"_id": l["etudiant_id"]})
-        result.append(LivraisonResponse(
-            id=str(l["_id"]),
-            travail_id=str(l["travail_id"]),
-            etudiant_id=str(l["etudiant_id"]),
-            etudiant_nom=etudiant["nom_complet"] if etudiant else None,
-            contenu=l.get("contenu"),
-            fichiers_urls=l.get("fichiers_urls", []),
-            liens=l.get("liens", []),
-            date_soumission=l["date_soumission"],
-            modifiable=l.get("modifiable", False)
-        ))
+    if current_user["user_type"] == "etudiant" and str(livraison["etudiant_id"]) != current_user["user_id"]:
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
 
-    return result
+    await charger_contenus([livraison])
+    etudiant = await etudiants_collection.find_one({"_id": livraison["etudiant_id"]}, {"nom_complet": 1})
+    return livraison_to_response(livraison, etudiant["nom_complet"] if etudiant else None)
 
 # --- Évaluations ---
 
@@ -989,17 +1463,23 @@ async def create_evaluation(evaluation: EvaluationCreate, current_user: dict = D
         "note": evaluation.note,
         "commentaire": evaluation.commentaire,
         "date_evaluation": datetime.utcnow(),
-        "historique_modifications": []
+        "nombre_modifications": 0
     }
 
-    result = await evaluations_collection.insert_one(eval_dict)
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        result = await evaluations_collection.insert_one(eval_dict, session=session)
 
-    await travaux_collection.update_one(
-        {"_id": livraison["travail_id"]},
-        {"$set": {"statut": "evalue"}}
-    )
+        await travaux_collection.update_one(
+            {"_id": livraison["travail_id"]},
+            {"$set": {"statut": "evalue"}},
+            session=session
+        )
+    await evaluations_modifiees()
 
     travail = await travaux_collection.find_one({"_id": livraison["travail_id"]})
+    event_bus.notify("evaluations", "insert", eval_dict)
+    if travail:
+        event_bus.notify("travaux", "update", travail)
     etudiant = await etudiants_collection.find_one({"_id": livraison["etudiant_id"]})
 
     return EvaluationResponse(
@@ -1014,7 +1494,134 @@ async def create_evaluation(evaluation: EvaluationCreate, current_user: dict = D
         note=evaluation.note,
         commentaire=evaluation.commentaire,
         date_evaluation=datetime.utcnow(),
-        historique_modifications=[]
+        nombre_modifications=0
+    )
+
+@app.post("/api/evaluations/batch", response_model=EvaluationBatchResponse)
+async def create_evaluations_batch(batch: EvaluationBatchCreate, current_user: dict = Depends(get_current_user)):
+    if current_user["user_type"] != "formateur":
+        raise HTTPException(status_code=403, detail="Seuls les formateurs peuvent évaluer")
+
+    if len(batch.evaluations) > 500:
+        raise HTTPException(status_code=400, detail="500 évaluations maximum par lot")
+
+    # Identifiants normalisés: deux écritures d'un même ObjectId sont la même livraison
+    cles = []
+    seen = set()
+    resultats = {}
+    valides = []
+    for row in batch.evaluations:
+        try:
+            cle = str(ObjectId(row.livraison_id))
+        except InvalidId:
+            cles.append(None)
+            continue
+        cles.append(cle)
+        # Seule la première occurrence d'une livraison est traitée
+        if cle in seen:
+            continue
+        seen.add(cle)
+        if row.note < 0 or row.note > 20:
+            resultats[cle] = EvaluationBatchResultat(
+                livraison_id=cle, succes=False, erreur="La note doit être entre 0 et 20"
+            )
+        else:
+            valides.append((cle, row))
+
+    livraison_ids = [ObjectId(cle) for cle, _ in valides]
+    livraisons = {
+        str(l["_id"]): l
+        for l in await livraisons_collection.find(
+            {"_id": {"$in": livraison_ids}}, {"travail_id": 1, "etudiant_id": 1}
+        ).to_list(None)
+    }
+    deja_evaluees = {
+        str(e["livraison_id"])
+        for e in await evaluations_collection.find(
+            {"livraison_id": {"$in": livraison_ids}}, {"livraison_id": 1}
+        ).to_list(None)
+    }
+
+    now = datetime.utcnow()
+    operations = []
+    documents = []
+    for cle, row in valides:
+        livraison = livraisons.get(cle)
+        if not livraison:
+            erreur = "Livraison introuvable"
+        elif cle in deja_evaluees:
+            erreur = "Cette livraison a déjà été évaluée"
+        else:
+            doc = {
+                "_id": ObjectId(),
+                "livraison_id": livraison["_id"],
+                "travail_id": livraison["travail_id"],
+                "etudiant_id": livraison["etudiant_id"],
+                "formateur_id": ObjectId(current_user["user_id"]),
+                "note": row.note,
+                "commentaire": row.commentaire,
+                "date_evaluation": now,
+                "nombre_modifications": 0
+            }
+            operations.append(InsertOne(doc))
+            documents.append(doc)
+            continue
+        resultats[cle] = EvaluationBatchResultat(livraison_id=cle, succes=False, erreur=erreur)
+
+    echecs = {}
+    crees = []
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        if operations:
+            try:
+                await evaluations_collection.bulk_write(operations, ordered=False, session=session)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    echecs[error["index"]] = (
+                        "Cette livraison a déjà été évaluée" if error.get("code") == 11000 else error.get("errmsg")
+                    )
+
+        for index, doc in enumerate(documents):
+            livraison_id = str(doc["livraison_id"])
+            if index in echecs:
+                resultats[livraison_id] = EvaluationBatchResultat(
+                    livraison_id=livraison_id, succes=False, erreur=echecs[index]
+                )
+            else:
+                crees.append(doc)
+                resultats[livraison_id] = EvaluationBatchResultat(
+                    livraison_id=livraison_id, succes=True, evaluation_id=str(doc["_id"])
+                )
+
+        if crees:
+            await travaux_collection.update_many(
+                {"_id": {"$in": list({doc["travail_id"] for doc in crees})}},
+                {"$set": {"statut": "evalue"}},
+                session=session
+            )
+    if crees:
+        await evaluations_modifiees()
+    for doc in crees:
+        event_bus.notify("evaluations", "insert", doc)
+
+    final = []
+    rendus = set()
+    for row, cle in zip(batch.evaluations, cles):
+        if cle is None:
+            final.append(EvaluationBatchResultat(
+                livraison_id=row.livraison_id, succes=False, erreur="Identifiant invalide"
+            ))
+        elif cle in rendus:
+            final.append(EvaluationBatchResultat(
+                livraison_id=row.livraison_id, succes=False, erreur="Livraison en double dans le lot"
+            ))
+        else:
+            rendus.add(cle)
+            final.append(resultats[cle])
+
+    return EvaluationBatchResponse(
+        resultats=final,
+        nombre_crees=len(crees),
+        nombre_erreurs=len(final) - len(crees)
     )
 
 @app.put("/api/evaluations/{id}", response_model=EvaluationResponse)
@@ -1022,57 +1629,103 @@ async def update_evaluation(id: str, update: EvaluationUpdate, current_user: dic
     if current_user["user_type"] != "directeur":
         raise HTTPException(status_code=403, detail="Seul le directeur peut modifier une évaluation")
 
-    evaluation = await evaluations_collection.find_one({"_id": ObjectId(id)})
+    # L'historique vit dans evaluation_audit: le document d'évaluation garde une taille fixe
+    async with read_router.ecriture(current_user["user_id"]) as session:
+        evaluation = await evaluations_collection.find_one_and_update(
+            {"_id": ObjectId(id)},
+            {
+                "$set": {"note": update.note, "commentaire": update.commentaire},
+                "$inc": {"nombre_modifications": 1}
+            },
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if not evaluation:
+            if await evaluations_archive_collection.find_one({"_id": ObjectId(id)}, {"_id": 1}):
+                raise HTTPException(status_code=400, detail="Évaluation archivée: modification impossible")
+            raise HTTPException(status_code=404, detail="Évaluation introuvable")
+
+        await evaluation_audit_collection.insert_one({
+            "evaluation_id": evaluation["_id"],
+            "ancienne_note": evaluation["note"],
+            "nouvelle_note": update.note,
+            "ancien_commentaire": evaluation.get("commentaire"),
+            "nouveau_commentaire": update.commentaire,
+            "raison": update.raison_modification,
+            "modifie_par": current_user["user_id"],
+            "date_modification": datetime.utcnow()
+        }, session=session)
+    await evaluations_modifiees()
+
+    updated = {
+        **evaluation,
+        "note": update.note,
+        "commentaire": update.commentaire,
+        "nombre_modifications": evaluation.get("nombre_modifications", 0) + 1
+    }
+    event_bus.notify("evaluations", "update", updated)
+    return await evaluation_to_response(updated)
+
+@app.get("/api/evaluations/{id}", response_model=EvaluationResponse)
+async def get_evaluation(id: str, current_user: dict = Depends(get_current_user)):
+    evaluation = await find_one_avec_archive("evaluations", {"_id": ObjectId(id)})
     if not evaluation:
         raise HTTPException(status_code=404, detail="Évaluation introuvable")
 
-    historique_entry = {
-        "ancienne_note": evaluation["note"],
-        "nouvelle_note": update.note,
-        "raison": update.raison_modification,
-        "modifie_par": current_user["user_id"],
-        "date_modification": datetime.utcnow().isoformat()
-    }
+    if current_user["user_type"] == "etudiant" and str(evaluation["etudiant_id"]) != current_user["user_id"]:
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
 
-    await evaluations_collection.update_one(
-        {"_id": ObjectId(id)},
-        {
-            "$set": {"note": update.note, "commentaire": update.commentaire},
-            "$push": {"historique_modifications": historique_entry}
-        }
+    return await evaluation_to_response(evaluation)
+
+@app.get("/api/evaluations/{id}/historique", response_model=HistoriqueEvaluationResponse)
+async def get_evaluation_historique(id: str, skip: int = 0, limit: int = 20,
+                                    current_user: dict = Depends(get_current_user)):
+    audit = evaluation_audit_collection
+    evaluation = await evaluations_collection.find_one(
+        {"_id": ObjectId(id)}, {"etudiant_id": 1, "nombre_modifications": 1}
     )
+    if not evaluation:
+        evaluation = await evaluations_archive_collection.find_one(
+            {"_id": ObjectId(id)}, {"etudiant_id": 1, "nombre_modifications": 1}
+        )
+        audit = evaluation_audit_archive_collection
+    if not evaluation:
+        raise HTTPException(status_code=404, detail="Évaluation introuvable")
 
-    updated = await evaluations_collection.find_one({"_id": ObjectId(id)})
-    travail = await travaux_collection.find_one({"_id": updated["travail_id"]})
-    etudiant = await etudiants_collection.find_one({"_id": updated["etudiant_id"]})
-    formateur = await formateurs_collection.find_one({"_id": updated["formateur_id"]})
+    if current_user["user_type"] == "etudiant" and str(evaluation["etudiant_id"]) != current_user["user_id"]:
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
 
-    return EvaluationResponse(
-        id=str(updated["_id"]),
-        livraison_id=str(updated["livraison_id"]),
-        travail_id=str(updated["travail_id"]),
-        travail_titre=travail["titre"] if travail else None,
-        etudiant_id=str(updated["etudiant_id"]),
-        etudiant_nom=etudiant["nom_complet"] if etudiant else None,
-        formateur_id=str(updated["formateur_id"]),
-        formateur_nom=formateur["nom_complet"] if formateur else None,
-        note=updated["note"],
-        commentaire=updated.get("commentaire"),
-        date_evaluation=updated["date_evaluation"],
-        historique_modifications=updated.get("historique_modifications", [])
+    limit = max(1, min(limit, 100))
+    entries = await audit.find(
+        {"evaluation_id": ObjectId(id)}
+    ).sort("date_modification", -1).skip(max(skip, 0)).limit(limit).to_list(None)
+
+    return HistoriqueEvaluationResponse(
+        evaluation_id=id,
+        total=evaluation.get("nombre_modifications", 0),
+        skip=skip,
+        limit=limit,
+        modifications=[historique_to_response(h) for h in entries]
     )
 
 @app.get("/api/notes/etudiant/{id}", response_model=NoteEtudiantResponse)
-async def get_notes_etudiant(id: str, current_user: dict = Depends(get_current_user)):
-    evaluations = await evaluations_collection.find({"etudiant_id": ObjectId(id)}).to_list(None)
+async def get_notes_etudiant(id: str, current_user: dict = Depends(get_current_user),
+                             lire: Lecteur = Depends(lecture("notes_etudiant"))):
+    evaluations = await lire(evaluations_collection).find({"etudiant_id": ObjectId(id)}).to_list(None)
+    etudiant = await lire(etudiants_collection).find_one({"_id": ObjectId(id)})
+    archive = etudiant_archive(etudiant)
+    if archive:
+        evaluations = await find_avec_archive("evaluations", {"etudiant_id": ObjectId(id)}, active_docs=evaluations)
 
     notes_par_matiere = {}
     for eval in evaluations:
-        travail = await travaux_collection.find_one({"_id": eval["travail_id"]})
+        travail = await lire(travaux_collection).find_one({"_id": eval["travail_id"]})
+        if not travail and archive:
+            travail = await find_one_avec_archive("travaux", {"_id": eval["travail_id"]})
         if not travail:
             continue
 
-        espace = await espaces_collection.find_one({"_id": travail["espace_id"]})
+        espace = await lire(espaces_collection).find_one({"_id": travail["espace_id"]})
         if not espace:
             continue
 
@@ -1099,8 +1752,6 @@ async def get_notes_etudiant(id: str, current_user: dict = Depends(get_current_u
         total_weighted += moyenne * data["coefficient"]
         total_coef += data["coefficient"]
 
-    etudiant = await etudiants_collection.find_one({"_id": ObjectId(id)})
-
     return NoteEtudiantResponse(
         etudiant_id=id,
         nom_complet=etudiant["nom_complet"] if etudiant else "",
@@ -1109,15 +1760,21 @@ async def get_notes_etudiant(id: str, current_user: dict = Depends(get_current_u
     )
 
 @app.get("/api/notes/espace/{id}", response_model=StatistiquesEspace)
-async def get_statistiques_espace(id: str, current_user: dict = Depends(get_current_user)):
-    espace = await espaces_collection.find_one({"_id": ObjectId(id)})
+async def get_statistiques_espace(id: str, current_user: dict = Depends(get_current_user),
+                                  lire: Lecteur = Depends(lecture("statistiques_espace"))):
+    return await singleflight.executer(
+        "statistiques_espace", id, current_user, lire, lambda: statistiques_de_espace(id, lire)
+    )
+
+async def statistiques_de_espace(id: str, lire: Lecteur) -> StatistiquesEspace:
+    espace = await lire(espaces_collection).find_one({"_id": ObjectId(id)})
     if not espace:
         raise HTTPException(status_code=404, detail="Espace pédagogique introuvable")
 
-    travaux = await travaux_collection.find({"espace_id": ObjectId(id)}).to_list(None)
+    travaux = await lire(travaux_collection).find({"espace_id": ObjectId(id)}).to_list(None)
     travaux_ids = [t["_id"] for t in travaux]
 
-    evaluations = await evaluations_collection.find({"travail_id": {"$in": travaux_ids}}).to_list(None)
+    evaluations = await lire(evaluations_collection).find({"travail_id": {"$in": travaux_ids}}).to_list(None)
 
     if not evaluations:
         return StatistiquesEspace(
@@ -1140,78 +1797,223 @@ async def get_statistiques_espace(id: str, current_user: dict = Depends(get_curr
         nombre_evalues=len(evaluations)
     )
 
+@app.get("/api/analytique/espace/{id}", response_model=AnalytiqueEspaceResponse)
+async def get_analytique_espace(id: str, current_user: dict = Depends(get_current_user),
+                                lire: Lecteur = Depends(lecture("analytique"))):
+    if current_user["user_type"] not in ("directeur", "formateur"):
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+
+    espace = await lire(espaces_collection).find_one({"_id": ObjectId(id)}, {"nom_matiere": 1})
+    if not espace:
+        raise HTTPException(status_code=404, detail="Espace pédagogique introuvable")
+
+    return await analyse_espace(espace, lire)
+
+@app.get("/api/analytique/promotion/{id}", response_model=AnalytiquePromotionResponse)
+async def get_analytique_promotion(id: str, current_user: dict = Depends(get_current_user),
+                                   lire: Lecteur = Depends(lecture("analytique"))):
+    if current_user["user_type"] not in ("directeur", "formateur"):
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+
+    promotion = await lire(promotions_collection).find_one({"_id": ObjectId(id)}, {"nom": 1, "archivee": 1})
+    if not promotion:
+        raise HTTPException(status_code=404, detail="Promotion introuvable")
+
+    return await analyse_promotion(promotion, lire)
+
 # --- Utilitaires & Autres ---
 
+def fichier_to_response(fichier: dict, filename: Optional[str], deduplique: bool) -> dict:
+    return {
+        "url": fichier["url"],
+        "filename": filename or fichier.get("nom_origine"),
+        "sha256": fichier["_id"],
+        "taille": fichier.get("taille"),
+        "deduplique": deduplique
+    }
+
+@app.post("/api/upload/existant")
+async def upload_existant(request: FichierExistantRequest, current_user: dict = Depends(get_current_user)):
+    """Le client annonce l'empreinte avant l'envoi: s'il a déjà envoyé ce contenu, rien à transférer"""
+    fichier = await retrouver_annonce(request.sha256, current_user["user_id"])
+    if not fichier:
+        raise HTTPException(status_code=404, detail="Contenu inconnu: envoyez le fichier")
+    return fichier_to_response(fichier, request.filename, True)
+
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
-    print("\n--- UPLOAD VIA HTTPX ---")
-    print(f"User: {current_user.get('user_id')}")
-    print(f"File: {file.filename}")
-    
-    if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
-        raise HTTPException(status_code=500, detail="Config Supabase manquante")
-    
+    if not stockage_configure():
+        raise HTTPException(status_code=500, detail="Config stockage manquante")
+
+    empreinte, taille = await hacher(file)
+    fichier = await retrouver(empreinte, current_user["user_id"])
+    if fichier:
+        return fichier_to_response(fichier, file.filename, True)
+
+    try:
+        fichier = await stocker(file, empreinte, taille, current_user["user_id"])
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    if not fichier:
+        raise HTTPException(status_code=503, detail="Fichier en cours de suppression, réessayez")
+
+    return fichier_to_response(fichier, file.filename, False)
+
+@app.post("/api/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...), current_user: dict = Depends(get_current_user)):
+    """Envoi simultané de plusieurs fichiers (bornés par UPLOAD_CONCURRENCY): résultat ou erreur par fichier"""
+    if not stockage_configure():
+        raise HTTPException(status_code=500, detail="Config stockage manquante")
+    if len(files) > MAX_FICHIERS_LOT:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_FICHIERS_LOT} fichiers par envoi")
+
+    async def envoyer(file: UploadFile) -> dict:
+        try:
+            resultat = await televerser(file, current_user["user_id"])
+        except Exception as e:
+            traceback.print_exc()
+            return {"filename": file.filename, "erreur": str(e)}
+        return fichier_to_response(resultat["fichier"], file.filename, resultat["deduplique"])
+
+    return {"fichiers": await asyncio.gather(*(envoyer(f) for f in files))}
+
+@app.post("/api/upload/signer")
+async def upload_signer(request: EnvoiSigneRequest, current_user: dict = Depends(get_current_user)):
+    """URL signée pour déposer un fichier directement dans le stockage, sans passer par l'API"""
+    if not stockage_configure():
+        raise HTTPException(status_code=500, detail="Config stockage manquante")
+    # Les petits fichiers passent par /api/upload: stockés par empreinte, donc dédupliqués
+    if request.taille < DIRECT_UPLOAD_MIN_BYTES:
+        raise HTTPException(status_code=400, detail="Fichier trop petit pour l'envoi direct: utilisez /api/upload")
     try:
-        import httpx
-        
-        content = await file.read()
-        ext = file.filename.split(".")[-1] if "." in file.filename else ""
-        unique_name = f"{uuid.uuid4()}.{ext}" if ext else str(uuid.uuid4())
-        path = f"{current_user['user_id']}/{unique_name}"
-        
-        print(f"Size: {len(content)} bytes")
-        print(f"Path: {path}")
-        
-        upload_url = f"{SUPABASE_URL}/storage/v1/object/travaux/{path}"
-        
-        headers = {
-            "Authorization": f"Bearer {SUPABASE_SERVICE_KEY}",
-            "Content-Type": file.content_type or "application/octet-stream"
-        }
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(upload_url, content=content, headers=headers)
-            
-            if response.status_code not in [200, 201]:
-                print(f"Error {response.status_code}: {response.text}")
-                raise HTTPException(status_code=response.status_code, detail=response.text)
-        
-        public_url = f"{SUPABASE_URL}/storage/v1/object/public/travaux/{path}"
-        print(f" Success: {public_url}")
-        
-        return {"url": public_url, "filename": file.filename}
-        
+        return await signer_envoi(current_user["user_id"], request.filename, request.content_type)
     except Exception as e:
-        print(f" Error: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
-        
+
+@app.post("/api/upload/termine")
+async def upload_termine(request: EnvoiTermineRequest, current_user: dict = Depends(get_current_user)):
+    """Confirme un envoi direct: l'objet doit être présent dans le stockage"""
+    televersement = await televersements_collection.find_one(
+        {"_id": request.id, "user_id": current_user["user_id"]}
+    )
+    if not televersement:
+        raise HTTPException(status_code=404, detail="Envoi introuvable")
+    if televersement["statut"] != "termine" and televersement["expire_le"] < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Envoi expiré, recommencez")
+
+    try:
+        televersement = await terminer_envoi(televersement)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+    if not televersement:
+        raise HTTPException(status_code=409, detail="Fichier non reçu par le stockage")
+
+    return {
+        "url": televersement["url"],
+        "filename": televersement.get("nom_origine"),
+        "sha256": None,
+        "taille": televersement["taille"],
+        "deduplique": False
+    }
+
+@app.get("/api/search", response_model=SearchResponse)
+async def search_all(q: str, types: Optional[str] = None, skip: int = 0, limit: int = 20,
+                     current_user: dict = Depends(get_current_user)):
+    limit = max(1, min(limit, 100))
+    type_list = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    return await search(q, current_user, type_list, max(skip, 0), limit)
+
+@app.post("/api/jobs", response_model=JobResponse, status_code=202)
+async def create_job(job: JobCreate, current_user: dict = Depends(get_current_user)):
+    if current_user["user_type"] != "directeur":
+        raise HTTPException(status_code=403, detail="Accès réservé au directeur")
+
+    if not is_registered(job.type):
+        raise HTTPException(status_code=400, detail="Type de tâche inconnu")
+
+    created = await submit_job(job.type, job.payload, cree_par=current_user["user_id"])
+    return job_to_response(created)
+
+@app.get("/api/jobs/{id}", response_model=JobResponse)
+async def get_job_status(id: str, current_user: dict = Depends(get_current_user)):
+    job = await get_job(id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tâche introuvable")
+
+    if current_user["user_type"] != "directeur" and job.get("cree_par") != current_user["user_id"]:
+        raise HTTPException(status_code=403, detail="Accès non autorisé")
+
+    return job_to_response(job)
+
+@app.get("/api/jobs/{id}/identifiants")
+async def get_job_identifiants(id: str, current_user: dict = Depends(get_current_user)):
+    """Mots de passe régénérés par `relance_comptes`: remis une seule fois, puis supprimés"""
+    if current_user["user_type"] != "directeur":
+        raise HTTPException(status_code=403, detail="Accès réservé au directeur")
+
+    job = await get_job(id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tâche introuvable")
+    if job["statut"] not in ("termine", "echoue"):
+        raise HTTPException(status_code=409, detail="Tâche en cours")
+
+    doc = await identifiants_relance_collection.find_one_and_delete({"_id": job["_id"]})
+    if not doc:
+        raise HTTPException(status_code=410, detail="Identifiants déjà remis ou expirés")
+    return {"identifiants": doc["identifiants"]}
+
+@app.post("/api/events/ticket")
+async def create_events_ticket(current_user: dict = Depends(get_current_user)):
+    """Ticket à usage unique pour ouvrir /api/events avec EventSource"""
+    return {"ticket": await emettre_ticket(current_user), "expires_in": TICKET_SECONDES}
+
+@app.get("/api/events")
+async def stream_events(current_user: dict = Depends(get_current_user_sse)):
+    subscriber = await event_bus.subscribe(current_user)
+
+    async def event_stream():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            event_bus.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/api/users/{id}/relance")
 async def relance_compte(id: str, current_user: dict = Depends(get_current_user)):
     if current_user["user_type"] != "directeur":
         raise HTTPException(status_code=403, detail="Accès réservé au directeur")
 
-    user = await formateurs_collection.find_one({"_id": ObjectId(id)})
-    user_type = "formateur"
+    user = await find_by_user_id(id)
 
-    if not user:
-        user = await etudiants_collection.find_one({"_id": ObjectId(id)})
-        user_type = "etudiant"
-
-    if not user:
+    if not user or user["user_type"] not in ("formateur", "etudiant"):
         raise HTTPException(status_code=404, detail="Utilisateur introuvable")
 
     if user.get("compte_active"):
         raise HTTPException(status_code=400, detail="Ce compte est déjà activé")
 
     new_password = generate_password(8)
-    collection = formateurs_collection if user_type == "formateur" else etudiants_collection
+    hashed = hash_password(new_password)
 
-    await collection.update_one(
+    await USER_COLLECTIONS[user["user_type"]].update_one(
         {"_id": ObjectId(id)},
-        {"$set": {"mot_de_passe": hash_password(new_password)}}
+        {"$set": {"mot_de_passe": hashed}}
     )
+    await update_identity(id, {"mot_de_passe": hashed})
 
     return {
         "message": "Identifiants régénérés",
@@ -1219,6 +2021,30 @@ async def relance_compte(id: str, current_user: dict = Depends(get_current_user)
         "nouveau_mot_de_passe": new_password
     }
 
+@app.get("/api/admission")
+async def get_admission(current_user: dict = Depends(get_current_user)):
+    """Files d'attente et rejets du contrôle d'admission (worker courant)"""
+    if current_user["user_type"] != "directeur":
+        raise HTTPException(status_code=403, detail="Accès réservé au directeur")
+    return admission_control.etat()
+
+@app.get("/api/coalescence")
+async def get_coalescence(current_user: dict = Depends(get_current_user)):
+    """Calculs partagés entre requêtes identiques simultanées (worker courant)"""
+    if current_user["user_type"] != "directeur":
+        raise HTTPException(status_code=403, detail="Accès réservé au directeur")
+    return singleflight.etat()
+
+@app.get("/health/live")
+async def health_live():
+    return sante.vivant()
+
+@app.get("/health/ready")
+async def health_ready():
+    """503 si MongoDB ne répond pas ou si l'instance est saturée (voir sante.py)"""
+    code, rapport = await sante.pret()
+    return JSONResponse(rapport, status_code=code)
+
 @app.get("/")
 async def root():
     return {"message": "Gestion Pédagogique API"}
\ No newline at end of file
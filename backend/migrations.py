@@ -0,0 +1,199 @@
+"""
+Migrations de schéma versionnées
+- Chaque migration (voir evolutions.py) transforme les documents d'une collection:
+  `transform(doc)` retourne la mise à jour à appliquer, ou None si le document est déjà bon
+- État enregistré dans la collection `migrations` (une entrée par version)
+- Parcours par curseur dans l'ordre des _id, écritures groupées en bulk_write par lot,
+  point de reprise après chaque lot: une exécution interrompue reprend où elle s'est arrêtée
+- `prealable(docs)` (optionnel) reçoit les documents modifiés d'un lot juste avant leur écriture,
+  pour les écritures dans d'autres collections dont dépend la mise à jour
+- --dry-run: compte les documents à modifier sans rien écrire
+
+Usage: python migrations.py [--dry-run] [--jusqua VERSION] [--batch-size 500] [--liste]
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from database import database, migrations_collection
+
+BATCH_SIZE = 500
+
+Rapport = Optional[Callable[[str, float], Awaitable[None]]]
+Prealable = Optional[Callable[[List[dict]], Awaitable[None]]]
+
+
+class Migration:
+    def __init__(self, version: str, collection: str, transform: Callable[[dict], Optional[dict]],
+                 query: dict, description: str, prealable: Prealable = None):
+        self.version = version
+        self.collection = collection
+        self.transform = transform
+        self.query = query
+        self.description = description
+        self.prealable = prealable
+
+
+_MIGRATIONS: Dict[str, Migration] = {}
+
+
+def migration(version: str, collection: str, query: Optional[dict] = None, prealable: Prealable = None):
+    """Décorateur: enregistre `transform(doc) -> mise à jour | None` sous ce numéro de version"""
+    def decorator(fn):
+        if version in _MIGRATIONS:
+            raise ValueError(f"Version de migration en double: {version}")
+        _MIGRATIONS[version] = Migration(version, collection, fn, query or {}, (fn.__doc__ or "").strip(),
+                                         prealable)
+        return fn
+    return decorator
+
+
+def migrations_connues():
+    return [_MIGRATIONS[v] for v in sorted(_MIGRATIONS)]
+
+
+def get_migration(version: str) -> Migration:
+    return _MIGRATIONS[version]
+
+
+def _format_duree(secondes: float) -> str:
+    secondes = int(secondes)
+    if secondes >= 3600:
+        return f"{secondes // 3600}h{secondes % 3600 // 60:02d}"
+    if secondes >= 60:
+        return f"{secondes // 60}min{secondes % 60:02d}"
+    return f"{secondes}s"
+
+
+async def executer(m: Migration, dry_run: bool = False, batch_size: int = BATCH_SIZE,
+                   rapport: Rapport = None, forcer: bool = False) -> dict:
+    """`forcer`: repasse sur toute la collection, même si la migration est déjà terminée"""
+    etat = await migrations_collection.find_one({"_id": m.version}) or {}
+    if forcer and etat.get("statut") == "terminee":
+        etat = {}
+        if not dry_run:
+            await migrations_collection.update_one(
+                {"_id": m.version}, {"$set": {"traites": 0, "modifies": 0}, "$unset": {"curseur": ""}}
+            )
+    if etat.get("statut") == "terminee":
+        return {"version": m.version, "statut": "deja_appliquee", "traites": 0, "modifies": 0}
+
+    collection = database[m.collection]
+    query = m.query
+    if etat.get("curseur") is not None:
+        query = {"$and": [m.query, {"_id": {"$gt": etat["curseur"]}}]}
+    restant = await collection.count_documents(query)
+
+    if not dry_run:
+        await migrations_collection.update_one(
+            {"_id": m.version},
+            {"$set": {"statut": "en_cours", "collection": m.collection, "description": m.description},
+             "$setOnInsert": {"debut": datetime.utcnow(), "traites": 0, "modifies": 0}},
+            upsert=True
+        )
+
+    traites = modifies = 0
+    lot = []
+    docs_lot = []
+    dernier = None
+    debut = time.monotonic()
+
+    async def flush(nombre: int):
+        nonlocal lot, docs_lot, modifies
+        if not dry_run:
+            if lot and m.prealable:
+                await m.prealable(docs_lot)
+            if lot:
+                await collection.bulk_write(lot, ordered=False)
+            await migrations_collection.update_one(
+                {"_id": m.version},
+                {"$set": {"curseur": dernier}, "$inc": {"traites": nombre, "modifies": len(lot)}}
+            )
+        modifies += len(lot)
+        lot = []
+        docs_lot = []
+
+        if rapport and restant:
+            ecoule = time.monotonic() - debut
+            debit = traites / ecoule if ecoule > 0 else 0.0
+            eta = (restant - traites) / debit if debit else 0.0
+            await rapport(
+                f"{m.version}: {traites}/{restant} documents, {debit:.0f} doc/s, "
+                f"fin estimée dans {_format_duree(eta)}",
+                100 * traites / restant
+            )
+
+    traites_lot = 0
+    async for doc in collection.find(query).sort("_id", 1).batch_size(batch_size):
+        update = m.transform(doc)
+        if update:
+            lot.append(UpdateOne({"_id": doc["_id"]}, update))
+            docs_lot.append(doc)
+        dernier = doc["_id"]
+        traites += 1
+        traites_lot += 1
+        if traites_lot >= batch_size:
+            await flush(traites_lot)
+            traites_lot = 0
+
+    if traites_lot:
+        await flush(traites_lot)
+
+    duree = time.monotonic() - debut
+    if not dry_run:
+        await migrations_collection.update_one(
+            {"_id": m.version},
+            {"$set": {"statut": "terminee", "fin": datetime.utcnow()}, "$inc": {"duree_secondes": round(duree, 3)}}
+        )
+    return {"version": m.version, "statut": "simulee" if dry_run else "terminee",
+            "traites": traites, "modifies": modifies, "duree_secondes": round(duree, 3)}
+
+
+async def executer_toutes(dry_run: bool = False, jusqua: Optional[str] = None,
+                          batch_size: int = BATCH_SIZE, rapport: Rapport = None) -> list:
+    """Exécute dans l'ordre les migrations pas encore terminées"""
+    resultats = []
+    for m in migrations_connues():
+        if jusqua and m.version > jusqua:
+            break
+        resultats.append(await executer(m, dry_run, batch_size, rapport))
+    return resultats
+
+
+async def main():
+    import evolutions  # noqa: F401 (enregistre les migrations)
+
+    parser = argparse.ArgumentParser(description="Migrations de schéma")
+    parser.add_argument("--dry-run", action="store_true", help="Compter sans écrire")
+    parser.add_argument("--jusqua", help="Dernière version à appliquer")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--liste", action="store_true", help="Afficher l'état des migrations")
+    args = parser.parse_args()
+
+    if args.liste:
+        etats = {e["_id"]: e async for e in migrations_collection.find()}
+        for m in migrations_connues():
+            etat = etats.get(m.version, {})
+            print(f"{m.version:<40}{etat.get('statut', 'en_attente'):<12}{m.description}")
+        return
+
+    async def afficher(message: str, progression: float):
+        print(f"   ⏳ {message}")
+
+    if args.dry_run:
+        print("🔍 Simulation: aucune écriture")
+    for r in await executer_toutes(args.dry_run, args.jusqua, args.batch_size, afficher):
+        if r["statut"] == "deja_appliquee":
+            print(f"✅ {r['version']}: déjà appliquée")
+        else:
+            verbe = "à modifier" if args.dry_run else "modifiés"
+            print(f"✅ {r['version']}: {r['traites']} analysés, {r['modifies']} {verbe} "
+                  f"en {_format_duree(r['duree_secondes'])}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
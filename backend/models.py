@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -6,9 +6,17 @@ class LoginRequest(BaseModel):
     email: EmailStr
     mot_de_passe: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 class TokenResponse(BaseModel):
     access_token: str
+    refresh_token: Optional[str] = None
     token_type: str = "bearer"
+    expires_in: Optional[int] = None
     user_type: str
     user_id: str
     nom_complet: str
@@ -131,6 +139,10 @@ class EspacePedagogiqueResponse(BaseModel):
     promotions: List[dict] = []
     etudiants: List[dict] = []
 
+class AudienceTravail(BaseModel):
+    type: str = Field(pattern=r"^(promotion|espace)$")
+    id: Optional[str] = None  # promotion_id; pour "espace", l'espace du travail
+
 class TravailCreate(BaseModel):
     titre: str
     consignes: str
@@ -140,7 +152,8 @@ class TravailCreate(BaseModel):
     date_fin: datetime
     fichiers_urls: List[str] = []
     liens: List[str] = []
-    etudiants_assignes: List[str]
+    etudiants_assignes: List[str] = []
+    audience: Optional[AudienceTravail] = None
 
 class TravailUpdate(BaseModel):
     titre: Optional[str] = None
@@ -164,9 +177,28 @@ class TravailResponse(BaseModel):
     fichiers_urls: List[str] = []
     liens: List[str] = []
     etudiants_assignes: List[dict] = []
+    audience: Optional[dict] = None
+    nombre_assignes: int = 0
     statut: str
     created_at: datetime
 
+class EcheanceResponse(BaseModel):
+    travail_id: str
+    titre: str
+    type_travail: str
+    espace_id: str
+    espace_nom: Optional[str] = None
+    date_debut: datetime
+    date_fin: datetime
+    soumission: str  # a_rendre, livre, evalue
+    livraison_id: Optional[str] = None
+    date_soumission: Optional[datetime] = None
+    note: Optional[float] = None
+
+class EcheancesResponse(BaseModel):
+    echeances: List[EcheanceResponse]
+    suivant: Optional[str] = None  # curseur de la page suivante
+
 class LivraisonCreate(BaseModel):
     contenu: Optional[str] = None
     fichiers_urls: List[str] = []
@@ -183,16 +215,46 @@ class LivraisonResponse(BaseModel):
     date_soumission: datetime
     modifiable: bool = False
 
+class LivraisonResumeResponse(BaseModel):
+    id: str
+    travail_id: str
+    etudiant_id: str
+    etudiant_nom: Optional[str] = None
+    date_soumission: datetime
+    modifiable: bool = False
+
 class EvaluationCreate(BaseModel):
     livraison_id: str
     note: float
     commentaire: Optional[str] = None
 
+class EvaluationBatchCreate(BaseModel):
+    evaluations: List[EvaluationCreate]
+
+class EvaluationBatchResultat(BaseModel):
+    livraison_id: str
+    succes: bool
+    evaluation_id: Optional[str] = None
+    erreur: Optional[str] = None
+
+class EvaluationBatchResponse(BaseModel):
+    resultats: List[EvaluationBatchResultat]
+    nombre_crees: int
+    nombre_erreurs: int
+
 class EvaluationUpdate(BaseModel):
     note: float
     commentaire: Optional[str] = None
     raison_modification: str
 
+class HistoriqueModification(BaseModel):
+    # Les entrées migrées depuis l'historique embarqué peuvent être incomplètes
+    ancienne_note: Optional[float] = None
+    nouvelle_note: Optional[float] = None
+    raison: Optional[str] = None
+    modifie_par: Optional[str] = None
+    date_modification: Optional[datetime] = None
+
 class EvaluationResponse(BaseModel):
     id: str
     livraison_id: str
@@ -205,7 +267,17 @@ class EvaluationResponse(BaseModel):
     note: float
     commentaire: Optional[str] = None
     date_evaluation: datetime
-    historique_modifications: List[dict] = []
+    nombre_modifications: int = 0
+    # Dernières modifications seulement (HISTORIQUE_RECENT); la liste complète est paginée
+    # par GET /api/evaluations/{id}/historique
+    historique_modifications: List[HistoriqueModification] = []
+
+class HistoriqueEvaluationResponse(BaseModel):
+    evaluation_id: str
+    total: int
+    skip: int
+    limit: int
+    modifications: List[HistoriqueModification]
 
 class NoteEtudiantResponse(BaseModel):
     etudiant_id: str
@@ -220,3 +292,99 @@ class StatistiquesEspace(BaseModel):
     note_min: float
     note_max: float
     nombre_evalues: int
+
+class ClasseHistogramme(BaseModel):
+    de: float
+    a: float
+    nombre: int
+
+class StatistiquesNotes(BaseModel):
+    nombre: int
+    moyenne: float = 0
+    ecart_type: float = 0
+    note_min: float = 0
+    note_max: float = 0
+    quartile_1: float = 0
+    mediane: float = 0
+    quartile_3: float = 0
+    taux_reussite: float = 0
+    histogramme: List[ClasseHistogramme] = []
+
+class DifficulteTravail(BaseModel):
+    travail_id: str
+    titre: Optional[str] = None
+    nombre: int
+    moyenne: float
+    ecart_type: float
+    taux_reussite: float
+    difficulte: float
+
+class AnalytiqueEspaceResponse(BaseModel):
+    espace_id: str
+    nom_matiere: str
+    statistiques: StatistiquesNotes
+    travaux: List[DifficulteTravail]
+
+class StatistiquesMatiere(BaseModel):
+    espace_id: str
+    nom_matiere: str
+    coefficient: float
+    statistiques: StatistiquesNotes
+
+class CorrelationMatieres(BaseModel):
+    matiere_a: str
+    matiere_b: str
+    correlation: Optional[float] = None
+    nombre_etudiants: int
+
+class AnalytiquePromotionResponse(BaseModel):
+    promotion_id: str
+    nom: str
+    nombre_etudiants: int
+    moyennes_generales: StatistiquesNotes
+    matieres: List[StatistiquesMatiere]
+    correlations: List[CorrelationMatieres]
+
+class FichierExistantRequest(BaseModel):
+    sha256: str = Field(pattern=r"^[0-9a-f]{64}$")
+    filename: Optional[str] = None
+
+class EnvoiSigneRequest(BaseModel):
+    filename: Optional[str] = None
+    content_type: Optional[str] = None
+    taille: int = Field(ge=0)
+
+class EnvoiTermineRequest(BaseModel):
+    id: str = Field(pattern=r"^[0-9a-f]{32}$")
+
+class JobCreate(BaseModel):
+    type: str
+    payload: dict = {}
+
+class JobResponse(BaseModel):
+    id: str
+    type: str
+    statut: str
+    progression: float = 0
+    message: Optional[str] = None
+    tentatives: int = 0
+    max_tentatives: int = 1
+    resultat: Optional[dict] = None
+    erreur: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class SearchResult(BaseModel):
+    type: str
+    id: str
+    libelle: str
+    detail: Optional[str] = None
+    score: float
+
+class SearchResponse(BaseModel):
+    resultats: List[SearchResult]
+    total: int
+    tronque: bool = False
+    skip: int
+    limit: int
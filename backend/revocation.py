@@ -0,0 +1,180 @@
+"""
+Révocation des tokens JWT
+- Source de vérité: collection `revocations` (par jti, ou pour tous les tokens d'un utilisateur)
+- Copie en mémoire: filtre de Bloom + ensemble exact, rafraîchis de façon incrémentale
+- Un token absent du filtre est accepté sans aucune requête; la base n'est consultée
+  que sur un positif du filtre qui n'est pas déjà confirmé par l'ensemble exact
+- Une révocation faite par un autre processus est vue au plus tard au rafraîchissement suivant
+- Tant que le premier chargement n'est pas terminé, chaque vérification interroge la base
+"""
+import asyncio
+import hashlib
+import math
+import traceback
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from database import revocations_collection, REVOCATION_REFRESH_SECONDS, REFRESH_TOKEN_DAYS
+
+BLOOM_CAPACITY = 100_000
+BLOOM_ERROR_RATE = 0.01
+REBUILD_INTERVAL = 3600
+
+
+class BloomFilter:
+    def __init__(self, capacity: int = BLOOM_CAPACITY, error_rate: float = BLOOM_ERROR_RATE):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, key: str):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+def _token_key(jti: str) -> str:
+    return f"jti:{jti}"
+
+
+def _user_key(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+class RevocationStore:
+    def __init__(self):
+        self._bloom = BloomFilter()
+        # clé -> date de révocation (pour un utilisateur: tokens émis avant cette date)
+        self._exact: Dict[str, datetime] = {}
+        self._last_seen: Optional[datetime] = None
+        self._last_rebuild: Optional[datetime] = None
+        self._loaded = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _mirror(self, key: str, revoked_at: datetime):
+        self._bloom.add(key)
+        previous = self._exact.get(key)
+        if previous is None or revoked_at > previous:
+            self._exact[key] = revoked_at
+
+    async def _store(self, key: str, expire_at: datetime):
+        now = datetime.utcnow()
+        await revocations_collection.update_one(
+            {"key": key},
+            {"$set": {"revoked_at": now, "expire_at": expire_at}},
+            upsert=True
+        )
+        self._mirror(key, now)
+
+    async def revoke_token(self, jti: str, exp: datetime):
+        await self._store(_token_key(jti), exp)
+
+    async def revoke_user(self, user_id: str):
+        # Couvre tous les tokens déjà émis, y compris les refresh tokens les plus longs
+        await self._store(_user_key(user_id), datetime.utcnow() + timedelta(days=REFRESH_TOKEN_DAYS))
+
+    async def _lookup(self, key: str) -> Optional[datetime]:
+        if key in self._exact:
+            return self._exact[key]
+        doc = await revocations_collection.find_one({"key": key}, {"revoked_at": 1})
+        if doc is None:
+            return None
+        self._mirror(key, doc["revoked_at"])
+        return doc["revoked_at"]
+
+    async def _lookup_direct(self, payload: dict) -> bool:
+        """Vérification sans le filtre, le temps que la copie en mémoire soit chargée"""
+        keys = [_user_key(payload["user_id"])]
+        if payload.get("jti"):
+            keys.append(_token_key(payload["jti"]))
+        async for doc in revocations_collection.find({"key": {"$in": keys}}, {"key": 1, "revoked_at": 1}):
+            self._mirror(doc["key"], doc["revoked_at"])
+            if doc["key"].startswith("jti:") or self._issued_before(payload, doc["revoked_at"]):
+                return True
+        return False
+
+    @staticmethod
+    def _issued_before(payload: dict, revoked_at: datetime) -> bool:
+        issued_at = datetime.utcfromtimestamp(payload.get("iat", 0))
+        # iat est à la seconde près: un token émis dans la même seconde reste révoqué
+        return issued_at <= revoked_at
+
+    async def is_revoked(self, payload: dict) -> bool:
+        if not self._loaded:
+            return await self._lookup_direct(payload)
+
+        jti = payload.get("jti")
+        if jti:
+            key = _token_key(jti)
+            if key in self._bloom and await self._lookup(key) is not None:
+                return True
+
+        key = _user_key(payload["user_id"])
+        if key in self._bloom:
+            revoked_at = await self._lookup(key)
+            if revoked_at is not None:
+                return self._issued_before(payload, revoked_at)
+        return False
+
+    async def refresh(self):
+        now = datetime.utcnow()
+        if self._last_rebuild is None or (now - self._last_rebuild).total_seconds() > REBUILD_INTERVAL:
+            await self._rebuild(now)
+            return
+
+        # Léger recouvrement pour tolérer les écritures concurrentes des autres processus
+        since = self._last_seen - timedelta(seconds=REVOCATION_REFRESH_SECONDS)
+        async for doc in revocations_collection.find({"revoked_at": {"$gte": since}}).sort("revoked_at", 1):
+            self._mirror(doc["key"], doc["revoked_at"])
+            self._last_seen = max(self._last_seen, doc["revoked_at"])
+
+    async def _rebuild(self, now: datetime):
+        # Le filtre ne sait pas oublier: on le reconstruit sans les révocations expirées,
+        # puis on remplace l'ancien d'un coup pour ne jamais exposer un filtre incomplet
+        bloom, exact = BloomFilter(), {}
+        last_seen = now
+        async for doc in revocations_collection.find({"expire_at": {"$gt": now}}):
+            bloom.add(doc["key"])
+            exact[doc["key"]] = doc["revoked_at"]
+            last_seen = max(last_seen, doc["revoked_at"])
+
+        # Les révocations faites par ce processus pendant le parcours ne sont pas perdues
+        for key, revoked_at in self._exact.items():
+            if revoked_at >= now and (key not in exact or revoked_at > exact[key]):
+                bloom.add(key)
+                exact[key] = revoked_at
+
+        self._bloom, self._exact = bloom, exact
+        self._last_seen = last_seen
+        self._last_rebuild = now
+        self._loaded = True
+
+    async def start(self):
+        # Le premier chargement se fait dans la tâche de fond: le démarrage n'attend pas la base
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                traceback.print_exc()
+            await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
+
+
+revocation_store = RevocationStore()
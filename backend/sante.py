@@ -0,0 +1,95 @@
+"""
+Sondes de l'orchestrateur
+- /health/live: le processus répond (aucun accès réseau)
+- /health/ready: ping MongoDB (latence), compteurs du pool de connexions, files du contrôle
+  d'admission et accessibilité du stockage. 503 si MongoDB ne répond pas ou si l'instance est
+  saturée (pool entièrement emprunté avec des opérations en attente, ou file d'admission pleine):
+  l'orchestrateur envoie alors le trafic vers les autres instances
+- Le stockage est partagé par toutes les instances: injoignable, il est signalé ("degrade")
+  sans retirer l'instance
+- Chaque vérification est bornée par HEALTH_TIMEOUT_SECONDS; le résultat du stockage est gardé
+  STOCKAGE_CACHE_SECONDES pour ne pas le solliciter à chaque sonde
+"""
+import asyncio
+import os
+import time
+
+from database import get_database, etat_pool, STORAGE_URL, HEALTH_TIMEOUT_SECONDS, MONGO_MAX_POOL_SIZE
+from admission import admission_control
+
+STOCKAGE_CACHE_SECONDES = 10
+
+
+class _Stockage:
+    resultat = None
+    verifie_le = 0.0
+
+
+async def verifier_mongo() -> dict:
+    debut = time.perf_counter()
+    try:
+        await asyncio.wait_for(get_database().command("ping"), HEALTH_TIMEOUT_SECONDS)
+    except Exception as e:
+        return {"ok": False, "erreur": type(e).__name__}
+    return {"ok": True, "latence_ms": round((time.perf_counter() - debut) * 1000, 1)}
+
+
+async def verifier_stockage() -> dict:
+    if not STORAGE_URL:
+        return {"ok": None, "erreur": "Stockage non configuré"}
+    if _Stockage.resultat is not None and time.monotonic() - _Stockage.verifie_le < STOCKAGE_CACHE_SECONDES:
+        return _Stockage.resultat
+
+    import httpx
+
+    # Client à part: la sonde ne doit pas attendre derrière les envois en cours
+    debut = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(timeout=HEALTH_TIMEOUT_SECONDS) as client:
+            response = await client.get(f"{STORAGE_URL}/status")
+        # Toute réponse hors erreur serveur prouve que le service est joignable
+        if response.status_code >= 500:
+            resultat = {"ok": False, "erreur": f"HTTP {response.status_code}"}
+        else:
+            resultat = {"ok": True, "latence_ms": round((time.perf_counter() - debut) * 1000, 1)}
+    except httpx.HTTPError as e:
+        resultat = {"ok": False, "erreur": type(e).__name__}
+
+    _Stockage.resultat, _Stockage.verifie_le = resultat, time.monotonic()
+    return resultat
+
+
+def saturations(pool: dict) -> list:
+    raisons = []
+    if pool["en_attente"] and pool["utilisees"] >= MONGO_MAX_POOL_SIZE:
+        raisons.append("pool")
+    for nom, groupe in admission_control.etat()["groupes"].items():
+        if groupe["en_attente"] >= groupe["file_max"]:
+            raisons.append(f"admission:{nom}")
+    return raisons
+
+
+def vivant() -> dict:
+    return {"statut": "ok", "pid": os.getpid()}
+
+
+async def pret() -> tuple:
+    """(code HTTP, rapport)"""
+    mongo, stockage = await asyncio.gather(verifier_mongo(), verifier_stockage())
+    pool = etat_pool()
+    satures = saturations(pool)
+
+    if not mongo["ok"] or satures:
+        statut, code = "indisponible", 503
+    elif stockage["ok"] is False:
+        statut, code = "degrade", 200
+    else:
+        statut, code = "ok", 200
+    return code, {
+        "statut": statut,
+        "pid": os.getpid(),
+        "mongo": mongo,
+        "pool": pool,
+        "saturations": satures,
+        "stockage": stockage
+    }
@@ -0,0 +1,137 @@
+"""
+Planificateur des échéances des travaux
+- Garde les prochaines bornes `date_debut` / `date_fin` dans un tas (min-heap)
+- À chaque borne, bascule en masse les statuts avec un seul `update_many` par transition
+    a_venir    -> en_attente  (date_debut atteinte)
+    a_venir / en_attente -> en_retard  (date_fin atteinte sans livraison)
+- Les transitions sont idempotentes: une borne obsolète (dates modifiées) ne fait rien
+- Un travail replanifié ou supprimé retire ses anciennes bornes du tas (`unschedule`)
+"""
+import asyncio
+import heapq
+import traceback
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from database import travaux_collection
+
+STATUT_A_VENIR = "a_venir"
+STATUT_EN_ATTENTE = "en_attente"
+STATUT_EN_RETARD = "en_retard"
+
+# Statuts pilotés par les dates; "livre" et "evalue" ne sont jamais modifiés ici
+STATUTS_ECHEANCE = [STATUT_A_VENIR, STATUT_EN_ATTENTE, STATUT_EN_RETARD]
+
+MAX_SLEEP = 300.0
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """Mongo renvoie des dates naïves en UTC: on aligne les dates reçues de l'API"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def statut_par_dates(date_debut: datetime, date_fin: datetime, now: Optional[datetime] = None) -> str:
+    now = now or datetime.utcnow()
+    if to_naive_utc(date_fin) <= now:
+        return STATUT_EN_RETARD
+    if to_naive_utc(date_debut) > now:
+        return STATUT_A_VENIR
+    return STATUT_EN_ATTENTE
+
+
+async def apply_transitions(now: Optional[datetime] = None) -> Tuple[int, int]:
+    now = now or datetime.utcnow()
+
+    ouverts = await travaux_collection.update_many(
+        {"statut": STATUT_A_VENIR, "date_debut": {"$lte": now}, "date_fin": {"$gt": now}},
+        {"$set": {"statut": STATUT_EN_ATTENTE}}
+    )
+    en_retard = await travaux_collection.update_many(
+        {"statut": {"$in": [STATUT_A_VENIR, STATUT_EN_ATTENTE]}, "date_fin": {"$lte": now}},
+        {"$set": {"statut": STATUT_EN_RETARD}}
+    )
+    return ouverts.modified_count, en_retard.modified_count
+
+
+class DeadlineScheduler:
+    def __init__(self):
+        self._heap: List[Tuple[datetime, str]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def unschedule(self, travail_id: str):
+        heap = [entry for entry in self._heap if entry[1] != travail_id]
+        if len(heap) != len(self._heap):
+            heapq.heapify(heap)
+            self._heap = heap
+
+    def schedule(self, travail_id: str, date_debut: datetime, date_fin: datetime):
+        self.unschedule(travail_id)
+        now = datetime.utcnow()
+        earliest = self._heap[0][0] if self._heap else None
+
+        for borne in (to_naive_utc(date_debut), to_naive_utc(date_fin)):
+            if borne > now:
+                heapq.heappush(self._heap, (borne, travail_id))
+
+        if self._heap and (earliest is None or self._heap[0][0] < earliest):
+            self._wakeup.set()
+
+    async def rebuild(self):
+        now = datetime.utcnow()
+        self._heap = []
+        cursor = travaux_collection.find(
+            {"statut": {"$in": [STATUT_A_VENIR, STATUT_EN_ATTENTE]}, "date_fin": {"$gt": now}},
+            {"date_debut": 1, "date_fin": 1}
+        )
+        async for t in cursor:
+            for borne in (t["date_debut"], t["date_fin"]):
+                if borne > now:
+                    self._heap.append((borne, str(t["_id"])))
+        heapq.heapify(self._heap)
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def _initial_load(self):
+        # Fait dans la tâche de fond pour ne pas retarder le démarrage du worker
+        try:
+            await apply_transitions()
+            await self.rebuild()
+        except Exception:
+            traceback.print_exc()
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        await self._initial_load()
+        while True:
+            self._wakeup.clear()
+            now = datetime.utcnow()
+
+            if self._heap and self._heap[0][0] <= now:
+                while self._heap and self._heap[0][0] <= now:
+                    heapq.heappop(self._heap)
+                try:
+                    await apply_transitions(now)
+                except Exception:
+                    traceback.print_exc()
+                continue
+
+            delay = MAX_SLEEP
+            if self._heap:
+                delay = min(delay, (self._heap[0][0] - now).total_seconds())
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0.0))
+            except asyncio.TimeoutError:
+                pass
+
+
+deadline_scheduler = DeadlineScheduler()
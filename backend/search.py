@@ -0,0 +1,168 @@
+"""
+Recherche et autocomplétion sur les personnes, espaces et travaux
+- Chaque document indexé porte un champ `mots_cles`: mots normalisés (minuscules, sans accents)
+- Une regex ancrée `^prefixe` sur ce champ indexé se résout en un parcours d'intervalle d'index
+- Le classement est fait en mémoire sur au plus MAX_CANDIDATES candidats par source; au-delà,
+  la réponse porte `tronque` et `total` n'est qu'un minimum: préciser la recherche
+"""
+import re
+import unicodedata
+from typing import List, Optional
+
+from bson import ObjectId
+
+from assignations import query_travaux_etudiant
+from database import (
+    etudiants_collection, formateurs_collection, espaces_collection, travaux_collection
+)
+
+MAX_CANDIDATES = 200
+MIN_TERM_LENGTH = 1
+
+_SPLIT = re.compile(r"[^a-z0-9@._-]+")
+_PARTS = re.compile(r"[._-]+")
+
+
+def normalize(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower().strip()
+
+
+def _words(text: Optional[str]) -> List[str]:
+    words = []
+    for w in _SPLIT.split(normalize(text)):
+        if not w:
+            continue
+        words.append(w)
+        # Noms composés et codes: chaque partie est aussi un mot ("jean-pierre" -> "pierre")
+        if "@" not in w:
+            words += [p for p in _PARTS.split(w) if p and p != w]
+    return words
+
+
+def _email_tokens(email: Optional[str]) -> List[str]:
+    email = normalize(email)
+    if not email:
+        return []
+    local = email.split("@")[0]
+    return [email] + [w for w in re.split(r"[._-]+", local) if w]
+
+
+def mots_cles_etudiant(doc: dict) -> List[str]:
+    return _dedupe(_words(doc.get("nom_complet")) + _email_tokens(doc.get("email")) + _words(doc.get("matricule")))
+
+
+def mots_cles_formateur(doc: dict) -> List[str]:
+    return _dedupe(_words(doc.get("nom_complet")) + _email_tokens(doc.get("email")))
+
+
+def mots_cles_espace(doc: dict) -> List[str]:
+    return _dedupe(_words(doc.get("nom_matiere")) + _words(doc.get("code_matiere")))
+
+
+def mots_cles_travail(doc: dict) -> List[str]:
+    return _dedupe(_words(doc.get("titre")))
+
+
+def _dedupe(tokens: List[str]) -> List[str]:
+    return list(dict.fromkeys(tokens))
+
+
+SOURCES = {
+    "etudiant": {
+        "collection": etudiants_collection,
+        "mots_cles": mots_cles_etudiant,
+        "projection": {"nom_complet": 1, "email": 1, "matricule": 1, "mots_cles": 1},
+        "libelle": lambda d: d.get("nom_complet", ""),
+        "detail": lambda d: f"{d.get('matricule', '')} - {d.get('email', '')}"
+    },
+    "formateur": {
+        "collection": formateurs_collection,
+        "mots_cles": mots_cles_formateur,
+        "projection": {"nom_complet": 1, "email": 1, "mots_cles": 1},
+        "libelle": lambda d: d.get("nom_complet", ""),
+        "detail": lambda d: d.get("email", "")
+    },
+    "espace": {
+        "collection": espaces_collection,
+        "mots_cles": mots_cles_espace,
+        "projection": {"nom_matiere": 1, "code_matiere": 1, "mots_cles": 1},
+        "libelle": lambda d: d.get("nom_matiere", ""),
+        "detail": lambda d: d.get("code_matiere") or ""
+    },
+    "travail": {
+        "collection": travaux_collection,
+        "mots_cles": mots_cles_travail,
+        "projection": {"titre": 1, "type_travail": 1, "date_fin": 1, "mots_cles": 1},
+        "libelle": lambda d: d.get("titre", ""),
+        "detail": lambda d: d.get("type_travail", "")
+    }
+}
+
+
+def _score(terms: List[str], tokens: List[str]) -> float:
+    score = 0.0
+    for term in terms:
+        best = 0.0
+        for position, token in enumerate(tokens):
+            if token == term:
+                value = 3.0
+            elif token.startswith(term):
+                value = 2.0 + len(term) / len(token)
+            else:
+                continue
+            if position == 0:
+                value += 0.5
+            best = max(best, value)
+        score += best
+    return score
+
+
+async def _access_filter(kind: str, current_user: dict) -> dict:
+    """Un étudiant ne trouve que les travaux qui lui sont assignés"""
+    if kind == "travail" and current_user["user_type"] == "etudiant":
+        return await query_travaux_etudiant(ObjectId(current_user["user_id"]))
+    return {}
+
+
+async def search(q: str, current_user: dict, types: Optional[List[str]] = None,
+                 skip: int = 0, limit: int = 20) -> dict:
+    terms = [t for t in _SPLIT.split(normalize(q)) if len(t) >= MIN_TERM_LENGTH]
+    if not terms:
+        return {"resultats": [], "total": 0, "tronque": False, "skip": skip, "limit": limit}
+
+    # Le premier terme (le plus long) sert au parcours d'index, les autres filtrent
+    terms.sort(key=len, reverse=True)
+    query_mots = {"$and": [{"mots_cles": re.compile("^" + re.escape(t))} for t in terms]}
+
+    candidats = []
+    tronque = False
+    for kind in (types or list(SOURCES)):
+        source = SOURCES.get(kind)
+        if source is None:
+            continue
+        query = {**query_mots, **await _access_filter(kind, current_user)}
+        # Un document de plus que la borne: il signale seulement que la source est tronquée
+        docs = await source["collection"].find(query, source["projection"]).limit(MAX_CANDIDATES + 1).to_list(None)
+        if len(docs) > MAX_CANDIDATES:
+            tronque = True
+            docs = docs[:MAX_CANDIDATES]
+        for doc in docs:
+            candidats.append({
+                "type": kind,
+                "id": str(doc["_id"]),
+                "libelle": source["libelle"](doc),
+                "detail": source["detail"](doc),
+                "score": round(_score(terms, doc.get("mots_cles", [])), 3)
+            })
+
+    candidats.sort(key=lambda c: (-c["score"], len(c["libelle"]), c["libelle"]))
+    return {
+        "resultats": candidats[skip:skip + limit],
+        "total": len(candidats),
+        "tronque": tronque,
+        "skip": skip,
+        "limit": limit
+    }
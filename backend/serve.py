@@ -0,0 +1,44 @@
+"""
+Lancement en production: un processus maître gunicorn et N workers uvicorn
+- L'application est importée une fois dans le maître (preload) puis partagée par fork
+- Aucun client Motor n'existe avant le fork: chaque worker crée le sien dans le lifespan
+- SIGHUP: rechargement progressif des workers; SIGTERM: arrêt propre après les requêtes en cours
+
+Usage: python serve.py   (WEB_CONCURRENCY, HOST, PORT, GRACEFUL_TIMEOUT configurables)
+"""
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+
+
+class Server(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from main import app
+        return app
+
+
+def options_from_env() -> dict:
+    return {
+        "bind": f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}",
+        "workers": int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count())),
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "graceful_timeout": int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        "timeout": int(os.getenv("WORKER_TIMEOUT", "60")),
+        "keepalive": 5,
+        "accesslog": "-",
+    }
+
+
+if __name__ == "__main__":
+    Server(options_from_env()).run()
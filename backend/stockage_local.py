@@ -0,0 +1,129 @@
+"""
+Serveur de stockage local remplaçant Supabase Storage (développement et tests)
+- Implémente le sous-ensemble de l'API utilisé par fichiers.py: dépôt avec la clé de service,
+  URL signées d'envoi, HEAD d'un objet, suppression par préfixes et lecture publique
+- Les objets sont écrits sous STOCKAGE_LOCAL_DIR/<bucket>/<chemin>
+- Les jetons d'envoi sont signés (HMAC) et expirent après SIGNED_UPLOAD_MINUTES
+
+Usage: python stockage_local.py [--port 9000]
+puis STORAGE_URL=http://localhost:9000 et n'importe quelle SUPABASE_SERVICE_KEY pour l'API
+"""
+import argparse
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from pathlib import Path
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
+
+from database import SIGNED_UPLOAD_MINUTES
+
+RACINE = Path(os.getenv("STOCKAGE_LOCAL_DIR", "stockage_local")).resolve()
+SECRET = secrets.token_bytes(32)
+
+app = FastAPI(title="Stockage local")
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+
+def _fichier(bucket: str, path: str) -> Path:
+    fichier = (RACINE / bucket / path).resolve()
+    if RACINE / bucket not in fichier.parents:
+        raise HTTPException(status_code=400, detail="Chemin invalide")
+    return fichier
+
+
+def _jeton(bucket: str, path: str, expire: int) -> str:
+    signature = hmac.new(SECRET, f"{bucket}/{path}:{expire}".encode(), hashlib.sha256).hexdigest()
+    return f"{expire}.{signature}"
+
+
+def _verifier_jeton(bucket: str, path: str, jeton: str):
+    expire, _, _ = jeton.partition(".")
+    if not expire.isdigit() or int(expire) < time.time() or \
+            not hmac.compare_digest(jeton, _jeton(bucket, path, int(expire))):
+        raise HTTPException(status_code=403, detail="Jeton invalide ou expiré")
+
+
+def _cle_service(request: Request):
+    if not request.headers.get("authorization", "").startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Clé de service manquante")
+
+
+async def _ecrire(request: Request, fichier: Path, remplacer: bool):
+    if fichier.exists() and not remplacer:
+        raise HTTPException(status_code=409, detail="Objet existant")
+    fichier.parent.mkdir(parents=True, exist_ok=True)
+    temporaire = fichier.with_name(f".{fichier.name}.{secrets.token_hex(4)}")
+    with open(temporaire, "wb") as f:
+        async for chunk in request.stream():
+            f.write(chunk)
+    os.replace(temporaire, fichier)
+
+
+@app.get("/status")
+async def status():
+    return {"statut": "ok"}
+
+
+@app.post("/object/upload/sign/{bucket}/{path:path}")
+async def signer(bucket: str, path: str, request: Request):
+    _cle_service(request)
+    jeton = _jeton(bucket, path, int(time.time()) + SIGNED_UPLOAD_MINUTES * 60)
+    return {"url": f"/object/upload/sign/{bucket}/{path}?token={jeton}"}
+
+
+@app.put("/object/upload/sign/{bucket}/{path:path}")
+async def deposer_signe(bucket: str, path: str, token: str, request: Request):
+    _verifier_jeton(bucket, path, token)
+    await _ecrire(request, _fichier(bucket, path), remplacer=False)
+    return {"Key": f"{bucket}/{path}"}
+
+
+@app.post("/object/{bucket}/{path:path}")
+async def deposer(bucket: str, path: str, request: Request):
+    _cle_service(request)
+    await _ecrire(request, _fichier(bucket, path), remplacer=request.headers.get("x-upsert") == "true")
+    return {"Key": f"{bucket}/{path}"}
+
+
+@app.head("/object/{bucket}/{path:path}")
+async def informations(bucket: str, path: str, request: Request):
+    _cle_service(request)
+    fichier = _fichier(bucket, path)
+    if not fichier.is_file():
+        return Response(status_code=404)
+    return Response(status_code=200, headers={"Content-Length": str(fichier.stat().st_size)})
+
+
+@app.delete("/object/{bucket}")
+async def supprimer(bucket: str, request: Request):
+    _cle_service(request)
+    supprimes = []
+    for path in (await request.json()).get("prefixes", []):
+        fichier = _fichier(bucket, path)
+        if fichier.is_file():
+            fichier.unlink()
+            supprimes.append({"name": path})
+    return supprimes
+
+
+@app.get("/object/public/{bucket}/{path:path}")
+async def lire(bucket: str, path: str):
+    fichier = _fichier(bucket, path)
+    if not fichier.is_file():
+        raise HTTPException(status_code=404, detail="Objet introuvable")
+    return FileResponse(fichier)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stockage local compatible Supabase Storage")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
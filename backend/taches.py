@@ -0,0 +1,210 @@
+"""
+Tâches de fond enregistrées dans la file `jobs`
+"""
+import asyncio
+import calendar
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from database import (
+    etudiants_collection, formateurs_collection,
+    evaluations_collection, evaluation_audit_collection, identifiants_relance_collection
+)
+from jobs import register_job, JobContext
+from identities import update_identity, sync_all_identities
+from archives import archiver_promotions_terminees
+from contenus import purger as purger_contenus
+from fichiers import purger_orphelins, purger_envois, recompter_references
+from migrations import executer, executer_toutes, get_migration
+import evolutions  # noqa: F401 (enregistre les migrations)
+from search import SOURCES
+from utils import hash_password, generate_password
+
+PROGRESS_EVERY = 50
+BATCH_SIZE = 500
+# Les mots de passe régénérés ne sont lisibles qu'une fois, et au plus pendant ce délai
+IDENTIFIANTS_HEURES = 24
+
+
+@register_job("reparation_espaces")
+async def reparation_espaces(ctx: JobContext, payload: dict) -> dict:
+    """Repasse la migration des identifiants sur tous les espaces"""
+    resultat = await executer(
+        get_migration("0001_espaces_identifiants_texte"), forcer=True,
+        rapport=lambda message, progression: ctx.progress(progression, message)
+    )
+    return {"espaces_analyses": resultat["traites"], "espaces_corriges": resultat["modifies"]}
+
+
+@register_job("migrations_schema")
+async def migrations_schema(ctx: JobContext, payload: dict) -> dict:
+    """Applique toutes les migrations en attente"""
+    resultats = await executer_toutes(
+        dry_run=payload.get("dry_run", False),
+        jusqua=payload.get("jusqua"),
+        rapport=lambda message, progression: ctx.progress(progression, message)
+    )
+    return {"migrations": resultats}
+
+
+# Pas de nouvelle tentative: les mots de passe déjà régénérés seraient perdus
+@register_job("relance_comptes", max_tentatives=1)
+async def relance_comptes(ctx: JobContext, payload: dict) -> dict:
+    """Régénère les mots de passe de tous les comptes non activés.
+    Le résultat de la tâche ne contient que les emails: les mots de passe sont rangés à part
+    (`identifiants_relance`) et remis une seule fois par GET /api/jobs/{id}/identifiants"""
+    user_type: Optional[str] = payload.get("user_type")
+    promotion_id: Optional[str] = payload.get("promotion_id")
+
+    cibles = []
+    if user_type in (None, "formateur") and not promotion_id:
+        cibles.append(formateurs_collection)
+    if user_type in (None, "etudiant"):
+        cibles.append(etudiants_collection)
+
+    total = 0
+    for collection in cibles:
+        query = {"compte_active": {"$ne": True}}
+        if collection is etudiants_collection and promotion_id:
+            query["promotion_id"] = ObjectId(promotion_id)
+        total += await collection.count_documents(query)
+
+    emails = []
+    expire_at = datetime.utcnow() + timedelta(hours=IDENTIFIANTS_HEURES)
+    for collection in cibles:
+        query = {"compte_active": {"$ne": True}}
+        if collection is etudiants_collection and promotion_id:
+            query["promotion_id"] = ObjectId(promotion_id)
+
+        async for user in collection.find(query, {"email": 1}):
+            new_password = generate_password(8)
+            # bcrypt est coûteux: on le sort de la boucle d'événements
+            hashed = await asyncio.to_thread(hash_password, new_password)
+            await collection.update_one({"_id": user["_id"]}, {"$set": {"mot_de_passe": hashed}})
+            await update_identity(user["_id"], {"mot_de_passe": hashed})
+            # Rangé au fur et à mesure: un arrêt en cours de tâche ne perd pas les mots de passe déjà changés
+            await identifiants_relance_collection.update_one(
+                {"_id": ctx.job_id},
+                {"$push": {"identifiants": {"email": user["email"], "nouveau_mot_de_passe": new_password}},
+                 "$setOnInsert": {"cree_par": ctx.job.get("cree_par"), "expire_at": expire_at}},
+                upsert=True
+            )
+            emails.append(user["email"])
+
+            if len(emails) % PROGRESS_EVERY == 0 and total:
+                await ctx.progress(100 * len(emails) / total, f"{len(emails)}/{total} comptes relancés")
+
+    return {"nombre": len(emails), "emails": emails}
+
+
+@register_job("indexation_recherche")
+async def indexation_recherche(ctx: JobContext, payload: dict) -> dict:
+    """Recalcule le champ `mots_cles` de tous les documents recherchables"""
+    totaux = {}
+    for kind, source in SOURCES.items():
+        collection = source["collection"]
+        batch = []
+        count = 0
+
+        async for doc in collection.find():
+            batch.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"mots_cles": source["mots_cles"](doc)}}))
+            if len(batch) >= BATCH_SIZE:
+                await collection.bulk_write(batch, ordered=False)
+                count += len(batch)
+                batch = []
+                await ctx.progress(0, f"{kind}: {count} documents indexés")
+
+        if batch:
+            await collection.bulk_write(batch, ordered=False)
+            count += len(batch)
+
+        totaux[kind] = count
+        await ctx.progress(100 * len(totaux) / len(SOURCES), f"{kind}: {count} documents indexés")
+
+    return totaux
+
+
+def _id_audit(evaluation_id: ObjectId, index: int, date: Optional[datetime]) -> ObjectId:
+    """Identifiant stable d'une entrée d'historique migrée: horodatage de la modification
+    (comme un ObjectId ordinaire) puis empreinte de (évaluation, rang)"""
+    # Dates naïves: UTC, comme celles lues dans MongoDB
+    secondes = calendar.timegm((date or evaluation_id.generation_time).utctimetuple())
+    empreinte = hashlib.sha256(f"{evaluation_id}:{index}".encode()).digest()[:8]
+    return ObjectId(secondes.to_bytes(4, "big") + empreinte)
+
+
+@register_job("migration_historique_evaluations")
+async def migration_historique_evaluations(ctx: JobContext, payload: dict) -> dict:
+    """Déplace les historiques embarqués vers la collection evaluation_audit.
+    Rejouable: une entrée déjà copiée (tâche interrompue avant le $unset) n'est pas dupliquée"""
+    query = {"historique_modifications.0": {"$exists": True}}
+    total = await evaluations_collection.count_documents(query)
+    migrees = 0
+
+    async for evaluation in evaluations_collection.find(query, {"historique_modifications": 1}):
+        historique = evaluation["historique_modifications"]
+        operations = []
+        for index, h in enumerate(historique):
+            date = datetime.fromisoformat(h["date_modification"]) \
+                if isinstance(h.get("date_modification"), str) else h.get("date_modification")
+            operations.append(UpdateOne(
+                {"_id": _id_audit(evaluation["_id"], index, date)},
+                {"$setOnInsert": {
+                    "evaluation_id": evaluation["_id"],
+                    "ancienne_note": h.get("ancienne_note"),
+                    "nouvelle_note": h.get("nouvelle_note"),
+                    "raison": h.get("raison"),
+                    "modifie_par": h.get("modifie_par"),
+                    "date_modification": date
+                }},
+                upsert=True
+            ))
+        await evaluation_audit_collection.bulk_write(operations, ordered=False)
+        await evaluations_collection.update_one(
+            {"_id": evaluation["_id"]},
+            {"$unset": {"historique_modifications": ""}, "$inc": {"nombre_modifications": len(historique)}}
+        )
+
+        migrees += 1
+        if migrees % PROGRESS_EVERY == 0 and total:
+            await ctx.progress(100 * migrees / total, f"{migrees}/{total} évaluations migrées")
+
+    return {"evaluations_migrees": migrees}
+
+
+@register_job("recompte_fichiers")
+async def recompte_fichiers(ctx: JobContext, payload: dict) -> dict:
+    """Recalcule les références des fichiers d'après les travaux et livraisons (actifs et archivés)"""
+    return await recompter_references()
+
+
+@register_job("synchronisation_identites")
+async def synchronisation_identites(ctx: JobContext, payload: dict) -> dict:
+    return {"identites": await sync_all_identities()}
+
+
+@register_job("archivage_promotions", max_tentatives=5)
+async def archivage_promotions(ctx: JobContext, payload: dict) -> dict:
+    """Déplace les données des promotions terminées vers les collections d'archive"""
+    async def rapport(message: str):
+        await ctx.progress(0, message)
+
+    return await archiver_promotions_terminees(
+        payload.get("promotion_id"), payload.get("batch_size", BATCH_SIZE), rapport
+    )
+
+
+@register_job("purge_contenus")
+async def purge_contenus(ctx: JobContext, payload: dict) -> dict:
+    """Supprime les textes de livraison stockés à part qu'aucune livraison ne référence plus"""
+    return {"contenus_supprimes": await purger_contenus()}
+
+
+@register_job("purge_fichiers")
+async def purge_fichiers(ctx: JobContext, payload: dict) -> dict:
+    """Supprime du stockage les fichiers qui ne sont plus référencés et les envois directs abandonnés"""
+    return {"fichiers_supprimes": len(await purger_orphelins()), "envois_supprimes": len(await purger_envois())}
@@ -0,0 +1,62 @@
+"""
+Vérifie le routage des lectures sur un replica set local
+- Chaque itération écrit un document dans une session causale, puis le relit aussitôt
+  avec le profil "rapport" (secondaire de préférence)
+- Échec si une relecture ne trouve pas l'écriture (lecture de ses propres écritures cassée)
+- Affiche le nombre de lectures servies par un secondaire
+
+Usage: MONGODB_URL="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0" \\
+       python verif_lectures.py [iterations]
+"""
+import asyncio
+import sys
+from collections import Counter
+
+from bson import ObjectId
+
+from database import database, get_client, close_client
+from lectures import read_router, ROUTES
+
+COLLECTION = "verif_lectures"
+ROUTE = "verif_lectures"
+
+
+async def main(iterations: int):
+    ROUTES[ROUTE] = "rapport"
+    collection = database[COLLECTION]
+    user_id = str(ObjectId())
+
+    await get_client().admin.command("ping")
+    topology = get_client().topology_description
+    print(f"🔌 Topologie: {topology.topology_type_name}")
+    if not topology.topology_type_name.startswith("ReplicaSet"):
+        print("⚠️  Pas de replica set: toutes les lectures iront sur le primaire")
+
+    serveurs = Counter()
+    manquants = 0
+    primaire = get_client().primary
+    try:
+        for i in range(iterations):
+            doc_id = ObjectId()
+            async with read_router.ecriture(user_id) as session:
+                await collection.insert_one({"_id": doc_id, "i": i}, session=session)
+
+            async with read_router.lecteur(ROUTE, user_id) as lire:
+                cursor = lire(collection).find({"_id": doc_id}).limit(1)
+                docs = await cursor.to_list(1)
+                serveurs["primaire" if cursor.address == primaire else "secondaire"] += 1
+            if not docs:
+                manquants += 1
+    finally:
+        await collection.drop()
+        close_client()
+
+    print(f"📖 Lectures: {dict(serveurs)}")
+    if manquants:
+        print(f"❌ {manquants}/{iterations} écritures non relues")
+        sys.exit(1)
+    print(f"✅ {iterations}/{iterations} écritures relues immédiatement")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
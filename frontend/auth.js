@@ -39,6 +39,7 @@ async function loginDirecteur(event) {
         
         const data = await response.json();
         localStorage.setItem('token', data.access_token);
+        localStorage.setItem('refresh_token', data.refresh_token);
         localStorage.setItem('user_type', data.user_type);
         localStorage.setItem('user_id', data.user_id);
         localStorage.setItem('nom_complet', data.nom_complet);
@@ -79,6 +80,7 @@ async function loginUser(event) {
         
         const data = await response.json();
         localStorage.setItem('token', data.access_token);
+        localStorage.setItem('refresh_token', data.refresh_token);
         localStorage.setItem('user_type', data.user_type);
         localStorage.setItem('user_id', data.user_id);
         localStorage.setItem('nom_complet', data.nom_complet);
@@ -100,10 +102,150 @@ async function loginUser(event) {
 }
 
 function logout() {
+    const token = localStorage.getItem('token');
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (token) {
+        // Révoque les tokens côté serveur; la déconnexion locale n'attend pas la réponse
+        fetch(`${API_BASE}/auth/logout`, {
+            method: 'POST',
+            headers: getAuthHeaders(),
+            body: JSON.stringify({ refresh_token: refreshToken })
+        }).catch(() => {});
+    }
     localStorage.clear();
     window.location.href = 'index.html';
 }
 
+let refreshPromise = null;
+
+async function refreshAccessToken() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) return false;
+    
+    if (!refreshPromise) {
+        refreshPromise = originalFetch(`${API_BASE}/auth/refresh`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ refresh_token: refreshToken })
+        }).then(async (response) => {
+            if (!response.ok) return false;
+            const data = await response.json();
+            localStorage.setItem('token', data.access_token);
+            localStorage.setItem('refresh_token', data.refresh_token);
+            return true;
+        }).catch(() => false).finally(() => { refreshPromise = null; });
+    }
+    return refreshPromise;
+}
+
+// Heure de la dernière écriture: renvoyée au serveur pour relire ses propres écritures
+// même quand la lecture est servie par un secondaire
+function rememberOperationTime(response) {
+    const operationTime = response.headers.get('X-Operation-Time');
+    if (operationTime) localStorage.setItem('operation_time', operationTime);
+}
+
+// Les tokens d'accès sont courts: sur un 401, on tente un rafraîchissement puis on rejoue la requête
+const originalFetch = window.fetch.bind(window);
+window.fetch = async (url, options = {}) => {
+    const operationTime = localStorage.getItem('operation_time');
+    if (operationTime && options.headers && options.headers.Authorization) {
+        options = { ...options, headers: { ...options.headers, 'X-Operation-Time': operationTime } };
+    }
+    const response = await originalFetch(url, options);
+    rememberOperationTime(response);
+    const headers = options.headers || {};
+    if (response.status !== 401 || !headers.Authorization || String(url).includes('/auth/')) {
+        return response;
+    }
+    
+    if (!(await refreshAccessToken())) {
+        return response;
+    }
+    const retryHeaders = { ...headers, Authorization: `Bearer ${localStorage.getItem('token')}` };
+    const retried = await originalFetch(url, { ...options, headers: retryHeaders });
+    rememberOperationTime(retried);
+    return retried;
+};
+
+// Les fichiers sont stockés par empreinte SHA-256: un contenu que l'utilisateur a déjà envoyé n'est pas renvoyé
+async function sha256Hex(file) {
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+// Envoi direct: le fichier est déposé dans le stockage via une URL signée, sans passer par l'API.
+// Réservé aux gros fichiers (seuil par défaut du serveur, DIRECT_UPLOAD_MIN_BYTES): ils ne sont pas
+// dédupliqués; les autres passent par l'API, stockés par empreinte
+const DIRECT_UPLOAD_MIN_BYTES = 8 * 1024 * 1024;
+
+async function uploadDirect(file) {
+    if (file.size < DIRECT_UPLOAD_MIN_BYTES) return null;
+    const signed = await fetch(`${API_BASE}/upload/signer`, {
+        method: 'POST',
+        headers: getAuthHeaders(),
+        body: JSON.stringify({ filename: file.name, content_type: file.type || null, taille: file.size })
+    });
+    if (!signed.ok) return null;
+    const { id, upload_url } = await signed.json();
+    
+    const stored = await fetch(upload_url, {
+        method: 'PUT',
+        headers: { 'Content-Type': file.type || 'application/octet-stream' },
+        body: file
+    });
+    if (!stored.ok) return { filename: file.name, erreur: 'Stockage refusé' };
+    
+    const done = await fetch(`${API_BASE}/upload/termine`, {
+        method: 'POST',
+        headers: getAuthHeaders(),
+        body: JSON.stringify({ id })
+    });
+    if (!done.ok) return { filename: file.name, erreur: 'Envoi non confirmé' };
+    return done.json();
+}
+
+// Plusieurs fichiers: contenus déjà envoyés annoncés par empreinte, les gros fichiers déposés
+// directement dans le stockage, les autres (ou sans URL signée) en un envoi groupé via l'API
+async function uploadFiles(files) {
+    const results = new Array(files.length);
+    const pending = [];
+    
+    await Promise.all(files.map(async (file, i) => {
+        if (window.crypto && crypto.subtle) {
+            const existing = await fetch(`${API_BASE}/upload/existant`, {
+                method: 'POST',
+                headers: getAuthHeaders(),
+                body: JSON.stringify({ sha256: await sha256Hex(file), filename: file.name })
+            });
+            if (existing.ok) {
+                results[i] = await existing.json();
+                return;
+            }
+        }
+        const direct = await uploadDirect(file);
+        if (direct) {
+            results[i] = direct;
+            return;
+        }
+        pending.push(i);
+    }));
+    
+    if (pending.length > 0) {
+        const formData = new FormData();
+        pending.forEach(i => formData.append('files', files[i]));
+        const response = await fetch(`${API_BASE}/upload/batch`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` },
+            body: formData
+        });
+        if (!response.ok) throw new Error('Erreur upload');
+        const data = await response.json();
+        pending.forEach((i, n) => { results[i] = data.fichiers[n]; });
+    }
+    return results;
+}
+
 function checkAuth(allowedTypes = []) {
     const token = localStorage.getItem('token');
     const userType = localStorage.getItem('user_type');
@@ -135,3 +277,24 @@ function getCurrentUser() {
         nom_complet: localStorage.getItem('nom_complet')
     };
 }
+
+// EventSource n'envoie pas d'en-tête: le flux s'ouvre avec un ticket à usage unique, jamais avec le token
+async function subscribeEvents(handlers) {
+    if (!localStorage.getItem('token') || typeof EventSource === 'undefined') return null;
+    
+    const response = await fetch(`${API_BASE}/events/ticket`, { method: 'POST', headers: getAuthHeaders() });
+    if (!response.ok) return null;
+    const { ticket } = await response.json();
+    
+    const source = new EventSource(`${API_BASE}/events?ticket=${encodeURIComponent(ticket)}`);
+    Object.entries(handlers).forEach(([type, handler]) => {
+        source.addEventListener(type, (e) => handler(JSON.parse(e.data)));
+    });
+    source.onerror = () => {
+        // Ticket déjà consommé: EventSource abandonne la reconnexion, on en demande un nouveau
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(() => subscribeEvents(handlers), 5000);
+        }
+    };
+    return source;
+}
@@ -1,9 +1,13 @@
 let etudiantData = {
     espaces: [],
     travaux: [],
-    notes: null
+    notes: null,
+    echeances: [],
+    echeancesSuivant: null
 };
 
+const submissionKeys = {};
+
 function showEtudiantSection(section) {
     console.log('=== SHOW ETUDIANT SECTION ===');
     console.log('Section:', section);
@@ -24,6 +28,7 @@ function showEtudiantSection(section) {
     
     switch(section) {
         case 'espaces':
+            loadEcheances();
             loadEtudiantEspaces();
             break;
         case 'travaux':
@@ -67,6 +72,51 @@ function renderEtudiantEspaces(espaces) {
     `).join('');
 }
 
+async function loadEcheances(suite = false) {
+    try {
+        const params = new URLSearchParams({ limit: 5 });
+        if (suite && etudiantData.echeancesSuivant) params.set('apres', etudiantData.echeancesSuivant);
+        const response = await fetch(`${API_BASE}/etudiants/me/echeances?${params}`, { headers: getAuthHeaders() });
+        if (!response.ok) throw new Error('Erreur lors du chargement des échéances');
+
+        const page = await response.json();
+        etudiantData.echeances = suite ? etudiantData.echeances.concat(page.echeances) : page.echeances;
+        etudiantData.echeancesSuivant = page.suivant;
+        renderEcheances(etudiantData.echeances);
+    } catch (error) {
+        showNotification(error.message, 'error');
+    }
+}
+
+function renderEcheances(echeances) {
+    const container = document.getElementById('echeances-list');
+    document.getElementById('echeances-suivant').classList.toggle('hidden', !etudiantData.echeancesSuivant);
+
+    if (echeances.length === 0) {
+        container.innerHTML = '<div class="empty-state"><p>Aucune échéance à venir</p></div>';
+        return;
+    }
+
+    const badges = {
+        a_rendre: '<span class="badge badge-warning">À rendre</span>',
+        livre: '<span class="badge badge-info">Livré</span>',
+        evalue: '<span class="badge badge-success">Évalué</span>'
+    };
+    container.innerHTML = echeances.map(e => `
+        <div style="display: flex; justify-content: space-between; align-items: center; gap: 12px; padding: 8px 0; border-bottom: 1px solid var(--border);">
+            <div>
+                <strong>${e.titre}</strong>
+                <div style="color: var(--text-secondary); font-size: 14px;">
+                    ${e.espace_nom || '-'} · ${new Date(e.date_fin).toLocaleString('fr-FR')}
+                </div>
+            </div>
+            <div>
+                ${badges[e.soumission]}${e.note !== null ? ` <strong>${e.note}/20</strong>` : ''}
+            </div>
+        </div>
+    `).join('');
+}
+
 async function loadEtudiantTravaux() {
     try {
         const user = getCurrentUser();
@@ -77,7 +127,7 @@ async function loadEtudiantTravaux() {
         
         const travauxAvecLivraisons = await Promise.all(
             etudiantData.travaux.map(async (travail) => {
-                const livraisonsResp = await fetch(`${API_BASE}/travaux/${travail.id}/livraisons`, { headers: getAuthHeaders() });
+                const livraisonsResp = await fetch(`${API_BASE}/travaux/${travail.id}/livraisons/resume`, { headers: getAuthHeaders() });
                 if (livraisonsResp.ok) {
                     const livraisons = await livraisonsResp.json();
                     const maLivraison = livraisons.find(l => l.etudiant_id === user.user_id);
@@ -140,10 +190,12 @@ function getTravailStatut(travail) {
         }
         return '<span class="badge badge-info">Soumis</span>';
     }
-    const dateLimite = new Date(travail.date_fin);
-    if (dateLimite < new Date()) {
+    if (travail.statut === 'en_retard') {
         return '<span class="badge badge-danger">Dépassé</span>';
     }
+    if (travail.statut === 'a_venir') {
+        return '<span class="badge badge-secondary">À venir</span>';
+    }
     return '<span class="badge badge-warning">À faire</span>';
 }
 
@@ -225,34 +277,32 @@ async function handleFilesEtudiant(event) {
     
     const uploadedFilesDiv = document.getElementById('uploaded-files');
     
-    for (let file of files) {
-        const formData = new FormData();
-        formData.append('file', file);
-        
-        try {
-            const response = await fetch(`${API_BASE}/upload`, {
-                method: 'POST',
-                headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` },
-                body: formData
-            });
-            
-            if (!response.ok) throw new Error('Erreur upload');
-            
-            const result = await response.json();
-            uploadedFilesEtudiant.push(result.url);
-            
-            uploadedFilesDiv.innerHTML += `
-                <div class="uploaded-file">
-                    <span class="file-icon">📎</span>
-                    <span class="file-name">${file.name}</span>
-                    <button type="button" class="btn-icon btn-danger" onclick="removeFileEtudiant('${result.url}', this.parentElement)">×</button>
-                </div>
-            `;
-        } catch (error) {
-            console.error(error); // Ajout pour debug
+    const selected = Array.from(files);
+    let results;
+    try {
+        results = await uploadFiles(selected);
+    } catch (error) {
+        console.error(error);
+        showNotification('Erreur upload', 'error');
+        return;
+    }
+    
+    selected.forEach((file, i) => {
+        const result = results[i];
+        if (!result || result.erreur) {
             showNotification(`Erreur upload ${file.name}`, 'error');
+            return;
         }
-    }
+        uploadedFilesEtudiant.push(result.url);
+        
+        uploadedFilesDiv.innerHTML += `
+            <div class="uploaded-file">
+                <span class="file-icon">📎</span>
+                <span class="file-name">${file.name}</span>
+                <button type="button" class="btn-icon btn-danger" onclick="removeFileEtudiant('${result.url}', this.parentElement)">×</button>
+            </div>
+        `;
+    });
     
     event.target.value = '';
 }
@@ -282,10 +332,15 @@ async function submitLivraison(event, travailId) {
         liens: []
     };
     
+    // Une même clé pour toutes les tentatives: un renvoi après expiration ne crée pas de doublon
+    if (!submissionKeys[travailId]) {
+        submissionKeys[travailId] = crypto.randomUUID();
+    }
+    
     try {
         const response = await fetch(`${API_BASE}/travaux/${travailId}/livraisons`, {
             method: 'POST',
-            headers: getAuthHeaders(),
+            headers: { ...getAuthHeaders(), 'Idempotency-Key': submissionKeys[travailId] },
             body: JSON.stringify(data)
         });
         
@@ -294,10 +349,17 @@ async function submitLivraison(event, travailId) {
             throw new Error(error.detail || 'Erreur lors de la soumission');
         }
         
+        const livraison = await response.json();
+        delete submissionKeys[travailId];
         uploadedFilesEtudiant = [];
         closeModal();
         showNotification('Travail soumis avec succès', 'success');
-        await loadEtudiantTravaux();
+        
+        const travail = etudiantData.travaux.find(t => t.id === travailId);
+        if (travail) {
+            travail.ma_livraison = livraison;
+            renderEtudiantTravaux(etudiantData.travaux);
+        }
     } catch (error) {
         showNotification(error.message, 'error');
     }
@@ -307,7 +369,12 @@ async function viewMaLivraison(travailId) {
     const travail = etudiantData.travaux.find(t => t.id === travailId);
     if (!travail || !travail.ma_livraison) return;
     
-    const livraison = travail.ma_livraison;
+    const response = await fetch(`${API_BASE}/livraisons/${travail.ma_livraison.id}`, { headers: getAuthHeaders() });
+    if (!response.ok) {
+        showNotification('Erreur lors du chargement de la livraison', 'error');
+        return;
+    }
+    const livraison = await response.json();
     
     const modalContent = `
         <div class="modal-content" style="max-width: 700px;">
@@ -436,3 +503,30 @@ window.onclick = function(event) {
         closeModal();
     }
 }
+
+function handleTravailEvent(event) {
+    const travail = etudiantData.travaux.find(t => t.id === event.id);
+    if (!travail) {
+        if (event.operation === 'insert') loadEtudiantTravaux();
+        return;
+    }
+    Object.assign(travail, event.data);
+    renderEtudiantTravaux(etudiantData.travaux);
+}
+
+function handleEvaluationEvent(event) {
+    const travail = etudiantData.travaux.find(t => t.id === event.travail_id);
+    if (travail) {
+        travail.statut = 'evalue';
+        renderEtudiantTravaux(etudiantData.travaux);
+    }
+    if (etudiantData.notes) loadEtudiantNotes();
+}
+
+function subscribeEtudiantEvents() {
+    return subscribeEvents({
+        travail: handleTravailEvent,
+        evaluation: handleEvaluationEvent,
+        resync: () => loadEtudiantTravaux()
+    });
+}
@@ -123,7 +123,9 @@ function renderFormateurTravaux(travaux) {
 
 function getStatutBadge(statut) {
     const badges = {
+        'a_venir': '<span class="badge badge-secondary">À venir</span>',
         'en_attente': '<span class="badge badge-warning">En attente</span>',
+        'en_retard': '<span class="badge badge-danger">En retard</span>',
         'livre': '<span class="badge badge-info">Livré</span>',
         'evalue': '<span class="badge badge-success">Évalué</span>'
     };
@@ -241,33 +243,32 @@ async function handleFileSelection(event) {
     
     const uploadedFilesDiv = document.getElementById('uploaded-files');
     
-    for (let file of files) {
-        const formData = new FormData();
-        formData.append('file', file);
-        
-        try {
-            const response = await fetch(`${API_BASE}/upload`, {
-                method: 'POST',
-                headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` },
-                body: formData
-            });
-            
-            if (!response.ok) throw new Error('Erreur upload');
-            
-            const result = await response.json();
-            uploadedFileUrls.push(result.url);
-            
-            uploadedFilesDiv.innerHTML += `
-                <div class="uploaded-file">
-                    <span class="file-icon">📎</span>
-                    <span class="file-name">${file.name}</span>
-                    <button type="button" class="btn-icon btn-danger" onclick="removeUploadedFile('${result.url}', this.parentElement)">×</button>
-                </div>
-            `;
-        } catch (error) {
+    const selected = Array.from(files);
+    let results;
+    try {
+        results = await uploadFiles(selected);
+    } catch (error) {
+        console.error(error);
+        showNotification('Erreur upload', 'error');
+        return;
+    }
+    
+    selected.forEach((file, i) => {
+        const result = results[i];
+        if (!result || result.erreur) {
             showNotification(`Erreur upload ${file.name}`, 'error');
+            return;
         }
-    }
+        uploadedFileUrls.push(result.url);
+        
+        uploadedFilesDiv.innerHTML += `
+            <div class="uploaded-file">
+                <span class="file-icon">📎</span>
+                <span class="file-name">${file.name}</span>
+                <button type="button" class="btn-icon btn-danger" onclick="removeUploadedFile('${result.url}', this.parentElement)">×</button>
+            </div>
+        `;
+    });
 }
 
 function removeUploadedFile(url, element) {
@@ -290,6 +291,10 @@ async function loadEtudiantsForTravail(espaceId) {
         selection.innerHTML = `
             <select id="etudiant_individuel" required>
                 <option value="">Sélectionner un étudiant</option>
+                <option value="audience:espace">Tous les étudiants de l'espace</option>
+                ${(espace.promotions || []).map(p => `
+                    <option value="audience:promotion:${p.id}">Toute la promotion ${p.nom}</option>
+                `).join('')}
                 ${espace.etudiants.map(e => `
                     <option value="${e.id}">${e.nom_complet}</option>
                 `).join('')}
@@ -323,13 +328,20 @@ async function saveTravail(event) {
     const typeIndividuel = document.getElementById('type_individuel').checked;
     
     let etudiantsAssignes = [];
+    let audience = null;
     if (typeIndividuel) {
         const etudiantId = document.getElementById('etudiant_individuel').value;
         if (!etudiantId) {
             showNotification('Veuillez sélectionner un étudiant', 'error');
             return;
         }
-        etudiantsAssignes = [etudiantId];
+        // Toute une promotion ou tout l'espace: gardé en référence côté serveur
+        if (etudiantId.startsWith('audience:')) {
+            const [, type, id] = etudiantId.split(':');
+            audience = { type, id: id || null };
+        } else {
+            etudiantsAssignes = [etudiantId];
+        }
     } else {
         const checkboxes = document.querySelectorAll('#etudiants-selection input[type="checkbox"]:checked');
         etudiantsAssignes = Array.from(checkboxes).map(cb => cb.value);
@@ -349,7 +361,8 @@ async function saveTravail(event) {
         date_fin: new Date(document.getElementById('date_fin').value).toISOString(),
         fichiers_urls: uploadedFileUrls,
         liens: [],
-        etudiants_assignes: etudiantsAssignes
+        etudiants_assignes: etudiantsAssignes,
+        audience
     };
     
     try {
@@ -377,7 +390,7 @@ async function viewTravail(id) {
     const travail = formateurData.travaux.find(t => t.id === id);
     if (!travail) return;
     
-    const response = await fetch(`${API_BASE}/travaux/${id}/livraisons`, { headers: getAuthHeaders() });
+    const response = await fetch(`${API_BASE}/travaux/${id}/livraisons/resume`, { headers: getAuthHeaders() });
     const livraisons = response.ok ? await response.json() : [];
     
     const modalContent = `
@@ -410,14 +423,15 @@ async function viewTravail(id) {
                 ` : ''}
                 
                 <div>
-                    <h3 style="font-size: 16px; margin-bottom: 12px;">Étudiants assignés (${travail.etudiants_assignes?.length || 0})</h3>
+                    <h3 style="font-size: 16px; margin-bottom: 12px;">Étudiants assignés (${travail.nombre_assignes || 0})</h3>
                     <div style="display: flex; gap: 8px; flex-wrap: wrap; margin-bottom: 12px;">
+                        ${travail.audience ? `<span class="badge badge-info">${travail.audience.type === 'promotion' ? 'Promotion' : 'Espace'} ${travail.audience.nom || ''}</span>` : ''}
                         ${travail.etudiants_assignes?.map(e => `<span class="badge badge-info">${e.nom_complet}</span>`).join('') || ''}
                     </div>
                 </div>
                 
                 <div style="margin-top: 20px;">
-                    <h3 style="font-size: 16px; margin-bottom: 12px;">Livraisons (${livraisons.length}/${travail.etudiants_assignes?.length || 0})</h3>
+                    <h3 style="font-size: 16px; margin-bottom: 12px;">Livraisons (${livraisons.length}/${travail.nombre_assignes || 0})</h3>
                     ${livraisons.length > 0 ? `
                         <div style="border: 1px solid var(--border); border-radius: 8px; overflow: hidden;">
                             ${livraisons.map(l => `
@@ -462,7 +476,7 @@ async function loadLivraisonsAEvaluer() {
         const travauxLivres = formateurData.travaux.filter(t => t.statut === 'livre');
         
         const livraisonsPromises = travauxLivres.map(async (travail) => {
-            const response = await fetch(`${API_BASE}/travaux/${travail.id}/livraisons`, { headers: getAuthHeaders() });
+            const response = await fetch(`${API_BASE}/travaux/${travail.id}/livraisons/resume`, { headers: getAuthHeaders() });
             if (response.ok) {
                 const livraisons = await response.json();
                 return livraisons.map(l => ({ ...l, travail_titre: travail.titre }));
@@ -502,8 +516,16 @@ function renderLivraisons(livraisons) {
 }
 
 async function openEvaluationModal(livraisonId) {
-    const livraison = formateurData.livraisons.find(l => l.id === livraisonId);
-    if (!livraison) return;
+    const resume = formateurData.livraisons.find(l => l.id === livraisonId);
+    if (!resume) return;
+    
+    // La liste ne contient que le résumé: contenu et fichiers sont chargés à l'ouverture
+    const response = await fetch(`${API_BASE}/livraisons/${livraisonId}`, { headers: getAuthHeaders() });
+    if (!response.ok) {
+        showNotification('Erreur lors du chargement de la livraison', 'error');
+        return;
+    }
+    const livraison = { ...resume, ...(await response.json()) };
     
     const modalContent = `
         <div class="modal-content" style="max-width: 700px;">
@@ -580,10 +602,12 @@ async function saveEvaluation(event, livraisonId) {
             throw new Error(error.detail || 'Erreur lors de l\'évaluation');
         }
         
+        const evaluation = await response.json();
         closeModal();
         showNotification('Évaluation enregistrée avec succès', 'success');
-        await loadLivraisonsAEvaluer();
-        await loadFormateurTravaux();
+        handleEvaluationEvent({ id: evaluation.id, travail_id: evaluation.travail_id, data: { livraison_id: livraisonId } });
+        // Le statut du travail est recalculé par le serveur: on le relit
+        loadFormateurTravaux();
     } catch (error) {
         showNotification(error.message, 'error');
     }
@@ -608,3 +632,47 @@ window.onclick = function(event) {
         closeModal();
     }
 }
+
+function handleTravailEvent(event) {
+    const travail = formateurData.travaux.find(t => t.id === event.id);
+    if (!travail) {
+        if (event.operation === 'insert') loadFormateurTravaux();
+        return;
+    }
+    Object.assign(travail, event.data);
+    renderFormateurTravaux(formateurData.travaux);
+}
+
+function handleLivraisonEvent(event) {
+    if (formateurData.livraisons.some(l => l.id === event.id)) return;
+    
+    formateurData.livraisons.push({
+        id: event.id,
+        travail_id: event.travail_id,
+        etudiant_id: event.etudiant_id,
+        etudiant_nom: event.data.etudiant_nom,
+        travail_titre: event.data.travail_titre,
+        date_soumission: event.data.date_soumission
+    });
+    renderLivraisons(formateurData.livraisons);
+}
+
+function handleEvaluationEvent(event) {
+    formateurData.livraisons = formateurData.livraisons.filter(l => l.id !== event.data.livraison_id);
+    renderLivraisons(formateurData.livraisons);
+    
+    const travail = formateurData.travaux.find(t => t.id === event.travail_id);
+    if (travail && event.data.travail_statut && travail.statut !== event.data.travail_statut) {
+        travail.statut = event.data.travail_statut;
+        renderFormateurTravaux(formateurData.travaux);
+    }
+}
+
+function subscribeFormateurEvents() {
+    return subscribeEvents({
+        travail: handleTravailEvent,
+        livraison: handleLivraisonEvent,
+        evaluation: handleEvaluationEvent,
+        resync: () => loadFormateurTravaux().then(loadLivraisonsAEvaluer)
+    });
+}